@@ -0,0 +1,101 @@
+"""
+Measure the overhead of the metrics on the /healthcheck and /token endpoints.
+The rounds with and without metrics are interleaved, so both see the same machine noise.
+
+Usage (from the repository root):
+    python -m benchmarks.metrics_overhead --requests 2000 --rounds 10
+"""
+
+from typing import Awaitable, Callable, Dict, List
+import argparse
+import asyncio
+import time
+import httpx
+from starlette.middleware import Middleware
+
+from pyfederate import app, manager
+from pyfederate.utils import constants, middlewares
+from pyfederate.utils.metrics import InstrumentedManager
+from benchmarks.telemetry_middleware import create_client
+
+MANAGER_ATTRIBUTES = [
+    "_token_model_manager",
+    "_scope_manager",
+    "_client_manager",
+    "_session_manager",
+]
+
+
+def set_metrics_enabled(is_enabled: bool, instrumented_managers: Dict) -> None:
+    constants.METRICS_ENABLED = is_enabled
+    for attribute, instrumented_manager in instrumented_managers.items():
+        setattr(
+            manager,
+            attribute,
+            instrumented_manager if is_enabled else instrumented_manager._manager,
+        )
+    app.user_middleware = [Middleware(middlewares.TelemetryMiddleware)]
+    if is_enabled:
+        app.user_middleware.append(Middleware(middlewares.MetricsMiddleware))
+    # The stack is rebuilt on the next request
+    app.middleware_stack = None
+
+
+async def measure(
+    send_request: Callable[[], Awaitable[httpx.Response]], number_of_requests: int
+) -> float:
+    """Return the mean latency in microseconds"""
+
+    start = time.perf_counter()
+    for _ in range(number_of_requests):
+        (await send_request()).raise_for_status()
+    return (time.perf_counter() - start) / number_of_requests * 1e6
+
+
+async def main(number_of_requests: int, number_of_rounds: int) -> None:
+    manager.setup_in_memory_env()
+    instrumented_managers = {
+        attribute: getattr(manager, attribute) for attribute in MANAGER_ATTRIBUTES
+    }
+    assert all(
+        isinstance(m, InstrumentedManager) for m in instrumented_managers.values()
+    ), "run with METRICS_ENABLED=true"
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+    ) as http_client:
+        token_form = await create_client(http_client=http_client)
+        endpoints: Dict[str, Callable[[], Awaitable[httpx.Response]]] = {
+            "/healthcheck": lambda: http_client.get("/healthcheck"),
+            "/token": lambda: http_client.post("/token", data=token_form),
+        }
+
+        print(f"{'endpoint':>14} {'disabled':>10} {'enabled':>10} {'overhead':>9}")
+        for endpoint, send_request in endpoints.items():
+            # Keep the best round of each configuration
+            latencies: Dict[bool, List[float]] = {False: [], True: []}
+            for _ in range(number_of_rounds):
+                for is_enabled in (False, True):
+                    set_metrics_enabled(
+                        is_enabled=is_enabled,
+                        instrumented_managers=instrumented_managers,
+                    )
+                    latencies[is_enabled].append(
+                        await measure(send_request, number_of_requests)
+                    )
+
+            disabled_latency, enabled_latency = min(latencies[False]), min(
+                latencies[True]
+            )
+            overhead = (enabled_latency - disabled_latency) / disabled_latency * 100
+            print(
+                f"{endpoint:>14} {disabled_latency:>8.0f}us {enabled_latency:>8.0f}us {overhead:>8.1f}%"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(number_of_requests=args.requests, number_of_rounds=args.rounds))
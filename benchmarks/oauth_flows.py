@@ -0,0 +1,473 @@
+"""
+Load test the OAuth flows end to end, with the app driven in-process through the
+ASGI transport and over HTTP against a local uvicorn server, for both the in-memory
+and the OLTP managers. Each combination runs in a fresh process, since the
+managers can only be set up once per process.
+
+The flows are:
+    client_credentials: POST /token
+    authorization_code: POST /par, GET /authorize, POST /authorize/{callback_id}
+        and POST /token with PKCE
+    refresh_token: POST /token rotating the refresh token issued to each user by
+        the authorization code flow
+
+The throughput is the number of flows completed per second by all the concurrent
+users and the percentiles are the latency of a whole flow. The results are saved
+as JSON and the ones of another commit can be compared with --compare.
+The server logs each request, so set LOG_LEVEL=WARNING to leave the logging out.
+
+Usage (from the repository root):
+    LOG_LEVEL=WARNING python -m benchmarks.oauth_flows --requests 2000 --concurrency 10 --output results.json
+    LOG_LEVEL=WARNING python -m benchmarks.oauth_flows --output new.json --compare results.json
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import secrets
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+import httpx
+
+MANAGEMENT_AUTH = ("admin", "password")
+REDIRECT_URI = "https://localhost/callback"
+SCOPE = "profile"
+MANAGERS = ["in_memory", "oltp"]
+TRANSPORTS = ["in_process", "uvicorn"]
+FLOWS = ["client_credentials", "authorization_code", "refresh_token"]
+
+# Send the requests of a flow for a user. The state carries the credentials and
+# the refresh token of the user
+Flow = Callable[[httpx.AsyncClient, Dict[str, str]], Awaitable[None]]
+
+######################################## Server ########################################
+
+
+def set_up_server(managers: str, db_path: str) -> None:
+    """Set up the managers and an authentication policy that logs in any user"""
+
+    from fastapi import Request
+    from fastapi.responses import JSONResponse
+    from pyfederate import manager
+    from pyfederate.utils import schemas
+
+    if managers == "oltp":
+        manager.setup_oltp_env(db_string=f"sqlite+aiosqlite:///{db_path}")
+    else:
+        manager.setup_in_memory_env()
+
+    def authenticate_user(
+        session: schemas.AuthnSession, request: Request
+    ) -> schemas.AuthnStepResult:
+        # The user gets the callback ID and posts to it to log in
+        if request.method == "POST":
+            session.user_id = "benchmark_user"
+            return schemas.AuthnStepSuccessResult()
+        return schemas.AuthnStepInProgressResult(
+            response=JSONResponse({"callback_id": session.callback_id})
+        )
+
+    manager.register_authn_policy(
+        schemas.AuthnPolicy(
+            id="benchmark_policy",
+            is_available=lambda client, request: True,
+            first_step=schemas.AuthnStep(
+                id="benchmark_step",
+                authn_func=authenticate_user,
+                success_next_step=None,
+                failure_next_step=None,
+            ),
+        )
+    )
+
+
+def serve(managers: str, db_path: str, port: int) -> None:
+    import uvicorn
+    from pyfederate import app
+
+    set_up_server(managers=managers, db_path=db_path)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_until_healthy(http_client: httpx.AsyncClient) -> None:
+    for _ in range(100):
+        try:
+            (await http_client.get("/healthcheck")).raise_for_status()
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("The server didn't start")
+
+
+######################################## Flows ########################################
+
+
+async def create_client(http_client: httpx.AsyncClient) -> Dict[str, str]:
+    """Create a client allowed to run all the flows and return its credentials"""
+
+    (
+        await http_client.post(
+            "/token-model",
+            json={
+                "id": "benchmark_token_model",
+                "issuer": "https://localhost",
+                "expires_in": 300,
+                "is_refreshable": True,
+                "token_type": "jwt",
+                "key_id": "my_key",
+            },
+            auth=MANAGEMENT_AUTH,
+        )
+    ).raise_for_status()
+    (
+        await http_client.post(
+            "/scope",
+            json={"name": SCOPE, "description": "Benchmark scope"},
+            auth=MANAGEMENT_AUTH,
+        )
+    ).raise_for_status()
+    response = await http_client.post(
+        "/client",
+        json={
+            "id": "benchmark_client",
+            "authn_method": "client_secret_post",
+            "redirect_uris": [REDIRECT_URI],
+            "response_types": ["code"],
+            "grant_types": [
+                "client_credentials",
+                "authorization_code",
+                "refresh_token",
+            ],
+            "scopes": [SCOPE],
+            "is_pkce_required": True,
+            "token_model_id": "benchmark_token_model",
+        },
+        auth=MANAGEMENT_AUTH,
+    )
+    response.raise_for_status()
+    return {"client_id": "benchmark_client", "client_secret": response.json()["secret"]}
+
+
+async def run_client_credentials(
+    http_client: httpx.AsyncClient, state: Dict[str, str]
+) -> None:
+    (
+        await http_client.post(
+            "/token",
+            data={
+                "client_id": state["client_id"],
+                "client_secret": state["client_secret"],
+                "grant_type": "client_credentials",
+                "scope": SCOPE,
+            },
+        )
+    ).raise_for_status()
+
+
+async def run_authorization_code(
+    http_client: httpx.AsyncClient, state: Dict[str, str]
+) -> None:
+    code_verifier = secrets.token_urlsafe(32)
+    code_challenge = (
+        base64.urlsafe_b64encode(hashlib.sha256(code_verifier.encode()).digest())
+        .decode()
+        .rstrip("=")
+    )
+    credentials = {
+        "client_id": state["client_id"],
+        "client_secret": state["client_secret"],
+    }
+
+    response = await http_client.post(
+        "/par",
+        data={
+            **credentials,
+            "response_type": "code",
+            "redirect_uri": REDIRECT_URI,
+            "scope": SCOPE,
+            "state": secrets.token_urlsafe(8),
+            "code_challenge": code_challenge,
+        },
+    )
+    response.raise_for_status()
+    response = await http_client.get(
+        "/authorize",
+        params={
+            "client_id": state["client_id"],
+            "request_uri": response.json()["request_uri"],
+        },
+    )
+    response.raise_for_status()
+    response = await http_client.post(f"/authorize/{response.json()['callback_id']}")
+    if response.status_code != 302:
+        raise RuntimeError(f"The authentication failed: {response.text}")
+    code = parse_qs(urlparse(response.headers["location"]).query)["code"][0]
+
+    response = await http_client.post(
+        "/token",
+        data={
+            **credentials,
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": REDIRECT_URI,
+            "code_verifier": code_verifier,
+        },
+    )
+    response.raise_for_status()
+    state["refresh_token"] = response.json()["refresh_token"]
+
+
+async def run_refresh_token(
+    http_client: httpx.AsyncClient, state: Dict[str, str]
+) -> None:
+    if "refresh_token" not in state:
+        await run_authorization_code(http_client=http_client, state=state)
+
+    response = await http_client.post(
+        "/token",
+        data={
+            "client_id": state["client_id"],
+            "client_secret": state["client_secret"],
+            "grant_type": "refresh_token",
+            "refresh_token": state["refresh_token"],
+        },
+    )
+    response.raise_for_status()
+    # The refresh token is rotated
+    state["refresh_token"] = response.json()["refresh_token"]
+
+
+FLOW_FUNCTIONS: Dict[str, Flow] = {
+    "client_credentials": run_client_credentials,
+    "authorization_code": run_authorization_code,
+    "refresh_token": run_refresh_token,
+}
+
+######################################## Load ########################################
+
+
+async def run_users(
+    http_client: httpx.AsyncClient,
+    flow: Flow,
+    user_states: List[Dict[str, str]],
+    flows_per_user: int,
+) -> List[float]:
+    """Run the flow concurrently for each user and return the latencies in seconds"""
+
+    latencies: List[float] = []
+
+    async def run_user(state: Dict[str, str]) -> None:
+        for _ in range(flows_per_user):
+            start = time.perf_counter()
+            await flow(http_client, state)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(run_user(state) for state in user_states))
+    return latencies
+
+
+async def measure_flows(
+    http_client: httpx.AsyncClient,
+    flows: List[str],
+    number_of_flows: int,
+    concurrency: int,
+) -> List[Dict[str, Any]]:
+
+    credentials = await create_client(http_client=http_client)
+    results: List[Dict[str, Any]] = []
+    for flow_name in flows:
+        flow = FLOW_FUNCTIONS[flow_name]
+        user_states = [dict(credentials) for _ in range(concurrency)]
+        # Warm up, which also gets the refresh tokens of the users
+        await run_users(http_client, flow, user_states, flows_per_user=1)
+
+        flows_per_user = max(number_of_flows // concurrency, 1)
+        start = time.perf_counter()
+        latencies = await run_users(http_client, flow, user_states, flows_per_user)
+        elapsed_time = time.perf_counter() - start
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        results.append(
+            {
+                "flow": flow_name,
+                "flows": len(latencies),
+                "throughput": len(latencies) / elapsed_time,
+                "p50_ms": percentiles[49] * 1e3,
+                "p95_ms": percentiles[94] * 1e3,
+                "p99_ms": percentiles[98] * 1e3,
+            }
+        )
+    return results
+
+
+def measure_in_process(
+    managers: str,
+    db_path: str,
+    flows: List[str],
+    number_of_flows: int,
+    concurrency: int,
+) -> List[Dict[str, Any]]:
+    from pyfederate import app
+
+    set_up_server(managers=managers, db_path=db_path)
+
+    async def main() -> List[Dict[str, Any]]:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+        ) as http_client:
+            return await measure_flows(http_client, flows, number_of_flows, concurrency)
+
+    return asyncio.run(main())
+
+
+def measure_uvicorn(
+    managers: str,
+    db_path: str,
+    flows: List[str],
+    number_of_flows: int,
+    concurrency: int,
+) -> List[Dict[str, Any]]:
+    port = get_free_port()
+    server = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(managers, db_path, port), daemon=True
+    )
+    server.start()
+
+    async def main() -> List[Dict[str, Any]]:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            limits=httpx.Limits(max_connections=concurrency),
+        ) as http_client:
+            await wait_until_healthy(http_client=http_client)
+            return await measure_flows(http_client, flows, number_of_flows, concurrency)
+
+    try:
+        return asyncio.run(main())
+    finally:
+        server.terminate()
+        server.join()
+
+
+MEASURE_FUNCTIONS: Dict[str, Callable[..., List[Dict[str, Any]]]] = {
+    "in_process": measure_in_process,
+    "uvicorn": measure_uvicorn,
+}
+
+######################################## Report ########################################
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(
+    results: List[Dict[str, Any]], baseline: List[Dict[str, Any]] | None
+) -> None:
+    baseline_results = {
+        (r["managers"], r["transport"], r["flow"]): r for r in baseline or []
+    }
+    print(
+        f"{'managers':>10} {'transport':>10} {'flow':>19} {'flows/s':>9} "
+        f"{'p50':>9} {'p95':>9} {'p99':>9}"
+    )
+    for result in results:
+        print(
+            f"{result['managers']:>10} {result['transport']:>10} {result['flow']:>19} "
+            f"{result['throughput']:>9.1f} {result['p50_ms']:>7.1f}ms "
+            f"{result['p95_ms']:>7.1f}ms {result['p99_ms']:>7.1f}ms"
+        )
+        baseline_result = baseline_results.get(
+            (result["managers"], result["transport"], result["flow"])
+        )
+        if baseline_result:
+            changes = [
+                (result[key] / baseline_result[key] - 1) * 100
+                for key in ["throughput", "p50_ms", "p95_ms", "p99_ms"]
+            ]
+            print(f"{'vs baseline':>42} " + " ".join(f"{c:>+8.1f}%" for c in changes))
+
+
+def main(args: argparse.Namespace) -> None:
+    results: List[Dict[str, Any]] = []
+    for managers in args.managers:
+        for transport in args.transports:
+            with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                flow_results = executor.submit(
+                    MEASURE_FUNCTIONS[transport],
+                    managers,
+                    os.path.join(directory, "benchmark.db"),
+                    args.flows,
+                    args.requests,
+                    args.concurrency,
+                ).result()
+            results.extend(
+                {"managers": managers, "transport": transport, **flow_result}
+                for flow_result in flow_results
+            )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+    print_results(results=results, baseline=baseline)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(
+                {
+                    "commit": get_commit(),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpu_count": os.cpu_count(),
+                    "requests": args.requests,
+                    "concurrency": args.concurrency,
+                    "results": results,
+                },
+                output_file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=2_000, help="Flows per run")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--managers", nargs="+", choices=MANAGERS, default=MANAGERS)
+    parser.add_argument(
+        "--transports", nargs="+", choices=TRANSPORTS, default=TRANSPORTS
+    )
+    parser.add_argument("--flows", nargs="+", choices=FLOWS, default=FLOWS)
+    parser.add_argument("--output", help="File to save the results as JSON")
+    parser.add_argument("--compare", help="Results of a previous run to compare with")
+    main(args=parser.parse_args())
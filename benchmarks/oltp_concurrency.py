@@ -0,0 +1,160 @@
+"""
+Compare how concurrent client lookups behave when the database is queried with a
+blocking session against the asynchronous OLTP managers.
+Every statement is slowed down by --latency milliseconds to emulate a remote database.
+The event loop lag is the worst delay observed by a task that wakes up every millisecond.
+
+Usage (from the repository root):
+    python -m benchmarks.oltp_concurrency --concurrency 1 10 50 --latency 5
+"""
+
+from typing import Any, Awaitable, Callable, List, Tuple
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from sqlalchemy import Engine, create_engine, event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from pyfederate.utils import constants, models, schemas
+from pyfederate.utils.managers.client_manager import OLTPClientManager
+from pyfederate.utils.managers.token_manager import OLTPTokenModelManager
+
+CLIENT_ID = "client_id"
+
+
+def add_latency(engine: Engine, latency: float) -> None:
+    """Delay every statement in the thread that executes it"""
+
+    def sleep(statement: str) -> None:
+        time.sleep(latency)
+
+    def set_trace_callback(dbapi_connection: Any, connection_record: Any) -> None:
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            dbapi_connection.set_trace_callback(sleep)
+        else:
+            # aiosqlite runs the statements in a worker thread per connection
+            dbapi_connection.await_(
+                dbapi_connection.driver_connection.set_trace_callback(sleep)
+            )
+
+    event.listen(engine, "connect", set_trace_callback)
+
+
+async def measure_event_loop_lag(stop: asyncio.Event) -> float:
+    lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lag = max(lag, time.perf_counter() - start - 0.001)
+    return lag
+
+
+async def run(
+    get_client: Callable[[], Awaitable[Any]], concurrency: int, requests: int
+) -> Tuple[float, float]:
+    """Return the total time and the worst event loop lag in milliseconds"""
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_event_loop_lag(stop=stop))
+    await asyncio.sleep(0.01)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request() -> None:
+        async with semaphore:
+            await get_client()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[request() for _ in range(requests)])
+    total = time.perf_counter() - start
+    stop.set()
+    return total * 1e3, await lag_task * 1e3
+
+
+async def main(concurrency_levels: List[int], requests: int, latency: float) -> None:
+
+    db_path = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with async_engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+
+    await OLTPTokenModelManager(engine=async_engine).create_token_model(
+        token_model=schemas.TokenModelUpsert(
+            id="token_model_id",
+            issuer="https://localhost:8080",
+            expires_in=300,
+            is_refreshable=False,
+            token_type=constants.TokenType.JWT,
+            key_id=list(constants.PRIVATE_JWKS.keys())[0],
+        )
+    )
+    client_manager = OLTPClientManager(engine=async_engine)
+    await client_manager.create_client(
+        client=schemas.ClientUpsert(
+            id=CLIENT_ID,
+            authn_method=constants.ClientAuthnMethod.NONE,
+            redirect_uris=["https://localhost:8080/callback"],
+            response_types=[],
+            grant_types=[constants.GrantType.CLIENT_CREDENTIALS],
+            scopes=[],
+            is_pkce_required=False,
+            token_model_id="token_model_id",
+        )
+    )
+    await async_engine.dispose()
+    add_latency(engine=async_engine.sync_engine, latency=latency / 1e3)
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    add_latency(engine=sync_engine, latency=latency / 1e3)
+
+    async def get_client_blocking() -> schemas.Client:
+        with Session(sync_engine) as db:
+            client_db = (
+                db.scalars(select(models.Client).where(models.Client.id == CLIENT_ID))
+                .unique()
+                .one()
+            )
+            return client_db.to_schema()
+
+    async def get_client_async() -> schemas.Client:
+        return await client_manager.get_client(client_id=CLIENT_ID)
+
+    print(
+        f"{'concurrency':>12} {'blocking total':>15} {'blocking lag':>13}"
+        f" {'async total':>12} {'async lag':>10}"
+    )
+    for concurrency in concurrency_levels:
+        results = []
+        for get_client in [get_client_blocking, get_client_async]:
+            results.extend(
+                await run(
+                    get_client=get_client, concurrency=concurrency, requests=requests
+                )
+            )
+        print(
+            f"{concurrency:>12} {results[0]:>13.1f}ms {results[1]:>11.1f}ms"
+            f" {results[2]:>10.1f}ms {results[3]:>8.1f}ms"
+        )
+
+    sync_engine.dispose()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--latency", type=float, default=5, help="Latency per statement in ms"
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            concurrency_levels=args.concurrency,
+            requests=args.requests,
+            latency=args.latency,
+        )
+    )
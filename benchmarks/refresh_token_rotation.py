@@ -0,0 +1,100 @@
+"""
+Measure the latency of rotating refresh tokens and detecting their reuse as the
+number of outstanding refresh tokens grows.
+
+Usage (from the repository root):
+    python -m benchmarks.refresh_token_rotation --sizes 1000 100000 1000000
+"""
+
+from typing import List
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+from pyfederate.utils import schemas, tools
+from pyfederate.utils.managers.session_manager import InMemorySessionManager
+
+
+def build_token_session(timestamp_now: int) -> schemas.TokenSession:
+    token_id = tools.generate_uuid()
+    return schemas.TokenSession(
+        token_id=token_id,
+        refresh_token=tools.generate_refresh_token(),
+        client_id="client_id",
+        token_model_id="token_model_id",
+        token_info=schemas.TokenInfo(
+            subject="user_id",
+            issuer="issuer",
+            issued_at=timestamp_now,
+            expiration=timestamp_now + 300,
+            client_id="client_id",
+            scopes=["scope"],
+            id=token_id,
+            additional_info={},
+        ),
+        created_at=datetime.now(),
+        expiration=timestamp_now + 3600,
+    )
+
+
+async def measure(number_of_sessions: int, number_of_rotations: int) -> List[float]:
+    """Return the mean latency in microseconds of the lookup, the rotation and the reuse check"""
+
+    session_manager = InMemorySessionManager()
+    timestamp_now = tools.get_timestamp_now()
+    sessions: List[schemas.TokenSession] = []
+    for _ in range(number_of_sessions):
+        session = build_token_session(timestamp_now=timestamp_now)
+        await session_manager.create_token_session(session=session)
+        sessions.append(session)
+
+    sample = random.sample(sessions, k=min(number_of_rotations, number_of_sessions))
+    lookup_time, rotation_time, reuse_time = 0.0, 0.0, 0.0
+    for session in sample:
+        previous_refresh_token: str = session.refresh_token  # type: ignore
+
+        start = time.perf_counter()
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token=previous_refresh_token
+        )
+        lookup_time += time.perf_counter() - start
+
+        previous_token_id = session.token_id
+        session.token_id = tools.generate_opaque_token()
+        session.refresh_token = tools.generate_refresh_token()
+        start = time.perf_counter()
+        await session_manager.rotate_refresh_token(
+            session=session,
+            previous_refresh_token=previous_refresh_token,
+            previous_token_id=previous_token_id,
+        )
+        rotation_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        await session_manager.get_token_session_id_by_rotated_refresh_token(
+            refresh_token=previous_refresh_token
+        )
+        reuse_time += time.perf_counter() - start
+
+    return [t / len(sample) * 1e6 for t in (lookup_time, rotation_time, reuse_time)]
+
+
+async def main(sizes: List[int], number_of_rotations: int) -> None:
+    print(f"{'sessions':>10} {'lookup':>12} {'rotation':>12} {'reuse check':>12}")
+    for size in sizes:
+        latencies = await measure(
+            number_of_sessions=size, number_of_rotations=number_of_rotations
+        )
+        print(f"{size:>10} " + " ".join(f"{lat:>10.2f}us" for lat in latencies))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--rotations", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(main(sizes=args.sizes, number_of_rotations=args.rotations))
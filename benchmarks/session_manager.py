@@ -0,0 +1,89 @@
+"""
+Measure the latency of the session lookups as the number of live sessions grows.
+
+Usage (from the repository root):
+    python -m benchmarks.session_manager --sizes 1000 10000 100000 1000000
+"""
+
+from typing import List
+import argparse
+import asyncio
+import dataclasses
+import random
+import time
+
+from pyfederate.utils import constants, schemas, tools
+from pyfederate.utils.managers.session_manager import InMemorySessionManager
+
+
+def build_session(template: schemas.AuthnSession) -> schemas.AuthnSession:
+    return dataclasses.replace(
+        template,
+        id=tools.generate_session_id(),
+        callback_id=tools.generate_callback_id(),
+        authz_code=tools.generate_authz_code(),
+        request_uri=tools.generate_request_uri(),
+    )
+
+
+async def measure(number_of_sessions: int, number_of_lookups: int) -> List[float]:
+    """Return the mean latency in microseconds of each lookup type"""
+
+    session_manager = InMemorySessionManager()
+    template = schemas.AuthnSession(
+        callback_id=None,
+        tracking_id="",
+        correlation_id="",
+        client_id="client_id",
+        redirect_uri="https://localhost:8080/callback",
+        response_types=[constants.ResponseType.CODE],
+        requested_scopes=["scope"],
+        state="state",
+        auth_policy_id="policy_id",
+        next_authn_step_id="",
+        user_id="user_id",
+        authz_code=None,
+        authz_code_creation_timestamp=tools.get_timestamp_now(),
+        code_challenge=None,
+        request_uri=None,
+    )
+    sessions: List[schemas.AuthnSession] = []
+    for _ in range(number_of_sessions):
+        session = build_session(template=template)
+        await session_manager.create_session(session=session)
+        sessions.append(session)
+
+    sample = random.choices(sessions, k=number_of_lookups)
+    latencies: List[float] = []
+    for lookup, attribute in [
+        (session_manager.get_session_by_authz_code, "authz_code"),
+        (session_manager.get_session_by_callback_id, "callback_id"),
+        (session_manager.get_session_by_request_uri, "request_uri"),
+    ]:
+        start = time.perf_counter()
+        for session in sample:
+            await lookup(getattr(session, attribute))
+        latencies.append((time.perf_counter() - start) / number_of_lookups * 1e6)
+
+    return latencies
+
+
+async def main(sizes: List[int], number_of_lookups: int) -> None:
+    print(
+        f"{'sessions':>10} {'authz_code':>12} {'callback_id':>12} {'request_uri':>12}"
+    )
+    for size in sizes:
+        latencies = await measure(
+            number_of_sessions=size, number_of_lookups=number_of_lookups
+        )
+        print(f"{size:>10} " + " ".join(f"{lat:>10.2f}us" for lat in latencies))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(main(sizes=args.sizes, number_of_lookups=args.lookups))
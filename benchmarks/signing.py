@@ -0,0 +1,136 @@
+"""
+Compare the signing throughput of jwt.encode with the raw key against the signers
+that parse the key only once.
+Then compare signing RS256 tokens concurrently on the event loop against the
+signing engine with an increasing number of processes.
+
+Usage (from the repository root):
+    python -m benchmarks.signing --tokens 2000 --processes 1 2 4
+"""
+
+from typing import Any, Callable, Dict, List
+import argparse
+import asyncio
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from pyfederate.utils import constants, signing, tools
+
+
+def get_payload() -> Dict[str, Any]:
+    return {
+        "jti": tools.generate_uuid(),
+        "sub": "client_id",
+        "iss": "https://localhost:8080",
+        "iat": tools.get_timestamp_now(),
+        "exp": tools.get_timestamp_now() + 300,
+        "client_id": "client_id",
+        "scope": "scope1 scope2",
+    }
+
+
+def measure(sign: Callable[[Dict[str, Any]], str], number_of_tokens: int) -> float:
+    """Return the number of tokens signed per second"""
+
+    payload = get_payload()
+    start = time.perf_counter()
+    for _ in range(number_of_tokens):
+        sign(payload)
+    return number_of_tokens / (time.perf_counter() - start)
+
+
+async def measure_engine(
+    rsa_key: str, number_of_processes: int, number_of_tokens: int
+) -> float:
+    """Return the number of tokens signed per second by concurrent requests"""
+
+    if number_of_processes == 0:
+        signer = signing.get_signer(
+            key_id="key_id",
+            key=rsa_key,
+            signing_algorithm=constants.SigningAlgorithm.RS256,
+        )
+
+        async def sign() -> str:
+            return signer.sign(payload=get_payload())
+
+    else:
+        signing_engine = signing.SigningEngine(max_workers=number_of_processes)
+
+        async def sign() -> str:
+            return await signing_engine.sign(
+                key_id="key_id",
+                key=rsa_key,
+                signing_algorithm=constants.SigningAlgorithm.RS256,
+                payload=get_payload(),
+            )
+
+        # Start the processes and load the key before measuring
+        await asyncio.gather(*[sign() for _ in range(number_of_processes * 10)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[sign() for _ in range(number_of_tokens)])
+    throughput = number_of_tokens / (time.perf_counter() - start)
+    if number_of_processes:
+        signing_engine.shutdown()
+    return throughput
+
+
+def main(number_of_tokens: int, processes: List[int]) -> None:
+    rsa_key = (
+        rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        .private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        .decode()
+    )
+    keys = {
+        constants.SigningAlgorithm.HS256: tools.generate_fixed_size_random_string(32),
+        constants.SigningAlgorithm.RS256: rsa_key,
+    }
+
+    print(f"{'algorithm':>10} {'raw key':>14} {'signer':>14} {'speedup':>8}")
+    for signing_algorithm, key in keys.items():
+        signer = signing.Signer(
+            key_id="key_id", key=key, signing_algorithm=signing_algorithm
+        )
+        raw_key_throughput = measure(
+            sign=lambda payload: jwt.encode(
+                payload=payload, key=key, algorithm=signing_algorithm.value
+            ),
+            number_of_tokens=number_of_tokens,
+        )
+        signer_throughput = measure(
+            sign=lambda payload: signer.sign(payload=payload),
+            number_of_tokens=number_of_tokens,
+        )
+        print(
+            f"{signing_algorithm.value:>10} {raw_key_throughput:>10.0f}/s"
+            f" {signer_throughput:>12.0f}/s"
+            f" {signer_throughput / raw_key_throughput:>7.2f}x"
+        )
+
+    print(f"\n{'processes':>10} {'RS256':>14}")
+    for number_of_processes in [0] + processes:
+        throughput = asyncio.run(
+            measure_engine(
+                rsa_key=rsa_key,
+                number_of_processes=number_of_processes,
+                number_of_tokens=number_of_tokens,
+            )
+        )
+        label = number_of_processes or "event loop"
+        print(f"{label:>10} {throughput:>12.0f}/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    main(number_of_tokens=args.tokens, processes=args.processes)
@@ -0,0 +1,136 @@
+"""
+Compare the latency added by the telemetry middleware when written as a plain ASGI
+middleware and when written with @app.middleware("http").
+
+Usage (from the repository root):
+    python -m benchmarks.telemetry_middleware --requests 5000
+"""
+
+from typing import Callable, Dict, List, Tuple
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from fastapi import Request, Response
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from pyfederate import app, manager
+from pyfederate.utils import constants, telemetry, tools
+from pyfederate.utils.middlewares import TelemetryMiddleware
+
+MANAGEMENT_AUTH = ("admin", "password")
+
+
+async def set_telemetry_ids(request: Request, call_next: Callable) -> Response:
+    """The middleware as it was written with @app.middleware("http")"""
+
+    telemetry.tracking_id.set(tools.generate_uuid())
+    x_correlation_id: str | None = request.headers.get(
+        constants.HTTPHeaders.X_CORRELATION_ID.value
+    )
+    if x_correlation_id:
+        telemetry.correlation_id.set(x_correlation_id)
+
+    response: Response = await call_next(request)
+    response.headers[constants.HTTPHeaders.CACHE_CONTROL.value] = "no-cache, no-store"
+    response.headers[constants.HTTPHeaders.PRAGMA.value] = "no-cache"
+    return response
+
+
+MIDDLEWARES: Dict[str, Middleware] = {
+    "base_http": Middleware(BaseHTTPMiddleware, dispatch=set_telemetry_ids),
+    "asgi": Middleware(TelemetryMiddleware),
+}
+
+
+def use_middleware(middleware: Middleware) -> None:
+    app.user_middleware = [middleware]
+    # The stack is rebuilt on the next request
+    app.middleware_stack = None
+
+
+async def create_client(http_client: httpx.AsyncClient) -> Dict[str, str]:
+    """Create a client that can request tokens and return its credentials"""
+
+    (
+        await http_client.post(
+            "/token-model",
+            json={
+                "id": "benchmark_token_model",
+                "issuer": "https://localhost",
+                "expires_in": 300,
+                "is_refreshable": False,
+                "token_type": "jwt",
+                "key_id": "my_key",
+            },
+            auth=MANAGEMENT_AUTH,
+        )
+    ).raise_for_status()
+    response = await http_client.post(
+        "/client",
+        json={
+            "id": "benchmark_client",
+            "authn_method": "client_secret_post",
+            "redirect_uris": ["https://localhost/callback"],
+            "response_types": [],
+            "grant_types": ["client_credentials"],
+            "scopes": [],
+            "is_pkce_required": False,
+            "token_model_id": "benchmark_token_model",
+        },
+        auth=MANAGEMENT_AUTH,
+    )
+    response.raise_for_status()
+    return {
+        "client_id": "benchmark_client",
+        "client_secret": response.json()["secret"],
+        "grant_type": "client_credentials",
+    }
+
+
+async def measure(
+    http_client: httpx.AsyncClient,
+    send_request: Callable,
+    number_of_requests: int,
+) -> Tuple[float, float]:
+    """Return the p50 and p99 latencies in microseconds"""
+
+    latencies: List[float] = []
+    for _ in range(number_of_requests):
+        start = time.perf_counter()
+        response: httpx.Response = await send_request(http_client)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        response.raise_for_status()
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    return percentiles[49], percentiles[98]
+
+
+async def main(number_of_requests: int) -> None:
+    manager.setup_in_memory_env()
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+    ) as http_client:
+        token_form = await create_client(http_client=http_client)
+        endpoints: Dict[str, Callable] = {
+            "/healthcheck": lambda c: c.get("/healthcheck"),
+            "/token": lambda c: c.post("/token", data=token_form),
+        }
+
+        print(f"{'endpoint':>14} {'middleware':>10} {'p50':>10} {'p99':>10}")
+        for endpoint, send_request in endpoints.items():
+            for name, middleware in MIDDLEWARES.items():
+                use_middleware(middleware=middleware)
+                # Warm up
+                await measure(http_client, send_request, number_of_requests // 10)
+                p50, p99 = await measure(http_client, send_request, number_of_requests)
+                print(f"{endpoint:>14} {name:>10} {p50:>8.0f}us {p99:>8.0f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5_000)
+    args = parser.parse_args()
+    asyncio.run(main(number_of_requests=args.requests))
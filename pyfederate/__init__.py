@@ -1,9 +1,11 @@
 import uvicorn
 from .routes.core import app
 from .auth_manager import manager
-from .utils import constants
+from .utils import constants, tracing
 
 
 def run() -> None:
     manager.check_config()
+    if constants.TRACING_ENABLED:
+        tracing.setup_tracing()
     uvicorn.run(app, host="0.0.0.0", port=constants.SERVER_PORT)
@@ -1,7 +1,7 @@
 from typing import List
 from fastapi import Request
 import asyncio
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine
 
 from .utils.managers.token_manager import (
     TokenModelManager,
@@ -17,9 +17,20 @@ from .utils.managers.client_manager import (
     ClientManager,
     InMemoryClientManager,
     OLTPClientManager,
+    CachedClientManager,
 )
-from .utils.managers.session_manager import SessionManager, InMemorySessionManager
-from .utils import constants, schemas, tools, exceptions, models
+from .utils.managers.session_manager import (
+    SessionManager,
+    InMemorySessionManager,
+    OLTPSessionManager,
+    RedisSessionManager,
+)
+from .utils.managers.rate_limiter import (
+    RateLimiter,
+    InMemoryRateLimiter,
+    RedisRateLimiter,
+)
+from .utils import constants, schemas, tools, exceptions, models, database, metrics
 
 
 @tools.singleton
@@ -31,7 +42,10 @@ class AuthManager:
         self._scope_manager: ScopeManager | None = None
         self._client_manager: ClientManager | None = None
         self._session_manager: SessionManager | None = None
+        self._engine: AsyncEngine | None = None
         self.authn_policies: List[schemas.AuthnPolicy] = []
+        # Only used when a rate limit is configured
+        self.rate_limiter: RateLimiter = InMemoryRateLimiter()
 
     @property
     def token_model_manager(self) -> TokenModelManager:
@@ -43,7 +57,9 @@ class AuthManager:
     def token_model_manager(self, token_model_manager: TokenModelManager) -> None:
         if self._token_model_manager is not None:
             raise RuntimeError()
-        self._token_model_manager = token_model_manager
+        self._token_model_manager = metrics.instrument_manager(
+            manager=token_model_manager, name="token_model_manager"
+        )
 
     @property
     def scope_manager(self) -> ScopeManager:
@@ -55,7 +71,9 @@ class AuthManager:
     def scope_manager(self, scope_manager: ScopeManager) -> None:
         if self._scope_manager is not None:
             raise RuntimeError()
-        self._scope_manager = scope_manager
+        self._scope_manager = metrics.instrument_manager(
+            manager=scope_manager, name="scope_manager"
+        )
 
     @property
     def client_manager(self) -> ClientManager:
@@ -67,7 +85,9 @@ class AuthManager:
     def client_manager(self, client_manager: ClientManager) -> None:
         if self._client_manager is not None:
             raise RuntimeError()
-        self._client_manager = client_manager
+        self._client_manager = metrics.instrument_manager(
+            manager=client_manager, name="client_manager"
+        )
 
     @property
     def session_manager(self) -> SessionManager:
@@ -79,7 +99,9 @@ class AuthManager:
     def session_manager(self, session_manager: SessionManager) -> None:
         if self._session_manager is not None:
             raise RuntimeError()
-        self._session_manager = session_manager
+        self._session_manager = metrics.instrument_manager(
+            manager=session_manager, name="session_manager"
+        )
 
     def register_authn_policy(self, authn_policy: schemas.AuthnPolicy) -> None:
         self.authn_policies.append(authn_policy)
@@ -111,9 +133,24 @@ class AuthManager:
         ), "The auth manager is missing configurations"
 
         assert asyncio.run(
-            self.verify_signing_keys()
+            self._verify_signing_keys_before_startup()
         ), "There are signing keys defined in the token models that are not available"
 
+    async def _verify_signing_keys_before_startup(self) -> bool:
+        try:
+            return await self.verify_signing_keys()
+        finally:
+            # The database connections are bound to the event loop that opened them,
+            # so they cannot be reused by the server
+            if self._engine is not None:
+                await self._engine.dispose()
+
+    @staticmethod
+    async def _create_tables(engine: AsyncEngine) -> None:
+        async with engine.begin() as connection:
+            await connection.run_sync(models.Base.metadata.create_all)
+        await engine.dispose()
+
     def setup_in_memory_env(self) -> None:
         self.token_model_manager = InMemoryTokenModelManager()
         self.scope_manager = InMemoryScopeManager()
@@ -122,15 +159,39 @@ class AuthManager:
         )
         self.session_manager = InMemorySessionManager()
 
-    def setup_oltp_env(self, db_string: str) -> None:
-        engine = create_engine(
-            "sqlite:///./sql_app.db", connect_args={"check_same_thread": False}
+    def setup_oltp_env(
+        self,
+        db_string: str,
+        redis_url: str | None = None,
+        pool_size: int = constants.DB_POOL_SIZE,
+        max_overflow: int = constants.DB_MAX_OVERFLOW,
+    ) -> None:
+        """
+        Set up the managers backed by the database db_string points to,
+        e.g. sqlite+aiosqlite:///./sql_app.db.
+        When the redis_url is informed, the sessions and the rate limits are stored
+        in the RESP compatible server it points to instead.
+        """
+        engine = database.create_engine(
+            db_string=db_string, pool_size=pool_size, max_overflow=max_overflow
         )
-        models.Base.metadata.create_all(bind=engine)
+        asyncio.run(self._create_tables(engine=engine))
+        self._engine = engine
         self.token_model_manager = OLTPTokenModelManager(engine=engine)
         self.scope_manager = OLTPScopeManager(engine=engine)
-        self.client_manager = OLTPClientManager(engine=engine)
-        self.session_manager = InMemorySessionManager()  # TODO: Update when available
+        self.client_manager = (
+            CachedClientManager(client_manager=OLTPClientManager(engine=engine))
+            if constants.CLIENT_CACHE_TTL > 0
+            else OLTPClientManager(engine=engine)
+        )
+        if redis_url:
+            from redis.asyncio import Redis
+
+            redis_client = Redis.from_url(redis_url, decode_responses=True)
+            self.session_manager = RedisSessionManager(client=redis_client)
+            self.rate_limiter = RedisRateLimiter(client=redis_client)
+        else:
+            self.session_manager = OLTPSessionManager(engine=engine)
 
 
 manager = AuthManager()
@@ -1,17 +1,49 @@
-from fastapi import FastAPI, Request, Response, status
-from fastapi.responses import JSONResponse, RedirectResponse
+from typing import AsyncIterator, Dict
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.staticfiles import StaticFiles
 
 from . import oauth, management
-from ..utils import constants, telemetry, tools, exceptions
+from ..utils import (
+    constants,
+    telemetry,
+    tools,
+    exceptions,
+    middlewares,
+    metrics,
+    signing,
+)
+from ..utils.cache import TTLCache
+from ..auth_manager import manager
 
 logger = telemetry.get_logger(__name__)
 
-app = FastAPI(title="Custom Authorization Server", version=constants.VERSION)
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Release the resources of the server when it stops"""
+    yield
+    signing.shutdown_signing_engine()
+
+
+app = FastAPI(
+    title="Custom Authorization Server", version=constants.VERSION, lifespan=lifespan
+)
 # app.mount("/templates/static", StaticFiles(directory="templates/static"), name="static")
 app.include_router(oauth.router)
 app.include_router(management.router)
+if constants.ADMISSION_MAX_IN_FLIGHT > 0:
+    app.add_middleware(
+        middlewares.AdmissionControlMiddleware,
+        paths=[route.path for route in oauth.router.routes],  # type: ignore
+    )
+if constants.TRACING_ENABLED:
+    app.add_middleware(middlewares.TracingMiddleware)
+if constants.METRICS_ENABLED:
+    app.add_middleware(middlewares.MetricsMiddleware)
+app.add_middleware(middlewares.TelemetryMiddleware)
 
 ######################################## Shared ########################################
 
@@ -21,24 +53,28 @@ def check_health() -> None:
     return
 
 
-@app.middleware("http")
-async def set_telemetry_ids(request: Request, call_next) -> Response:
-    """Set the tracking and correlation IDs for each request"""
-
-    # Set the default values for the tracking and correlation IDs
-    telemetry.tracking_id.set(tools.generate_uuid())
-    x_correlation_id: str | None = request.headers.get(
-        constants.HTTPHeaders.X_CORRELATION_ID.value
+if constants.METRICS_ENABLED:
+    # Counting the live sessions may query the storage, so the counts are reused
+    # by the scrapes that happen within the TTL
+    live_session_counts: TTLCache[str, Dict[str, int]] = TTLCache(
+        max_size=1, ttl=constants.METRICS_LIVE_SESSIONS_CACHE_TTL
     )
-    if x_correlation_id:
-        telemetry.correlation_id.set(x_correlation_id)
 
-    response: Response = await call_next(request)
-    # Ensure clients don't cache the response
-    response.headers[constants.HTTPHeaders.CACHE_CONTROL.value] = "no-cache, no-store"
-    response.headers[constants.HTTPHeaders.PRAGMA.value] = "no-cache"
-
-    return response
+    @app.get(
+        "/metrics",
+        response_class=PlainTextResponse,
+        status_code=status.HTTP_200_OK,
+        description="Metrics in the Prometheus text format",
+        dependencies=[Depends(management.validate_credentials)],
+    )
+    async def get_metrics() -> str:
+        session_counts = live_session_counts.get("live_sessions")
+        if session_counts is None:
+            session_counts = await manager.session_manager.count_live_sessions() or {}
+            live_session_counts.set("live_sessions", session_counts)
+        for session_type, count in session_counts.items():
+            metrics.live_sessions.set(count, session_type)
+        return metrics.render()
 
 
 ######################################## Exceptions ########################################
@@ -71,6 +107,20 @@ def handle_json_exception(_: Request, exc: exceptions.JsonResponseException):
     )
 
 
+@app.exception_handler(exceptions.TooManyRequestsException)
+def handle_too_many_requests_exception(
+    _: Request, exc: exceptions.TooManyRequestsException
+):
+    return JSONResponse(
+        status_code=exc.error.value,
+        content={
+            "error": exc.error.name.lower(),
+            "error_description": exc.error_description,
+        },
+        headers={constants.HTTPHeaders.RETRY_AFTER.value: str(exc.retry_after)},
+    )
+
+
 @app.exception_handler(exceptions.RedirectResponseException)
 def handle_redirect_exception(_: Request, exc: exceptions.RedirectResponseException):
 
@@ -90,6 +90,8 @@ async def delete_token_model(
     _: Annotated[None, Depends(validate_credentials)],
 ) -> None:
     await manager.token_model_manager.delete_token_model(token_model_id=token_model_id)
+    # The clients embed their token model
+    manager.client_manager.invalidate_cache()
 
 
 #################### Scope ####################
@@ -135,6 +137,7 @@ async def delete_client(
     name: str, _: Annotated[None, Depends(validate_credentials)]
 ) -> None:
     await manager.scope_manager.delete_scope(scope_name=name)
+    manager.client_manager.invalidate_cache()
 
 
 #################### Client ####################
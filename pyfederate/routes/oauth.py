@@ -17,7 +17,7 @@ router = APIRouter(tags=["oauth"])
     status_code=status.HTTP_200_OK,
 )
 async def get_token(
-    client: Annotated[schemas.Client, Depends(helpers.get_authenticated_client)],
+    client: Annotated[schemas.Client, Depends(helpers.get_rate_limited_client)],
     grant_type: Annotated[GrantType, Form()],
     requested_scopes: Annotated[List[str], Depends(helpers.get_scopes_as_form)],
     code: Annotated[str | None, Form(description="Authorization code")] = None,
@@ -49,7 +49,61 @@ async def get_token(
         correlation_id=correlation_id,
     )
 
-    return await helpers.grant_handlers[grant_type](grant_context)
+    return await helpers.handle_grant(grant_context=grant_context)
+
+
+@router.post(
+    "/introspect",
+    response_model=schemas.IntrospectionResponse,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    description="Token introspection endpoint as defined by RFC 7662",
+)
+async def introspect(
+    _: Annotated[schemas.Client, Depends(helpers.get_confidential_client)],
+    token: Annotated[str, Form()],
+    correlation_id: constants.CORRELATION_ID_HEADER_TYPE = None,
+) -> schemas.IntrospectionResponse:
+    # The token_type_hint parameter is ignored as RFC 7662 allows,
+    # since any token is found by its ID in a single lookup
+    return await helpers.introspect_token(token=token)
+
+
+@router.post(
+    "/introspect/batch",
+    response_model=List[schemas.IntrospectionResponse],
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    description="Introspect many tokens at once, the results follow the order of the tokens",
+)
+async def introspect_batch(
+    _: Annotated[schemas.Client, Depends(helpers.get_confidential_client)],
+    tokens: Annotated[List[str], Form(alias="token")],
+    correlation_id: constants.CORRELATION_ID_HEADER_TYPE = None,
+) -> List[schemas.IntrospectionResponse]:
+
+    if len(tokens) > constants.INTROSPECTION_BATCH_MAX_SIZE:
+        raise exceptions.JsonResponseException(
+            error=constants.ErrorCode.INVALID_REQUEST,
+            error_description=f"at most {constants.INTROSPECTION_BATCH_MAX_SIZE} tokens can be introspected at once",
+        )
+    return await helpers.introspect_tokens(tokens=tokens)
+
+
+@router.post(
+    "/revoke",
+    status_code=status.HTTP_200_OK,
+    description="Token revocation endpoint as defined by RFC 7009",
+)
+async def revoke(
+    client: Annotated[schemas.Client, Depends(helpers.get_authenticated_client)],
+    token: Annotated[str, Form()],
+    token_type_hint: Annotated[constants.TokenTypeHint | None, Form()] = None,
+    correlation_id: constants.CORRELATION_ID_HEADER_TYPE = None,
+) -> None:
+    await helpers.revoke_token(
+        client=client, token=token, token_type_hint=token_type_hint
+    )
 
 
 @router.post(
@@ -59,7 +113,7 @@ async def get_token(
 )
 async def push_authorization_request(
     request: Request,
-    client: Annotated[schemas.Client, Depends(helpers.get_authenticated_client)],
+    client: Annotated[schemas.Client, Depends(helpers.get_rate_limited_client)],
     response_types: Annotated[
         List[constants.ResponseType], Depends(helpers.get_response_types_as_form)
     ],
@@ -140,7 +194,9 @@ async def push_authorization_request(
 @router.get("/authorize", status_code=status.HTTP_200_OK)
 async def authorize(
     request: Request,
-    client: Annotated[schemas.Client, Depends(helpers.get_client_as_query)],
+    client: Annotated[
+        schemas.Client, Depends(helpers.get_rate_limited_client_as_query)
+    ],
     response_types: Annotated[
         List[constants.ResponseType], Depends(helpers.get_response_types_as_query)
     ],
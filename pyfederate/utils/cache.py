@@ -0,0 +1,64 @@
+from typing import Generic, Hashable, Tuple, TypeVar
+from collections import OrderedDict
+import time
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Bounded cache whose entries expire ttl seconds after being set.
+    When the cache is full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        # Map the keys to their values and expiration, ordered from the least to the most recently used
+        self._entries: OrderedDict[K, Tuple[V, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """Store the value for ttl seconds, or for the ttl of the cache if not informed"""
+        if self._max_size <= 0:
+            return
+
+        self._entries[key] = (
+            value,
+            time.monotonic() + (self._ttl if ttl is None else ttl),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
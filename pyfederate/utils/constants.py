@@ -23,6 +23,7 @@ class HTTPHeaders(Enum):
     PRAGMA = "Pragma"
     LOCATION = "location"
     X_CORRELATION_ID = "X-Correlation-ID"
+    RETRY_AFTER = "Retry-After"
 
 
 class GrantType(Enum):
@@ -38,6 +39,12 @@ class ResponseType(Enum):
 
 class TokenType(Enum):
     JWT = "jwt"
+    OPAQUE = "opaque"
+
+
+class TokenTypeHint(Enum):
+    ACCESS_TOKEN = "access_token"
+    REFRESH_TOKEN = "refresh_token"
 
 
 class TokenClaim(Enum):
@@ -74,6 +81,17 @@ class ErrorCode(Enum):
     INVALID_SCOPE = status.HTTP_400_BAD_REQUEST
     UNAUTHORIZED_CLIENT = status.HTTP_401_UNAUTHORIZED
     NOT_UNAUTHORIZED = status.HTTP_401_UNAUTHORIZED
+    TOO_MANY_REQUESTS = status.HTTP_429_TOO_MANY_REQUESTS
+    TEMPORARILY_UNAVAILABLE = status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+class ClientParam(Enum):
+    """Keys of the client extra params with a meaning to the server"""
+
+    # Requests per second allowed to the client
+    RATE_LIMIT = "rate_limit"
+    # Requests the client can send at once after being idle
+    RATE_LIMIT_BURST = "rate_limit_burst"
 
 
 class AuthnStatus(Enum):
@@ -87,6 +105,19 @@ ENVIRONMENT = Environment(os.getenv("ENVIRONMENT", "TEST"))
 if ENVIRONMENT == Environment.TEST:
     load_dotenv("tests/test.env")
 LOG_LEVEL = logging.getLevelName(os.environ.get("LOG_LEVEL", "DEBUG"))
+# Levels of specific loggers, e.g. "pyfederate.utils.managers=INFO,pyfederate.utils.helpers=WARNING"
+LOG_LEVELS: Dict[str, str] = {
+    logger_name.strip(): level.strip().upper()
+    for logger_name, level in (
+        logger_level.split("=", 1)
+        for logger_level in os.getenv("LOG_LEVELS", "").split(",")
+        if "=" in logger_level
+    )
+}
+# Log records waiting to be written, the new ones are dropped once the queue is full
+LOG_QUEUE_MAX_SIZE = int(os.getenv("LOG_QUEUE_MAX_SIZE", 10000))
+# Max number of log records written at once by the log writer thread
+LOG_BATCH_MAX_SIZE = int(os.getenv("LOG_BATCH_MAX_SIZE", 500))
 CLIENT_ID_MIN_LENGH = int(os.getenv("CLIENT_ID_MIN_LENGH", 5))
 CLIENT_ID_MAX_LENGH = int(os.getenv("CLIENT_ID_MAX_LENGH", 50))
 CLIENT_SECRET_MIN_LENGH = int(os.getenv("CLIENT_SECRET_MIN_LENGH", 10))
@@ -94,12 +125,90 @@ CLIENT_SECRET_MAX_LENGH = int(os.getenv("CLIENT_SECRET_MAX_LENGH", 50))
 CALLBACK_ID_LENGTH = int(os.getenv("CALLBACK_ID_LENGTH", 20))
 SESSION_ID_LENGTH = int(os.getenv("SESSION_ID_LENGTH", 20))
 REFRESH_TOKEN_LENGTH = int(os.getenv("REFRESH_TOKEN_LENGTH", 20))
+OPAQUE_TOKEN_LENGTH = int(os.getenv("OPAQUE_TOKEN_LENGTH", 32))
 AUTHORIZATION_CODE_LENGTH = int(os.getenv("AUTHORIZATION_CODE_LENGTH", 20))
 STATE_PARAM_MAX_LENGTH = int(os.getenv("STATE_PARAM_MAX_LENGTH", 100))
 SECRET_ENCODING = os.getenv("SECRET_ENCODING", "utf-8")
 AUTHORIZATION_CODE_TIMEOUT = int(os.getenv("AUTHORIZATION_SESSION_TIMEOUT", 300))
 REQUEST_URI_LENGTH = int(os.getenv("REQUEST_URI_LENGTH", 20))
 REQUEST_URI_TIMEOUT = int(os.getenv("REQUEST_URI_TIMEOUT", 60))
+# Time the user has to go through the authentication policy
+AUTHN_SESSION_TIMEOUT = int(os.getenv("AUTHN_SESSION_TIMEOUT", 600))
+# Lifetime of the refresh tokens issued by token models that don't define one
+REFRESH_TOKEN_TIMEOUT = int(os.getenv("REFRESH_TOKEN_TIMEOUT", 86400))
+# Expired sessions stored in the database are deleted in batches at this interval
+SESSION_PURGE_INTERVAL = int(os.getenv("SESSION_PURGE_INTERVAL", 60))
+SESSION_PURGE_BATCH_SIZE = int(os.getenv("SESSION_PURGE_BATCH_SIZE", 500))
+# Connection pool of the OLTP engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+# Connections older than this many seconds are replaced, -1 keeps them forever
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", -1))
+# Statement timeout in milliseconds, 0 disables it. SQLite only supports a lock wait timeout
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 0))
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+# Clients read from the database are cached for this many seconds, 0 disables the cache
+CLIENT_CACHE_TTL = int(os.getenv("CLIENT_CACHE_TTL", 60))
+CLIENT_CACHE_MAX_SIZE = int(os.getenv("CLIENT_CACHE_MAX_SIZE", 10000))
+# bcrypt releases the GIL, so the secrets are verified by a pool of threads
+SECRET_VERIFICATION_WORKERS = int(
+    os.getenv("SECRET_VERIFICATION_WORKERS", min(4, os.cpu_count() or 1))
+)
+# Secrets verified successfully are remembered for this many seconds, 0 disables the cache
+VERIFIED_SECRET_CACHE_TTL = int(os.getenv("VERIFIED_SECRET_CACHE_TTL", 300))
+VERIFIED_SECRET_CACHE_MAX_SIZE = int(os.getenv("VERIFIED_SECRET_CACHE_MAX_SIZE", 10000))
+# Tokens kept for token models that allow reusing them
+REUSABLE_TOKEN_CACHE_MAX_SIZE = int(os.getenv("REUSABLE_TOKEN_CACHE_MAX_SIZE", 10000))
+# Processes that sign the tokens of asymmetric keys, 0 signs them on the event loop
+SIGNING_PROCESSES = int(os.getenv("SIGNING_PROCESSES", 0))
+# Signing jobs arriving within this many microseconds are sent to a process together
+SIGNING_BATCH_WINDOW_MICROSECS = int(os.getenv("SIGNING_BATCH_WINDOW_MICROSECS", 200))
+SIGNING_BATCH_MAX_SIZE = int(os.getenv("SIGNING_BATCH_MAX_SIZE", 64))
+# Active introspection results are cached for this fraction of the token remaining lifetime
+INTROSPECTION_CACHE_LIFETIME_RATIO = float(
+    os.getenv("INTROSPECTION_CACHE_LIFETIME_RATIO", 0.1)
+)
+# Inactive tokens never become active, but the cache must not fill up with them
+INTROSPECTION_INACTIVE_CACHE_TTL = int(
+    os.getenv("INTROSPECTION_INACTIVE_CACHE_TTL", 10)
+)
+INTROSPECTION_CACHE_MAX_SIZE = int(os.getenv("INTROSPECTION_CACHE_MAX_SIZE", 10000))
+INTROSPECTION_BATCH_MAX_SIZE = int(os.getenv("INTROSPECTION_BATCH_MAX_SIZE", 100))
+# Revoked token IDs kept in memory before the filter that checks them has to grow
+REVOKED_TOKENS_CAPACITY = int(os.getenv("REVOKED_TOKENS_CAPACITY", 100000))
+REVOKED_TOKENS_FALSE_POSITIVE_RATE = float(
+    os.getenv("REVOKED_TOKENS_FALSE_POSITIVE_RATE", 0.01)
+)
+# Token buckets of /token, /par and /authorize in requests per second, 0 disables them.
+# Clients can override their limit with the rate_limit and rate_limit_burst extra params
+CLIENT_RATE_LIMIT = float(os.getenv("CLIENT_RATE_LIMIT", 0))
+CLIENT_RATE_LIMIT_BURST = int(os.getenv("CLIENT_RATE_LIMIT_BURST", 10))
+REMOTE_ADDRESS_RATE_LIMIT = float(os.getenv("REMOTE_ADDRESS_RATE_LIMIT", 0))
+REMOTE_ADDRESS_RATE_LIMIT_BURST = int(os.getenv("REMOTE_ADDRESS_RATE_LIMIT_BURST", 20))
+# Buckets kept in memory, the least recently used are dropped, which refills them
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# OAuth requests handled at once, the others wait in a queue. 0 disables the admission control
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", 64))
+ADMISSION_MAX_QUEUE_SIZE = int(os.getenv("ADMISSION_MAX_QUEUE_SIZE", 256))
+# Requests that wait longer than this in the queue are rejected with 503
+ADMISSION_LATENCY_TARGET_MILLISECS = int(
+    os.getenv("ADMISSION_LATENCY_TARGET_MILLISECS", 500)
+)
+# Measure the requests, the grants and the calls to the managers
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "pyfederate")
+# Seconds the live sessions count is reused by the scrapes of /metrics
+METRICS_LIVE_SESSIONS_CACHE_TTL = int(os.getenv("METRICS_LIVE_SESSIONS_CACHE_TTL", 30))
+# Record the spans of the requests and send them to the exporter: file, console or otlp
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "file")
+TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "spans.jsonl")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "pyfederate")
+TRACING_QUEUE_MAX_SIZE = int(os.getenv("TRACING_QUEUE_MAX_SIZE", 2048))
+TRACING_BATCH_MAX_SIZE = int(os.getenv("TRACING_BATCH_MAX_SIZE", 512))
 SERVER_PORT = int(os.getenv("SERVER_PORT", 80))
 BEARER_TOKEN_TYPE = "Bearer"
 VERSION = os.getenv("VERSION", "0.1.0")
@@ -0,0 +1,78 @@
+from typing import Any, Dict, List
+from sqlalchemy import event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from . import constants, telemetry
+
+logger = telemetry.get_logger(__name__)
+
+
+def is_in_memory_sqlite(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def get_session_statements(url: URL) -> List[str]:
+    """Get the statements that configure each new connection for the database backend"""
+
+    backend = url.get_backend_name()
+    statements: List[str] = []
+    if backend == "sqlite":
+        if not is_in_memory_sqlite(url=url):
+            statements.append(f"PRAGMA journal_mode={constants.SQLITE_JOURNAL_MODE}")
+        statements.append(f"PRAGMA synchronous={constants.SQLITE_SYNCHRONOUS}")
+        if constants.DB_STATEMENT_TIMEOUT:
+            # SQLite has no statement timeout, the closest is how long to wait for a lock
+            statements.append(f"PRAGMA busy_timeout={constants.DB_STATEMENT_TIMEOUT}")
+    elif backend == "postgresql" and constants.DB_STATEMENT_TIMEOUT:
+        statements.append(f"SET statement_timeout = {constants.DB_STATEMENT_TIMEOUT}")
+    elif backend in ("mysql", "mariadb") and constants.DB_STATEMENT_TIMEOUT:
+        statements.append(
+            f"SET SESSION max_execution_time = {constants.DB_STATEMENT_TIMEOUT}"
+        )
+
+    return statements
+
+
+def create_engine(
+    db_string: str,
+    pool_size: int = constants.DB_POOL_SIZE,
+    max_overflow: int = constants.DB_MAX_OVERFLOW,
+) -> AsyncEngine:
+    """
+    Create the engine used by the OLTP managers.
+    db_string must use an async driver, e.g. sqlite+aiosqlite or postgresql+asyncpg.
+    """
+
+    url = make_url(db_string)
+    engine_params: Dict[str, Any] = {
+        "pool_pre_ping": constants.DB_POOL_PRE_PING,
+        "pool_recycle": constants.DB_POOL_RECYCLE,
+    }
+    # In memory SQLite databases live in a single connection, so there is no pool to size
+    if not is_in_memory_sqlite(url=url):
+        # SQLAlchemy < 2.0.38 defaults to NullPool for file SQLite databases,
+        # which rejects the pool arguments
+        engine_params.update(
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=constants.DB_POOL_TIMEOUT,
+        )
+    engine = create_async_engine(url, **engine_params)
+
+    statements = get_session_statements(url=url)
+    if statements:
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def configure_connection(dbapi_connection: Any, connection_record: Any) -> None:
+            cursor = dbapi_connection.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.close()
+
+    logger.info(
+        f"Engine created for the {url.get_backend_name()} database with {engine_params}"
+    )
+    return engine
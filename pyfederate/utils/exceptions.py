@@ -17,6 +17,13 @@ class JsonResponseException(AuthnException):
     pass
 
 
+class TooManyRequestsException(JsonResponseException):
+    def __init__(self, error_description: str, retry_after: int) -> None:
+        # Seconds the caller should wait before retrying
+        self.retry_after = retry_after
+        super().__init__(constants.ErrorCode.TOO_MANY_REQUESTS, error_description)
+
+
 class RedirectResponseException(AuthnException):
     def __init__(
         self,
@@ -1,13 +1,35 @@
-from typing import Annotated, Awaitable, Callable, Dict, List
-from fastapi import Form, Query, Path, Request, Response
+from typing import Annotated, Any, Awaitable, Callable, Dict, FrozenSet, List, Tuple
+from fastapi import Depends, Form, Query, Path, Request, Response
 import inspect
+import asyncio
+import contextlib
+import math
+import time
+import jwt
 from datetime import datetime, timedelta
 
-from ..utils import constants, telemetry, schemas, tools, exceptions
+from ..utils import (
+    constants,
+    telemetry,
+    schemas,
+    tools,
+    exceptions,
+    signing,
+    metrics,
+    tracing,
+)
+from ..utils.cache import TTLCache
+from ..utils.revocation import RevokedTokens
 from .constants import GrantType, AuthnStatus
 from ..auth_manager import manager
 
 logger = telemetry.get_logger(__name__)
+# Map (client_id, token_model_id, scopes) to an access token and its expiration.
+# The entries expire when the tokens can no longer be reused
+reusable_tokens: TTLCache[Tuple[str, str, FrozenSet[str]], Tuple[str, int]] = TTLCache(
+    max_size=constants.REUSABLE_TOKEN_CACHE_MAX_SIZE, ttl=0
+)
+metrics.register_cache(name="reusable_tokens", cache=reusable_tokens)
 
 ######################################## Dependency Functions ########################################
 
@@ -33,8 +55,51 @@ async def get_authenticated_client(
             error_description=f"client with id: {client_id} does not exist",
         )
 
+    await authenticate_client(client=client, client_secret=client_secret)
+    return client
+
+
+async def get_confidential_client(
+    client: Annotated[schemas.Client, Depends(get_authenticated_client)]
+) -> schemas.Client:
+    """Same as get_authenticated_client, but public clients are rejected"""
+
+    if client.authn_method == constants.ClientAuthnMethod.NONE:
+        raise exceptions.JsonResponseException(
+            error=constants.ErrorCode.UNAUTHORIZED_CLIENT,
+            error_description=f"the client must authenticate to call this endpoint",
+        )
+    return client
+
+
+async def get_rate_limited_client(
+    request: Request,
+    client_id: Annotated[str, Form()],
+    client_secret: Annotated[
+        str | None,
+        Form(
+            min_length=constants.CLIENT_SECRET_MIN_LENGH,
+            max_length=constants.CLIENT_SECRET_MAX_LENGH,
+        ),
+    ] = None,
+) -> schemas.Client:
+    """
+    Same as get_authenticated_client, but the calls over the rate limits
+    are rejected before the secret is verified
+    """
+
+    await limit_rate_by_remote_address(request=request)
+    client = await get_client_as_form(client_id=client_id)
+    await limit_rate_by_client(client=client)
+    await authenticate_client(client=client, client_secret=client_secret)
+    return client
+
+
+async def authenticate_client(
+    client: schemas.Client, client_secret: str | None
+) -> None:
     if client.authn_method == constants.ClientAuthnMethod.CLIENT_SECRET_POST:
-        if client_secret is None or not client.is_authenticated_by_secret(
+        if client_secret is None or not await client.verify_secret(
             client_secret=client_secret
         ):
             raise exceptions.JsonResponseException(
@@ -42,8 +107,6 @@ async def get_authenticated_client(
                 error_description=f"invalid credentials",
             )
 
-    return client
-
 
 async def get_client_as_form(client_id: Annotated[str, Form()]) -> schemas.Client:
 
@@ -67,6 +130,16 @@ async def get_client_as_query(client_id: Annotated[str, Query()]) -> schemas.Cli
         )
 
 
+async def get_rate_limited_client_as_query(
+    request: Request, client_id: Annotated[str, Query()]
+) -> schemas.Client:
+
+    await limit_rate_by_remote_address(request=request)
+    client = await get_client_as_query(client_id=client_id)
+    await limit_rate_by_client(client=client)
+    return client
+
+
 def setup_telemetry(session: schemas.AuthnSession) -> None:
     """Overwrite the telemetry IDs set by default with the ones from the session"""
 
@@ -150,6 +223,50 @@ def get_response_types_as_query(
     return get_response_types(response_type=response_type)
 
 
+######################################## Rate Limit ########################################
+
+remote_address_rate_limit: schemas.RateLimit | None = (
+    schemas.RateLimit(
+        rate=constants.REMOTE_ADDRESS_RATE_LIMIT,
+        burst=constants.REMOTE_ADDRESS_RATE_LIMIT_BURST,
+    )
+    if constants.REMOTE_ADDRESS_RATE_LIMIT > 0
+    else None
+)
+
+
+async def limit_rate(key: str, rate_limit: schemas.RateLimit, limit_name: str) -> None:
+    """Raise TooManyRequestsException if the bucket of the key is empty"""
+
+    retry_after = await manager.rate_limiter.acquire(key=key, rate_limit=rate_limit)
+    if retry_after > 0:
+        metrics.rate_limited_requests.inc(limit_name)
+        logger.info(f"The {limit_name} rate limit was exceeded by {key}")
+        raise exceptions.TooManyRequestsException(
+            error_description=f"the {limit_name} rate limit was exceeded",
+            retry_after=math.ceil(retry_after),
+        )
+
+
+async def limit_rate_by_remote_address(request: Request) -> None:
+    if remote_address_rate_limit is None or request.client is None:
+        return
+    await limit_rate(
+        key=f"remote_address:{request.client.host}",
+        rate_limit=remote_address_rate_limit,
+        limit_name="remote_address",
+    )
+
+
+async def limit_rate_by_client(client: schemas.Client) -> None:
+    rate_limit = client.get_rate_limit()
+    if rate_limit is None:
+        return
+    await limit_rate(
+        key=f"client:{client.id}", rate_limit=rate_limit, limit_name="client"
+    )
+
+
 ######################################## /token ########################################
 
 #################### Client Credentials ####################
@@ -191,19 +308,48 @@ async def client_credentials_token_handler(
 
     validate_client_credentials_grant(grant_context=grant_context)
 
+    token_model = grant_context.token_model
     timestamp_now = tools.get_timestamp_now()
+    reuse_key = (
+        grant_context.client.id,
+        token_model.id,
+        frozenset(grant_context.requested_scopes),
+    )
+    if token_model.is_reusable:
+        reusable_token = reusable_tokens.get(reuse_key)
+        if reusable_token is not None:
+            access_token, expiration = reusable_token
+            return schemas.TokenResponse(
+                access_token=access_token, expires_in=expiration - timestamp_now
+            )
+
     token_info = schemas.TokenInfo(
+        id=token_model.generate_token_id(),
         subject=grant_context.client.id,
-        issuer=grant_context.token_model.id,
+        issuer=token_model.issuer,
         issued_at=timestamp_now,
-        expiration=timestamp_now + grant_context.token_model.expires_in,
+        expiration=timestamp_now + token_model.expires_in,
         client_id=grant_context.client.id,
         scopes=grant_context.requested_scopes,
         additional_info={},
     )
+    access_token = await token_model.generate_token_async(token_info=token_info)
+    # Opaque tokens only exist in the session manager
+    if isinstance(token_model, schemas.OpaqueTokenModel):
+        await create_token_session(
+            authz_code_context=grant_context,
+            token_info=token_info,
+            issue_refresh_token=False,
+        )
+    if token_model.is_reusable:
+        reusable_tokens.set(
+            reuse_key,
+            (access_token, token_info.expiration),
+            ttl=token_model.expires_in * (1 - token_model.reuse_min_lifetime_ratio),
+        )
+
     return schemas.TokenResponse(
-        access_token=grant_context.token_model.generate_token(token_info=token_info),
-        expires_in=grant_context.token_model.expires_in,
+        access_token=access_token, expires_in=token_model.expires_in
     )
 
 
@@ -231,24 +377,51 @@ async def setup_session_by_authz_code(authz_code: str) -> schemas.AuthnSession:
     return session
 
 
+def get_token_session_expiration(
+    token_model: schemas.TokenModel, token_info: schemas.TokenInfo, is_refreshable: bool
+) -> int:
+    """The token session must live as long as its access token or its refresh token"""
+
+    if not is_refreshable:
+        return token_info.expiration
+
+    refresh_lifetime_secs: int = (
+        token_model.refresh_lifetime_secs
+        if token_model.refresh_lifetime_secs
+        else constants.REFRESH_TOKEN_TIMEOUT
+    )
+    return max(token_info.expiration, token_info.issued_at + refresh_lifetime_secs)
+
+
 async def create_token_session(
-    authz_code_context: schemas.GrantContext, token_info: schemas.TokenInfo
+    authz_code_context: schemas.GrantContext,
+    token_info: schemas.TokenInfo,
+    issue_refresh_token: bool = True,
 ) -> schemas.TokenSession:
 
-    token_session = schemas.TokenSession(
-        token_id=token_info.id,
-        refresh_token=tools.generate_refresh_token()
+    refresh_token: str | None = (
+        tools.generate_refresh_token()
         if (
-            authz_code_context.client.is_grant_type_allowed(
+            issue_refresh_token
+            and authz_code_context.client.is_grant_type_allowed(
                 grant_type=constants.GrantType.REFRESH_TOKEN
             )
             and authz_code_context.token_model.is_refreshable
         )
-        else None,
+        else None
+    )
+    token_session = schemas.TokenSession(
+        token_id=token_info.id,
+        refresh_token=refresh_token,
         client_id=authz_code_context.client.id,
         token_model_id=authz_code_context.token_model.id,
         token_info=token_info,
         created_at=datetime.now(),
+        expiration=get_token_session_expiration(
+            token_model=authz_code_context.token_model,
+            token_info=token_info,
+            is_refreshable=refresh_token is not None,
+        ),
     )
     await manager.session_manager.create_token_session(session=token_session)
     return token_session
@@ -281,7 +454,8 @@ async def validate_authorization_code_grant(
         )
 
     if grant_context.client.id != session.client_id:
-        await manager.session_manager.delete_session(session_id=session.id)
+        with contextlib.suppress(exceptions.EntityDoesNotExistException):
+            await manager.session_manager.delete_session(session_id=session.id)
         raise exceptions.JsonResponseException(
             error=constants.ErrorCode.INVALID_REQUEST,
             error_description=f"code issued for another client",
@@ -325,13 +499,20 @@ async def authorization_code_token_handler(
     await validate_authorization_code_grant(
         grant_context=grant_context, session=session
     )
-    # Delete the session from storage to make sure the authz code can no longer be used
-    await manager.session_manager.delete_session(session_id=session.id)
+    # Delete the session from storage to make sure the authz code can no longer be used.
+    # Only one of the concurrent requests with the same code deletes it
+    try:
+        await manager.session_manager.delete_session(session_id=session.id)
+    except exceptions.EntityDoesNotExistException:
+        raise exceptions.JsonResponseException(
+            error=constants.ErrorCode.INVALID_GRANT, error_description=f"invalid code"
+        )
 
     # Generate the token
     authn_policy: schemas.AuthnPolicy = schemas.AUTHN_POLICIES[session.auth_policy_id]
     timestamp_now = tools.get_timestamp_now()
     token_info = schemas.TokenInfo(
+        id=grant_context.token_model.generate_token_id(),
         # The user_id was already validated by the validators in AuthorizationCodeContext
         subject=session.user_id,  # type: ignore
         issuer=grant_context.token_model.issuer,
@@ -347,7 +528,9 @@ async def authorization_code_token_handler(
         authz_code_context=grant_context, token_info=token_info
     )
     return schemas.TokenResponse(
-        access_token=grant_context.token_model.generate_token(token_info=token_info),
+        access_token=await grant_context.token_model.generate_token_async(
+            token_info=token_info
+        ),
         refresh_token=token_session.refresh_token,
         expires_in=grant_context.token_model.expires_in,
     )
@@ -377,14 +560,37 @@ def validate_refresh_token_grant(
 async def update_token_session(
     token_session: schemas.TokenSession, token_model: schemas.TokenModel
 ) -> None:
-    """Update the token session properties"""
+    """
+    Update the token session properties.
+    The refreshed access token gets a new ID, so an opaque token stops working
+    once it is refreshed.
+    """
 
     timestamp_now = tools.get_timestamp_now()
+    previous_refresh_token = token_session.refresh_token
+    previous_token_id = token_session.token_id
+    previous_token_expiration = token_session.token_info.expiration
     # Update the token session
-    token_session.token_info.expiration = timestamp_now
+    token_session.token_info.id = token_model.generate_token_id()
+    token_session.token_id = token_session.token_info.id
+    token_session.token_info.issued_at = timestamp_now
     token_session.token_info.expiration = timestamp_now + token_model.expires_in
     token_session.refresh_token = tools.generate_refresh_token()
-    await manager.session_manager.update_token_session(session=token_session)
+    # Make sure the session outlives the new access token
+    token_session.expiration = max(
+        token_session.expiration, token_session.token_info.expiration
+    )
+    await manager.session_manager.rotate_refresh_token(
+        session=token_session,
+        # The sessions are found by their refresh tokens when refreshed
+        previous_refresh_token=previous_refresh_token,  # type: ignore
+        previous_token_id=previous_token_id,
+    )
+    # The previous access token may still be valid by itself, e.g. a JWT
+    revoked_tokens.revoke(
+        token_id=previous_token_id, expiration=previous_token_expiration
+    )
+    introspection_results.pop(previous_token_id)
 
 
 async def refresh_token_handler(
@@ -392,12 +598,19 @@ async def refresh_token_handler(
 ) -> schemas.TokenResponse:
 
     validate_refresh_token_grant(grant_context=grant_context)
+    # Revoked refresh tokens are rejected without hitting the storage
+    if revoked_tokens.is_revoked(token_id=grant_context.refresh_token):  # type: ignore
+        raise exceptions.JsonResponseException(
+            error=constants.ErrorCode.INVALID_GRANT,
+            error_description=f"invalid refresh token",
+        )
     try:
         token_session: schemas.TokenSession = await manager.session_manager.get_token_session_by_refresh_token(
             # The refresh token existence was validated by validate_refresh_token_grant.
             refresh_token=grant_context.refresh_token  # type: ignore
         )
     except exceptions.EntityDoesNotExistException:
+        await revoke_token_family(refresh_token=grant_context.refresh_token)  # type: ignore
         raise exceptions.JsonResponseException(
             error=constants.ErrorCode.INVALID_GRANT,
             error_description=f"invalid refresh token",
@@ -410,17 +623,32 @@ async def refresh_token_handler(
         token_session.created_at + timedelta(seconds=token_model.refresh_lifetime_secs)
         > datetime.now()
     ):
-        await manager.session_manager.delete_token_session(
-            session_id=token_session.token_id
-        )
+        with contextlib.suppress(exceptions.EntityDoesNotExistException):
+            await manager.session_manager.delete_token_session(
+                session_id=token_session.token_id
+            )
         raise exceptions.JsonResponseException(
             error=constants.ErrorCode.INVALID_GRANT,
             error_description=f"the refresh token expired",
         )
 
-    await update_token_session(token_session=token_session, token_model=token_model)
+    try:
+        await update_token_session(token_session=token_session, token_model=token_model)
+    except exceptions.EntityAlreadyExistsException:
+        # A concurrent request rotated the same refresh token first
+        await revoke_token_family(refresh_token=grant_context.refresh_token)  # type: ignore
+        raise exceptions.JsonResponseException(
+            error=constants.ErrorCode.INVALID_GRANT,
+            error_description=f"invalid refresh token",
+        )
+    except exceptions.EntityDoesNotExistException:
+        # The session was deleted while the refresh token was being rotated
+        raise exceptions.JsonResponseException(
+            error=constants.ErrorCode.INVALID_GRANT,
+            error_description=f"invalid refresh token",
+        )
     return schemas.TokenResponse(
-        access_token=token_model.generate_token(
+        access_token=await token_model.generate_token_async(
             token_info=token_session.token_info,
         ),
         refresh_token=token_session.refresh_token,
@@ -438,6 +666,338 @@ grant_handlers: Dict[
     GrantType.REFRESH_TOKEN: refresh_token_handler,
 }
 
+
+async def handle_grant(grant_context: schemas.GrantContext) -> schemas.TokenResponse:
+    """Call the handler of the grant type, measuring its latency and outcome"""
+
+    grant_type: str = grant_context.grant_type.value
+    outcome = "success"
+    start = time.perf_counter()
+    try:
+        with tracing.start_span(
+            name=f"grant {grant_type}",
+            attributes={"client_id": grant_context.client.id},
+        ):
+            return await grant_handlers[grant_context.grant_type](grant_context)
+    except exceptions.JsonResponseException as e:
+        outcome = e.error.name.lower()
+        raise
+    finally:
+        if constants.METRICS_ENABLED:
+            metrics.grant_requests.inc(grant_type, outcome)
+            metrics.grant_duration.observe(time.perf_counter() - start, grant_type)
+
+
+######################################## /introspect ########################################
+
+# Map the tokens to their introspection results
+introspection_results: TTLCache[str, schemas.IntrospectionResponse] = TTLCache(
+    max_size=constants.INTROSPECTION_CACHE_MAX_SIZE,
+    ttl=constants.INTROSPECTION_INACTIVE_CACHE_TTL,
+)
+metrics.register_cache(name="introspection_results", cache=introspection_results)
+inactive_token = schemas.IntrospectionResponse(active=False)
+
+
+def is_jwt(token: str) -> bool:
+    return token.count(".") == 2
+
+
+def get_token_id(token: str) -> str | None:
+    """Opaque tokens are their own ID, while JWTs carry it in the jti claim"""
+
+    if not is_jwt(token=token):
+        return token
+
+    try:
+        # The signature is verified later by the token model
+        payload = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
+    token_id = payload.get(constants.TokenClaim.JWT_ID.value)
+    return token_id if isinstance(token_id, str) else None
+
+
+async def introspect_stored_token(
+    token: str,
+) -> schemas.IntrospectionResponse | None:
+    """Introspect the tokens that have a token session"""
+
+    token_id = get_token_id(token=token)
+    if token_id is None:
+        return None
+
+    try:
+        token_session: schemas.TokenSession = (
+            await manager.session_manager.get_token_session_by_id(token_id=token_id)
+        )
+        token_model: schemas.TokenModel = (
+            await manager.token_model_manager.get_token_model(
+                token_model_id=token_session.token_model_id
+            )
+        )
+    except exceptions.EntityDoesNotExistException:
+        return None
+
+    if not token_model.is_token_valid(token=token, token_info=token_session.token_info):
+        return None
+    return schemas.IntrospectionResponse.from_token_info(
+        token_info=token_session.token_info
+    )
+
+
+async def verify_stateless_token(
+    token: str,
+) -> Tuple[schemas.JWTTokenModel, Dict[str, Any]] | None:
+    """
+    Verify the JWTs that don't have a token session, e.g. the ones issued
+    by the client credentials grant, with the token model their issuer and key ID
+    point to. Return the token model and the claims of the token
+    """
+
+    try:
+        key_id = jwt.get_unverified_header(token).get("kid")
+        # The signature is verified below by the token model
+        issuer = jwt.decode(token, options={"verify_signature": False}).get(
+            constants.TokenClaim.ISSUER.value
+        )
+    except jwt.InvalidTokenError:
+        return None
+    if not isinstance(key_id, str) or not isinstance(issuer, str):
+        return None
+
+    token_models = await manager.token_model_manager.get_jwt_token_models(
+        issuer=issuer, key_id=key_id
+    )
+    if not token_models:
+        return None
+    # The models with the same key verify the tokens the same way
+    token_model = token_models[0]
+    try:
+        payload = signing.get_signer(
+            key_id=token_model.key_id,
+            key=token_model.key,
+            signing_algorithm=token_model.signing_algorithm,
+        ).decode(token=token)
+    except jwt.InvalidTokenError:
+        return None
+    return token_model, payload
+
+
+async def introspect_stateless_token(
+    token: str,
+) -> schemas.IntrospectionResponse | None:
+
+    verified_token = await verify_stateless_token(token=token)
+    if verified_token is None:
+        return None
+    _, payload = verified_token
+    return schemas.IntrospectionResponse.from_jwt_payload(payload=payload)
+
+
+async def introspect_token(token: str) -> schemas.IntrospectionResponse:
+    """
+    Get the state of the token as defined by RFC 7662.
+    The active results are cached for a fraction of the token remaining lifetime,
+    so revoking a token must also remove it from the cache
+    """
+
+    introspection_result = introspection_results.get(token)
+    if introspection_result is not None:
+        # Refresh tokens can be revoked without knowing the access token they cache
+        if introspection_result.jti and revoked_tokens.is_revoked(
+            token_id=introspection_result.jti
+        ):
+            return inactive_token
+        return introspection_result
+
+    introspection_result = await introspect_stored_token(token=token)
+    if introspection_result is None and is_jwt(token=token):
+        introspection_result = await introspect_stateless_token(token=token)
+
+    timestamp_now = tools.get_timestamp_now()
+    if (
+        introspection_result is None
+        or introspection_result.exp is None
+        or introspection_result.exp <= timestamp_now
+        or (
+            introspection_result.jti is not None
+            and revoked_tokens.is_revoked(token_id=introspection_result.jti)
+        )
+    ):
+        introspection_results.set(token, inactive_token)
+        return inactive_token
+
+    introspection_results.set(
+        token,
+        introspection_result,
+        ttl=(introspection_result.exp - timestamp_now)
+        * constants.INTROSPECTION_CACHE_LIFETIME_RATIO,
+    )
+    return introspection_result
+
+
+async def introspect_tokens(
+    tokens: List[str],
+) -> List[schemas.IntrospectionResponse]:
+    """Introspect the tokens concurrently, looking up repeated tokens only once"""
+
+    unique_tokens = list(dict.fromkeys(tokens))
+    introspection_results_ = await asyncio.gather(
+        *[introspect_token(token=token) for token in unique_tokens]
+    )
+    results_by_token = dict(zip(unique_tokens, introspection_results_))
+    return [results_by_token[token] for token in tokens]
+
+
+######################################## /revoke ########################################
+
+revoked_tokens = RevokedTokens(
+    capacity=constants.REVOKED_TOKENS_CAPACITY,
+    false_positive_rate=constants.REVOKED_TOKENS_FALSE_POSITIVE_RATE,
+)
+
+
+async def get_token_session_to_revoke(
+    token: str, token_type_hint: constants.TokenTypeHint | None
+) -> schemas.TokenSession | None:
+    """Look up the session by the type hinted first, falling back to the other one"""
+
+    async def get_by_refresh_token() -> schemas.TokenSession:
+        return await manager.session_manager.get_token_session_by_refresh_token(
+            refresh_token=token
+        )
+
+    async def get_by_token_id() -> schemas.TokenSession:
+        token_id = get_token_id(token=token)
+        if token_id is None:
+            raise exceptions.EntityDoesNotExistException()
+        return await manager.session_manager.get_token_session_by_id(token_id=token_id)
+
+    lookups = [get_by_token_id, get_by_refresh_token]
+    if token_type_hint == constants.TokenTypeHint.REFRESH_TOKEN:
+        lookups.reverse()
+
+    for lookup in lookups:
+        try:
+            return await lookup()
+        except exceptions.EntityDoesNotExistException:
+            continue
+    return None
+
+
+async def revoke_token(
+    client: schemas.Client,
+    token: str,
+    token_type_hint: constants.TokenTypeHint | None,
+) -> None:
+    """
+    Revoke the token as defined by RFC 7009.
+    Revoking a token revokes its whole token session, i.e. the access token and the
+    refresh token. Unknown tokens are ignored.
+    """
+
+    token_session = await get_token_session_to_revoke(
+        token=token, token_type_hint=token_type_hint
+    )
+    if token_session is not None:
+        client_id, token_id, expiration, scopes = (
+            token_session.client_id,
+            token_session.token_info.id,
+            token_session.token_info.expiration,
+            token_session.token_info.scopes,
+        )
+    elif is_jwt(token=token):
+        # Stateless JWTs can only be revoked by remembering their IDs
+        verified_token = await verify_stateless_token(token=token)
+        if verified_token is None:
+            return
+        token_model, payload = verified_token
+        introspection_result = schemas.IntrospectionResponse.from_jwt_payload(
+            payload=payload
+        )
+        if introspection_result.jti is None or introspection_result.exp is None:
+            return
+        # The token may have been issued by a token model the client no longer uses
+        token_model_id = token_model.id
+        client_id, token_id, expiration, scopes = (
+            introspection_result.client_id,
+            introspection_result.jti,
+            introspection_result.exp,
+            get_scopes(scope_string=introspection_result.scope),
+        )
+    else:
+        return
+
+    if client_id != client.id:
+        raise exceptions.JsonResponseException(
+            error=constants.ErrorCode.UNAUTHORIZED_CLIENT,
+            error_description="the token was issued to another client",
+        )
+
+    introspection_results.pop(token)
+    if token_session is not None:
+        await revoke_token_session(token_session=token_session)
+        return
+
+    revoked_tokens.revoke(token_id=token_id, expiration=expiration)
+    reusable_tokens.pop((client.id, token_model_id, frozenset(scopes)))
+    logger.info(f"Token with ID: {token_id} revoked")
+
+
+async def revoke_token_session(token_session: schemas.TokenSession) -> None:
+    """Revoke the access token and the refresh token of the session"""
+
+    # The tokens are revoked even if a concurrent request deleted the session first
+    with contextlib.suppress(exceptions.EntityDoesNotExistException):
+        await manager.session_manager.delete_token_session(
+            session_id=token_session.token_id
+        )
+    revoked_tokens.revoke(
+        token_id=token_session.token_info.id,
+        expiration=token_session.token_info.expiration,
+    )
+    if token_session.refresh_token:
+        revoked_tokens.revoke(
+            token_id=token_session.refresh_token, expiration=token_session.expiration
+        )
+    # Opaque tokens are introspected by their IDs
+    introspection_results.pop(token_session.token_id)
+    reusable_tokens.pop(
+        (
+            token_session.client_id,
+            token_session.token_model_id,
+            frozenset(token_session.token_info.scopes),
+        )
+    )
+    logger.info(f"Token session with ID: {token_session.token_id} revoked")
+
+
+async def revoke_token_family(refresh_token: str) -> None:
+    """
+    Revoke the session that rotated the refresh token, if any.
+    A rotated refresh token should never be presented again, so it was either stolen
+    or is being replayed and none of the tokens derived from it can be trusted.
+    """
+
+    try:
+        token_id = (
+            await manager.session_manager.get_token_session_id_by_rotated_refresh_token(
+                refresh_token=refresh_token
+            )
+        )
+        token_session = await manager.session_manager.get_token_session_by_id(
+            token_id=token_id
+        )
+    except exceptions.EntityDoesNotExistException:
+        return
+
+    logger.info(
+        f"The rotated refresh token of the token session with ID: {token_id} was reused"
+    )
+    await revoke_token_session(token_session=token_session)
+
+
 ######################################## /authorize ########################################
 
 
@@ -504,7 +1064,8 @@ async def get_failure_next_step(
 
     # If the next step for a failure case is None, the policy failed,
     # then erase the session
-    await manager.session_manager.delete_session(session_id=session.id)
+    with contextlib.suppress(exceptions.EntityDoesNotExistException):
+        await manager.session_manager.delete_session(session_id=session.id)
 
 
 #################### Success ####################
@@ -563,10 +1124,13 @@ async def manage_authentication(
     authn_result = schemas.AuthnStepFailureResult(error_description="server error")
     # Once the next step is None, the processing finished
     while next_step:
-        authn_result_ = next_step.authn_func(session, request)
-        authn_result: schemas.AuthnStepResult = (
-            await authn_result_ if inspect.isawaitable(authn_result_) else authn_result_
-        )  # type: ignore
+        with tracing.start_span(name=f"authn_step {next_step.id}"):
+            authn_result_ = next_step.authn_func(session, request)
+            authn_result: schemas.AuthnStepResult = (
+                await authn_result_
+                if inspect.isawaitable(authn_result_)
+                else authn_result_
+            )  # type: ignore
         next_step = await step_update_handler[authn_result.status](session, next_step)
 
     # Return the response of the result generated in the last step of the loop
@@ -1,9 +1,10 @@
 import typing
-from sqlalchemy import delete, Engine
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 from abc import ABC, abstractmethod
 
-from .. import models, schemas, telemetry, tools, exceptions
+from .. import models, schemas, telemetry, tools, exceptions, constants, metrics
+from ..cache import TTLCache
 from ..constants import ClientAuthnMethod
 from .token_manager import TokenModelManager
 
@@ -45,6 +46,13 @@ class ClientManager(ABC):
     async def delete_client(self, client_id: str) -> None:
         pass
 
+    def invalidate_cache(self, client_id: str | None = None) -> None:
+        """
+        Discard the cached versions of the client or of all clients when no id is informed.
+        Managers that don't cache clients have nothing to do.
+        """
+        pass
+
 
 ######################################## Implementations ########################################
 
@@ -132,22 +140,25 @@ class InMemoryClientManager(ClientManager):
 
 
 class OLTPClientManager(ClientManager):
-    def __init__(self, engine: Engine) -> None:
+    def __init__(self, engine: AsyncEngine) -> None:
         self.engine = engine
+        self._session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
     async def create_client(self, client: schemas.ClientUpsert) -> schemas.Client:
 
-        with Session(self.engine) as db:
+        async with self._session_maker() as db:
 
-            scopes_db: typing.List[models.Scope] = (
-                db.query(models.Scope)
-                .filter(models.Scope.name.in_(client.scopes))
-                .all()
+            scopes_db: typing.List[models.Scope] = list(
+                await db.scalars(
+                    select(models.Scope).where(models.Scope.name.in_(client.scopes))
+                )
             )
             client_db = models.Client.to_db_model(client=client, scopes=scopes_db)
 
             db.add(client_db)
-            db.commit()
+            await db.commit()
+            # Relationships cannot be lazy loaded when using asyncio
+            await db.refresh(client_db, attribute_names=["token_model"])
 
             return client_db.to_schema(secret=client.secret)
 
@@ -156,9 +167,15 @@ class OLTPClientManager(ClientManager):
 
     async def get_client(self, client_id: str) -> schemas.Client:
 
-        with Session(self.engine) as db:
+        async with self._session_maker() as db:
             client_db: models.Client | None = (
-                db.query(models.Client).filter(models.Client.id == client_id).first()
+                (
+                    await db.scalars(
+                        select(models.Client).where(models.Client.id == client_id)
+                    )
+                )
+                .unique()
+                .first()
             )
 
         if client_db is None:
@@ -168,11 +185,64 @@ class OLTPClientManager(ClientManager):
 
     async def get_clients(self) -> typing.List[schemas.Client]:
 
-        with Session(self.engine) as db:
-            clients_db: typing.List[models.Client] = db.query(models.Client).all()
+        async with self._session_maker() as db:
+            clients_db: typing.Sequence[models.Client] = (
+                (await db.scalars(select(models.Client))).unique().all()
+            )
         return [client_db.to_schema() for client_db in clients_db]
 
     async def delete_client(self, client_id: str) -> None:
-        with Session(self.engine) as db:
-            delete(models.Client).where(models.Client.id == client_id)
-            db.commit()
+        async with self._session_maker() as db:
+            await db.execute(delete(models.Client).where(models.Client.id == client_id))
+            await db.commit()
+
+
+#################### Cache ####################
+
+
+class CachedClientManager(ClientManager):
+    """
+    Read-through cache in front of another client manager.
+    Changes made by other processes are only seen after the cached entries expire.
+    """
+
+    def __init__(
+        self,
+        client_manager: ClientManager,
+        max_size: int = constants.CLIENT_CACHE_MAX_SIZE,
+        ttl: int = constants.CLIENT_CACHE_TTL,
+    ) -> None:
+        self._client_manager = client_manager
+        self.cache: TTLCache[str, schemas.Client] = TTLCache(max_size=max_size, ttl=ttl)
+        metrics.register_cache(name="clients", cache=self.cache)
+
+    async def create_client(self, client: schemas.ClientUpsert) -> schemas.Client:
+        self.cache.pop(client.id)
+        return await self._client_manager.create_client(client=client)
+
+    async def update_client(self, client: schemas.ClientUpsert) -> schemas.Client:
+        self.cache.pop(client.id)
+        return await self._client_manager.update_client(client=client)
+
+    async def get_client(self, client_id: str) -> schemas.Client:
+
+        client = self.cache.get(client_id)
+        if client is None:
+            client = await self._client_manager.get_client(client_id=client_id)
+            self.cache.set(client_id, client)
+
+        return client
+
+    async def get_clients(self) -> typing.List[schemas.Client]:
+        return await self._client_manager.get_clients()
+
+    async def delete_client(self, client_id: str) -> None:
+        self.cache.pop(client_id)
+        await self._client_manager.delete_client(client_id=client_id)
+
+    def invalidate_cache(self, client_id: str | None = None) -> None:
+        if client_id is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(client_id)
+        self._client_manager.invalidate_cache(client_id=client_id)
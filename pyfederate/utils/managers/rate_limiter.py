@@ -0,0 +1,111 @@
+import typing
+import time
+from abc import ABC, abstractmethod
+
+from .. import schemas, constants
+from ..cache import TTLCache
+
+if typing.TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+######################################## Interfaces ########################################
+
+
+class RateLimiter(ABC):
+    """Token buckets that refill continuously, one for each key"""
+
+    @abstractmethod
+    async def acquire(self, key: str, rate_limit: schemas.RateLimit) -> float:
+        """
+        Take a token from the bucket of the key.
+        Return 0 if the call is allowed or the seconds until a token is available.
+        """
+        pass
+
+
+######################################## Implementations ########################################
+
+#################### Mock ####################
+
+
+class InMemoryRateLimiter(RateLimiter):
+    """
+    Buckets kept by the process, so each worker has its own.
+    A full bucket is the same as a missing one, so the entries expire once their
+    buckets refill and the memory is only taken by the keys that are active.
+    """
+
+    def __init__(self, max_size: int = constants.RATE_LIMIT_MAX_KEYS) -> None:
+        # Map the keys to their remaining tokens and the time they were counted
+        self._buckets: TTLCache[str, typing.Tuple[float, float]] = TTLCache(
+            max_size=max_size, ttl=0
+        )
+
+    async def acquire(self, key: str, rate_limit: schemas.RateLimit) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        tokens: float = (
+            rate_limit.burst
+            if bucket is None
+            else min(rate_limit.burst, bucket[0] + (now - bucket[1]) * rate_limit.rate)
+        )
+        if tokens < 1:
+            return (1 - tokens) / rate_limit.rate
+
+        tokens -= 1
+        self._buckets.set(
+            key, (tokens, now), ttl=(rate_limit.burst - tokens) / rate_limit.rate
+        )
+        return 0
+
+
+#################### Redis ####################
+
+# Refill and take a token atomically. The clock of the server is used, so the
+# workers agree on the time. The numbers are returned as strings, since Redis
+# truncates the Lua numbers to integers
+_ACQUIRE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local tokens = burst
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+if bucket[1] then
+    tokens = math.min(burst, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+end
+if tokens < 1 then
+    return tostring((1 - tokens) / rate)
+end
+
+tokens = tokens - 1
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated_at", tostring(now))
+redis.call("PEXPIRE", KEYS[1], math.ceil((burst - tokens) / rate * 1000))
+return "0"
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Buckets kept in a RESP compatible server, so the limits are shared by all the workers.
+    Each bucket is a hash updated by a script in a single round trip and it
+    expires natively once it refills.
+
+    The server must support Lua scripts and the client must be created with
+    decode_responses=True.
+    """
+
+    def __init__(self, client: "Redis", key_prefix: str = "pyfederate") -> None:
+        self._key_prefix = key_prefix
+        self._acquire_script = client.register_script(_ACQUIRE_SCRIPT)
+
+    def _get_bucket_key(self, key: str) -> str:
+        return f"{self._key_prefix}:rate_limit:{key}"
+
+    async def acquire(self, key: str, rate_limit: schemas.RateLimit) -> float:
+        retry_after: str = await self._acquire_script(
+            keys=[self._get_bucket_key(key=key)],
+            args=[rate_limit.rate, rate_limit.burst],
+        )
+        return float(retry_after)
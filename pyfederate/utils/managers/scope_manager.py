@@ -1,7 +1,7 @@
 from dataclasses import asdict
 import typing
-from sqlalchemy import delete, Engine
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 from abc import ABC, abstractmethod
 
 from .. import schemas, models, telemetry, exceptions, tools
@@ -92,23 +92,22 @@ class InMemoryScopeManager(ScopeManager):
 
 
 class OLTPScopeManager(ScopeManager):
-    def __init__(self, engine: Engine) -> None:
+    def __init__(self, engine: AsyncEngine) -> None:
         self.engine = engine
+        self._session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
     async def create_scope(self, scope: schemas.Scope) -> None:
         scope_db = models.Scope.to_db_model(scope=scope)
-        with Session(self.engine) as db:
+        async with self._session_maker() as db:
             db.add(scope_db)
-            db.commit()
+            await db.commit()
 
     async def update_scope(self, scope: schemas.Scope) -> None:
         pass
 
     async def get_scope(self, scope_name: str) -> schemas.Scope:
-        with Session(self.engine) as db:
-            scope_db = (
-                db.query(models.Scope).filter(models.Scope.name == scope_name).first()
-            )
+        async with self._session_maker() as db:
+            scope_db = await db.get(models.Scope, scope_name)
 
         if scope_db is None:
             raise exceptions.EntityDoesNotExistException()
@@ -117,11 +116,15 @@ class OLTPScopeManager(ScopeManager):
 
     async def get_scopes(self) -> typing.List[schemas.Scope]:
 
-        with Session(self.engine) as db:
-            scopes_db: typing.List[models.Scope] = db.query(models.Scope).all()
+        async with self._session_maker() as db:
+            scopes_db: typing.Sequence[models.Scope] = (
+                await db.scalars(select(models.Scope))
+            ).all()
         return [scope_db.to_schema() for scope_db in scopes_db]
 
     async def delete_scope(self, scope_name: str) -> None:
-        with Session(self.engine) as db:
-            delete(models.Scope).where(models.Scope.name == scope_name)
-            db.commit()
+        async with self._session_maker() as db:
+            await db.execute(
+                delete(models.Scope).where(models.Scope.name == scope_name)
+            )
+            await db.commit()
@@ -1,8 +1,19 @@
 import typing
+import asyncio
+import dataclasses
+import json
+from datetime import datetime
 from abc import ABC, abstractmethod
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 
-from .. import schemas, telemetry, tools
+from .. import schemas, models, constants, telemetry, tools
 from .. import exceptions
+from ..timer_wheel import TimerWheel
+
+if typing.TYPE_CHECKING:
+    from redis.asyncio import Redis
 
 logger = telemetry.get_logger(__name__)
 
@@ -42,6 +53,27 @@ class SessionManager(ABC):
         """
         pass
 
+    @abstractmethod
+    async def rotate_refresh_token(
+        self,
+        session: schemas.TokenSession,
+        previous_refresh_token: str,
+        previous_token_id: str,
+    ) -> None:
+        """
+        Update the session, whose refresh token replaced previous_refresh_token and
+        whose token ID replaced previous_token_id. The session no longer resolves by
+        the previous token ID.
+        The previous refresh token is remembered until the session expires, so reusing
+        it can be traced back to the session. The refresh tokens rotated before it
+        point to the new token ID as well. Rotating the same refresh token twice
+        fails, which means it was reused.
+        Throws:
+            exceptions.EntityDoesNotExist
+            exceptions.EntityAlreadyExists
+        """
+        pass
+
     @abstractmethod
     async def get_session_by_authz_code(self, authz_code: str) -> schemas.AuthnSession:
         """
@@ -88,6 +120,16 @@ class SessionManager(ABC):
         """
         pass
 
+    @abstractmethod
+    async def get_token_session_id_by_rotated_refresh_token(
+        self, refresh_token: str
+    ) -> str:
+        """
+        Throws:
+            exceptions.EntityDoesNotExist
+        """
+        pass
+
     @abstractmethod
     async def delete_session(self, session_id: str) -> None:
         """
@@ -104,122 +146,938 @@ class SessionManager(ABC):
         """
         pass
 
+    async def count_live_sessions(self) -> typing.Dict[str, int] | None:
+        """
+        Count the authentication and token sessions that didn't expire.
+        Return None if the storage can't count them cheaply.
+        """
+        return None
+
 
 ######################################## Implementations ########################################
 
+#################### Mock ####################
+
+
+class _SecondaryIndexes:
+    """Map the values of some attributes of the stored entities to the entity IDs"""
+
+    def __init__(self, attributes: typing.List[str]) -> None:
+        self._indexes: typing.Dict[str, typing.Dict[str, str]] = {
+            attribute: {} for attribute in attributes
+        }
+        # The entities are updated in place by the callers, so the values indexed
+        # for each entity are kept to be able to remove them later
+        self._indexed_values: typing.Dict[str, typing.Dict[str, str | None]] = {}
+
+    def add(self, entity_id: str, entity: typing.Any) -> None:
+        self.remove(entity_id=entity_id)
+        indexed_values = {
+            attribute: getattr(entity, attribute) for attribute in self._indexes
+        }
+        for attribute, value in indexed_values.items():
+            if value is not None:
+                self._indexes[attribute][value] = entity_id
+        self._indexed_values[entity_id] = indexed_values
+
+    def remove(self, entity_id: str) -> None:
+        indexed_values = self._indexed_values.pop(entity_id, None)
+        if indexed_values is None:
+            return
+
+        for attribute, value in indexed_values.items():
+            if value is not None and self._indexes[attribute].get(value) == entity_id:
+                self._indexes[attribute].pop(value)
+
+    def get(self, attribute: str, value: str) -> str | None:
+        return self._indexes[attribute].get(value, None)
+
 
 class InMemorySessionManager(SessionManager):
-    def __init__(self, max_number: int = 100) -> None:
-        self._max_number = max_number
+    """
+    Keep the sessions in memory until they expire, so the memory used is bounded
+    by the live traffic. The expired sessions are removed at the beginning of
+    each operation.
+    """
+
+    def __init__(self) -> None:
         self._sessions: typing.Dict[str, schemas.AuthnSession] = {}
         self._token_sessions: typing.Dict[str, schemas.TokenSession] = {}
+        self._session_indexes = _SecondaryIndexes(
+            attributes=["authz_code", "callback_id", "request_uri"]
+        )
+        self._token_session_indexes = _SecondaryIndexes(attributes=["refresh_token"])
+        self._session_expirations: TimerWheel[str] = TimerWheel()
+        self._token_session_expirations: TimerWheel[str] = TimerWheel()
+        # Map the rotated refresh tokens to the IDs of their sessions and back,
+        # so they can follow the session when its ID changes
+        self._rotated_refresh_tokens: typing.Dict[str, str] = {}
+        self._rotated_refresh_tokens_by_token_id: typing.Dict[str, typing.Set[str]] = {}
+        self._rotated_refresh_token_expirations: TimerWheel[str] = TimerWheel()
 
-    async def create_session(self, session: schemas.AuthnSession) -> None:
+    def _remove_expired_sessions(self) -> None:
+        now: int = tools.get_timestamp_now()
+        for session_id in self._session_expirations.pop_expired(now=now):
+            self._sessions.pop(session_id)
+            self._session_indexes.remove(entity_id=session_id)
+        for token_id in self._token_session_expirations.pop_expired(now=now):
+            self._token_sessions.pop(token_id)
+            self._token_session_indexes.remove(entity_id=token_id)
+        for refresh_token in self._rotated_refresh_token_expirations.pop_expired(
+            now=now
+        ):
+            token_id = self._rotated_refresh_tokens.pop(refresh_token)
+            refresh_tokens = self._rotated_refresh_tokens_by_token_id[token_id]
+            refresh_tokens.discard(refresh_token)
+            if not refresh_tokens:
+                self._rotated_refresh_tokens_by_token_id.pop(token_id)
 
+    def _get_indexed_session(
+        self, attribute: str, value: str
+    ) -> schemas.AuthnSession | None:
+        session_id: str | None = self._session_indexes.get(attribute, value)
+        session: schemas.AuthnSession | None = (
+            self._sessions.get(session_id, None) if session_id else None
+        )
+        # The session may have been changed in place since it was indexed
+        if session is None or getattr(session, attribute) != value:
+            return None
+        return session
+
+    async def create_session(self, session: schemas.AuthnSession) -> None:
+        self._remove_expired_sessions()
         if session.id in self._sessions:
             logger.info(f"The session ID: {session.id} already exists")
             raise exceptions.EntityAlreadyExistsException()
 
-        if len(self._sessions) >= self._max_number:
-            tools.remove_oldest_item(self._sessions)
         self._sessions[session.id] = session
+        self._session_indexes.add(entity_id=session.id, entity=session)
+        self._session_expirations.schedule(
+            key=session.id, expires_at=session.get_expiration()
+        )
 
     async def create_token_session(self, session: schemas.TokenSession) -> None:
-        if session.token_id in self._sessions:
+        self._remove_expired_sessions()
+        if session.token_id in self._token_sessions:
             logger.info(f"The token session ID: {session.token_id} already exists")
             raise exceptions.EntityAlreadyExistsException()
 
-        if len(self._token_sessions) >= self._max_number:
-            tools.remove_oldest_item(self._token_sessions)
         self._token_sessions[session.token_id] = session
+        self._token_session_indexes.add(entity_id=session.token_id, entity=session)
+        self._token_session_expirations.schedule(
+            key=session.token_id, expires_at=session.expiration
+        )
 
     async def update_session(self, session: schemas.AuthnSession) -> None:
-
+        self._remove_expired_sessions()
         if session.id not in self._sessions:
             logger.info(f"The session ID: {session.id} does not exist")
             raise exceptions.EntityDoesNotExistException()
 
         self._sessions[session.id] = session
+        self._session_indexes.add(entity_id=session.id, entity=session)
+        self._session_expirations.schedule(
+            key=session.id, expires_at=session.get_expiration()
+        )
 
     async def update_token_session(self, session: schemas.TokenSession) -> None:
-
+        self._remove_expired_sessions()
         if session.token_id not in self._token_sessions:
             logger.info(f"The token ID: {session.token_id} has no associated session")
             raise exceptions.EntityDoesNotExistException()
 
         self._token_sessions[session.token_id] = session
+        self._token_session_indexes.add(entity_id=session.token_id, entity=session)
+        self._token_session_expirations.schedule(
+            key=session.token_id, expires_at=session.expiration
+        )
+
+    async def rotate_refresh_token(
+        self,
+        session: schemas.TokenSession,
+        previous_refresh_token: str,
+        previous_token_id: str,
+    ) -> None:
+        self._remove_expired_sessions()
+        if previous_refresh_token in self._rotated_refresh_tokens:
+            logger.info(
+                f"The refresh token: {previous_refresh_token} was already rotated"
+            )
+            raise exceptions.EntityAlreadyExistsException()
+        if previous_token_id not in self._token_sessions:
+            logger.info(f"The token ID: {previous_token_id} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
+        self._token_sessions.pop(previous_token_id)
+        self._token_session_indexes.remove(entity_id=previous_token_id)
+        self._token_session_expirations.cancel(key=previous_token_id)
+        self._token_sessions[session.token_id] = session
+        self._token_session_indexes.add(entity_id=session.token_id, entity=session)
+        self._token_session_expirations.schedule(
+            key=session.token_id, expires_at=session.expiration
+        )
+
+        refresh_tokens = self._rotated_refresh_tokens_by_token_id.pop(
+            previous_token_id, set()
+        )
+        refresh_tokens.add(previous_refresh_token)
+        for refresh_token in refresh_tokens:
+            self._rotated_refresh_tokens[refresh_token] = session.token_id
+        self._rotated_refresh_tokens_by_token_id[session.token_id] = refresh_tokens
+        self._rotated_refresh_token_expirations.schedule(
+            key=previous_refresh_token, expires_at=session.expiration
+        )
 
     async def get_session_by_authz_code(self, authz_code: str) -> schemas.AuthnSession:
+        self._remove_expired_sessions()
+        session = self._get_indexed_session(attribute="authz_code", value=authz_code)
+        if session is None:
+            logger.info(
+                f"The authorization code: {authz_code} has no associated session"
+            )
+            raise exceptions.EntityDoesNotExistException()
+
+        return session
+
+    async def get_session_by_callback_id(
+        self, callback_id: str
+    ) -> schemas.AuthnSession:
+        self._remove_expired_sessions()
+        session = self._get_indexed_session(attribute="callback_id", value=callback_id)
+        if session is None:
+            logger.info(f"The callback ID: {callback_id} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
+        return session
+
+    async def get_session_by_request_uri(
+        self, request_uri: str
+    ) -> schemas.AuthnSession:
+        self._remove_expired_sessions()
+        session = self._get_indexed_session(attribute="request_uri", value=request_uri)
+        if session is None:
+            logger.info(f"The request URI: {request_uri} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
+        return session
 
-        filtered_sessions: typing.List[schemas.AuthnSession] = list(
-            filter(
-                lambda session: session.authz_code == authz_code,
-                self._sessions.values(),
+    async def get_token_session_by_id(self, token_id: str) -> schemas.TokenSession:
+        self._remove_expired_sessions()
+        session: schemas.TokenSession | None = self._token_sessions.get(token_id, None)
+        if session is None:
+            logger.info(f"The token ID: {token_id} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+        return session
+
+    async def get_token_session_by_refresh_token(
+        self, refresh_token: str
+    ) -> schemas.TokenSession:
+        self._remove_expired_sessions()
+        token_id: str | None = self._token_session_indexes.get(
+            "refresh_token", refresh_token
+        )
+        session: schemas.TokenSession | None = (
+            self._token_sessions.get(token_id, None) if token_id else None
+        )
+        # The session may have been changed in place since it was indexed
+        if session is None or session.refresh_token != refresh_token:
+            logger.info(f"The refresh token: {refresh_token} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
+        return session
+
+    async def get_token_session_id_by_rotated_refresh_token(
+        self, refresh_token: str
+    ) -> str:
+        self._remove_expired_sessions()
+        token_id: str | None = self._rotated_refresh_tokens.get(refresh_token, None)
+        if token_id is None:
+            logger.info(f"The refresh token: {refresh_token} was not rotated")
+            raise exceptions.EntityDoesNotExistException()
+
+        return token_id
+
+    async def delete_session(self, session_id: str) -> None:
+        if self._sessions.pop(session_id, None) is None:
+            logger.info(f"The session with ID: {session_id} does not exist")
+            raise exceptions.EntityDoesNotExistException()
+        self._session_indexes.remove(entity_id=session_id)
+        self._session_expirations.cancel(key=session_id)
+
+    async def delete_token_session(self, session_id: str) -> None:
+        if self._token_sessions.pop(session_id, None) is None:
+            logger.info(f"The token session with ID: {session_id} does not exist")
+            raise exceptions.EntityDoesNotExistException()
+        self._token_session_indexes.remove(entity_id=session_id)
+        self._token_session_expirations.cancel(key=session_id)
+
+    async def count_live_sessions(self) -> typing.Dict[str, int] | None:
+        self._remove_expired_sessions()
+        return {
+            "authentication": len(self._sessions),
+            "token": len(self._token_sessions),
+        }
+
+
+#################### OLTP ####################
+
+
+class OLTPSessionManager(SessionManager):
+    """
+    Store the sessions in the database. The lookups ignore the expired rows,
+    which are deleted in batches by a background task.
+    """
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        self._session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        self._next_purge_timestamp: int = 0
+        self._purge_task: asyncio.Task | None = None
+
+    def _schedule_purge(self) -> None:
+        """Start purging the expired sessions in the background if it's time to"""
+
+        timestamp_now = tools.get_timestamp_now()
+        if timestamp_now < self._next_purge_timestamp or (
+            self._purge_task is not None and not self._purge_task.done()
+        ):
+            return
+
+        self._next_purge_timestamp = timestamp_now + constants.SESSION_PURGE_INTERVAL
+        self._purge_task = asyncio.create_task(self.purge_expired_sessions())
+        self._purge_task.add_done_callback(self._log_purge_error)
+
+    @staticmethod
+    def _log_purge_error(purge_task: asyncio.Task) -> None:
+        """Log the error of a failed purge, since nothing awaits the task"""
+
+        if purge_task.cancelled() or purge_task.exception() is None:
+            return
+        logger.error(
+            f"Error purging the expired sessions: {purge_task.exception()}",
+            exc_info=purge_task.exception(),
+        )
+
+    async def purge_expired_sessions(
+        self, batch_size: int = constants.SESSION_PURGE_BATCH_SIZE
+    ) -> None:
+        """
+        Delete the expired sessions in small batches, so the purge doesn't hold
+        the tables locked while requests are being handled
+        """
+
+        timestamp_now = tools.get_timestamp_now()
+        for model, id_column in [
+            (models.AuthnSession, models.AuthnSession.id),
+            (models.TokenSession, models.TokenSession.token_id),
+            (models.RotatedRefreshToken, models.RotatedRefreshToken.refresh_token),
+        ]:
+            while True:
+                async with self._session_maker() as db:
+                    expired_ids: typing.List[str] = list(
+                        await db.scalars(
+                            select(id_column)
+                            .where(model.expiration <= timestamp_now)
+                            .limit(batch_size)
+                        )
+                    )
+                    if expired_ids:
+                        await db.execute(
+                            delete(model).where(id_column.in_(expired_ids))
+                        )
+                        await db.commit()
+
+                if len(expired_ids) < batch_size:
+                    break
+
+    async def _get_session_by_column(
+        self, column: typing.Any, value: str
+    ) -> schemas.AuthnSession | None:
+        async with self._session_maker() as db:
+            session_db: models.AuthnSession | None = (
+                await db.scalars(
+                    select(models.AuthnSession).where(
+                        column == value,
+                        models.AuthnSession.expiration > tools.get_timestamp_now(),
+                    )
+                )
+            ).first()
+
+        return session_db.to_schema() if session_db else None
+
+    async def create_session(self, session: schemas.AuthnSession) -> None:
+        async with self._session_maker() as db:
+            if await db.get(models.AuthnSession, session.id) is not None:
+                logger.info(f"The session ID: {session.id} already exists")
+                raise exceptions.EntityAlreadyExistsException()
+
+            db.add(models.AuthnSession.to_db_model(session=session))
+            await db.commit()
+
+        self._schedule_purge()
+
+    async def create_token_session(self, session: schemas.TokenSession) -> None:
+        async with self._session_maker() as db:
+            if await db.get(models.TokenSession, session.token_id) is not None:
+                logger.info(f"The token session ID: {session.token_id} already exists")
+                raise exceptions.EntityAlreadyExistsException()
+
+            db.add(models.TokenSession.to_db_model(session=session))
+            await db.commit()
+
+        self._schedule_purge()
+
+    async def update_session(self, session: schemas.AuthnSession) -> None:
+        async with self._session_maker() as db:
+            if await db.get(models.AuthnSession, session.id) is None:
+                logger.info(f"The session ID: {session.id} does not exist")
+                raise exceptions.EntityDoesNotExistException()
+
+            await db.merge(models.AuthnSession.to_db_model(session=session))
+            await db.commit()
+
+    async def update_token_session(self, session: schemas.TokenSession) -> None:
+        async with self._session_maker() as db:
+            if await db.get(models.TokenSession, session.token_id) is None:
+                logger.info(
+                    f"The token ID: {session.token_id} has no associated session"
+                )
+                raise exceptions.EntityDoesNotExistException()
+
+            await db.merge(models.TokenSession.to_db_model(session=session))
+            await db.commit()
+
+    async def rotate_refresh_token(
+        self,
+        session: schemas.TokenSession,
+        previous_refresh_token: str,
+        previous_token_id: str,
+    ) -> None:
+        async with self._session_maker() as db:
+            # The primary key makes the concurrent rotations of the same refresh token fail.
+            # It is inserted first, so the losers fail on it instead of on the moved session
+            db.add(
+                models.RotatedRefreshToken(
+                    refresh_token=previous_refresh_token,
+                    token_id=session.token_id,
+                    expiration=session.expiration,
+                )
+            )
+            try:
+                await db.flush()
+            except IntegrityError:
+                logger.info(
+                    f"The refresh token: {previous_refresh_token} was already rotated"
+                )
+                raise exceptions.EntityAlreadyExistsException()
+
+            result = await db.execute(
+                delete(models.TokenSession).where(
+                    models.TokenSession.token_id == previous_token_id
+                )
             )
+            if result.rowcount == 0:  # type: ignore
+                logger.info(
+                    f"The token ID: {previous_token_id} has no associated session"
+                )
+                raise exceptions.EntityDoesNotExistException()
+            db.add(models.TokenSession.to_db_model(session=session))
+            await db.execute(
+                update(models.RotatedRefreshToken)
+                .where(models.RotatedRefreshToken.token_id == previous_token_id)
+                .values(token_id=session.token_id)
+            )
+            await db.commit()
+
+    async def get_session_by_authz_code(self, authz_code: str) -> schemas.AuthnSession:
+
+        session = await self._get_session_by_column(
+            column=models.AuthnSession.authz_code, value=authz_code
         )
-        if len(filtered_sessions) != 1:
+        if session is None:
             logger.info(
                 f"The authorization code: {authz_code} has no associated session"
             )
             raise exceptions.EntityDoesNotExistException()
 
-        return filtered_sessions[0]
+        return session
 
     async def get_session_by_callback_id(
         self, callback_id: str
     ) -> schemas.AuthnSession:
 
-        filtered_sessions: typing.List[schemas.AuthnSession] = list(
-            filter(
-                lambda session: session.callback_id == callback_id,
-                self._sessions.values(),
-            )
+        session = await self._get_session_by_column(
+            column=models.AuthnSession.callback_id, value=callback_id
         )
-        if len(filtered_sessions) != 1:
+        if session is None:
             logger.info(f"The callback ID: {callback_id} has no associated session")
             raise exceptions.EntityDoesNotExistException()
 
-        return filtered_sessions[0]
+        return session
 
     async def get_session_by_request_uri(
         self, request_uri: str
     ) -> schemas.AuthnSession:
-        filtered_sessions: typing.List[schemas.AuthnSession] = list(
-            filter(
-                lambda session: session.request_uri == request_uri,
-                self._sessions.values(),
-            )
+
+        session = await self._get_session_by_column(
+            column=models.AuthnSession.request_uri, value=request_uri
         )
-        if len(filtered_sessions) != 1:
+        if session is None:
             logger.info(f"The request URI: {request_uri} has no associated session")
             raise exceptions.EntityDoesNotExistException()
 
-        return filtered_sessions[0]
+        return session
 
     async def get_token_session_by_id(self, token_id: str) -> schemas.TokenSession:
-        session: schemas.TokenSession | None = self._token_sessions.get(token_id, None)
-        if session is None:
+
+        async with self._session_maker() as db:
+            session_db: models.TokenSession | None = await db.get(
+                models.TokenSession, token_id
+            )
+
+        if session_db is None or session_db.expiration <= tools.get_timestamp_now():
             logger.info(f"The token ID: {token_id} has no associated session")
             raise exceptions.EntityDoesNotExistException()
+
+        return session_db.to_schema()
+
+    async def get_token_session_by_refresh_token(
+        self, refresh_token: str
+    ) -> schemas.TokenSession:
+
+        async with self._session_maker() as db:
+            session_db: models.TokenSession | None = (
+                await db.scalars(
+                    select(models.TokenSession).where(
+                        models.TokenSession.refresh_token == refresh_token,
+                        models.TokenSession.expiration > tools.get_timestamp_now(),
+                    )
+                )
+            ).first()
+
+        if session_db is None:
+            logger.info(f"The refresh token: {refresh_token} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
+        return session_db.to_schema()
+
+    async def get_token_session_id_by_rotated_refresh_token(
+        self, refresh_token: str
+    ) -> str:
+
+        async with self._session_maker() as db:
+            rotated_refresh_token: models.RotatedRefreshToken | None = await db.get(
+                models.RotatedRefreshToken, refresh_token
+            )
+
+        if (
+            rotated_refresh_token is None
+            or rotated_refresh_token.expiration <= tools.get_timestamp_now()
+        ):
+            logger.info(f"The refresh token: {refresh_token} was not rotated")
+            raise exceptions.EntityDoesNotExistException()
+
+        return rotated_refresh_token.token_id
+
+    async def delete_session(self, session_id: str) -> None:
+        async with self._session_maker() as db:
+            result = await db.execute(
+                delete(models.AuthnSession).where(models.AuthnSession.id == session_id)
+            )
+            await db.commit()
+
+        # Only one of the concurrent deletes removes the row, which makes the
+        # authorization codes single use
+        if result.rowcount == 0:  # type: ignore
+            logger.info(f"The session with ID: {session_id} does not exist")
+            raise exceptions.EntityDoesNotExistException()
+
+    async def delete_token_session(self, session_id: str) -> None:
+        async with self._session_maker() as db:
+            result = await db.execute(
+                delete(models.TokenSession).where(
+                    models.TokenSession.token_id == session_id
+                )
+            )
+            await db.commit()
+
+        if result.rowcount == 0:  # type: ignore
+            logger.info(f"The token session with ID: {session_id} does not exist")
+            raise exceptions.EntityDoesNotExistException()
+
+    async def count_live_sessions(self) -> typing.Dict[str, int] | None:
+
+        timestamp_now = tools.get_timestamp_now()
+        session_counts: typing.Dict[str, int] = {}
+        async with self._session_maker() as db:
+            # The expiration columns are indexed
+            for session_type, model in [
+                ("authentication", models.AuthnSession),
+                ("token", models.TokenSession),
+            ]:
+                session_counts[session_type] = (
+                    await db.scalar(
+                        select(func.count())
+                        .select_from(model)
+                        .where(model.expiration > timestamp_now)
+                    )
+                    or 0
+                )
+
+        return session_counts
+
+
+#################### Redis ####################
+
+
+def _session_to_json(session: schemas.AuthnSession) -> str:
+    return json.dumps(
+        {
+            **dataclasses.asdict(session),
+            "response_types": [rt.value for rt in session.response_types],
+        }
+    )
+
+
+def _session_from_json(session_json: str) -> schemas.AuthnSession:
+    session_dict: typing.Dict[str, typing.Any] = json.loads(session_json)
+    session_dict["response_types"] = [
+        constants.ResponseType(rt) for rt in session_dict["response_types"]
+    ]
+    return schemas.AuthnSession(**session_dict)
+
+
+def _token_session_to_json(session: schemas.TokenSession) -> str:
+    return json.dumps(
+        {
+            **dataclasses.asdict(session),
+            "created_at": session.created_at.isoformat(),
+        }
+    )
+
+
+def _token_session_from_json(session_json: str) -> schemas.TokenSession:
+    session_dict: typing.Dict[str, typing.Any] = json.loads(session_json)
+    session_dict["token_info"] = schemas.TokenInfo(**session_dict["token_info"])
+    session_dict["created_at"] = datetime.fromisoformat(session_dict["created_at"])
+    return schemas.TokenSession(**session_dict)
+
+
+# Mark the previous refresh token as rotated and move the token session to its new ID
+# in one step, so the mark is never left behind by a session that no longer exists.
+# The refresh tokens rotated before point to the new ID as well. They are listed
+# in a set per session, since their keys can only be built from the prefix inside
+# the script.
+# Return 1 if rotated, 0 if the refresh token was already rotated and -1 if the
+# session doesn't exist
+_ROTATE_REFRESH_TOKEN_SCRIPT = """
+if redis.call("EXISTS", KEYS[2]) == 0 then
+    return -1
+end
+if not redis.call("SET", KEYS[1], ARGV[1], "NX", "EXAT", ARGV[3]) then
+    return 0
+end
+for _, refresh_token in ipairs(redis.call("SMEMBERS", KEYS[4])) do
+    redis.call("SET", ARGV[4] .. refresh_token, ARGV[1], "XX", "KEEPTTL")
+end
+redis.call("SADD", KEYS[4], ARGV[5])
+if KEYS[4] ~= KEYS[5] then
+    redis.call("RENAME", KEYS[4], KEYS[5])
+end
+redis.call("EXPIREAT", KEYS[5], ARGV[3])
+redis.call("DEL", KEYS[2])
+redis.call("SET", KEYS[3], ARGV[2], "EXAT", ARGV[3])
+if KEYS[6] then
+    redis.call("SET", KEYS[6], ARGV[1], "EXAT", ARGV[3])
+end
+return 1
+"""
+
+
+class RedisSessionManager(SessionManager):
+    """
+    Store the sessions in a RESP compatible server, so they are shared by all the workers.
+
+    Each session is saved as json under its ID and the lookup values
+    (authorization code, callback ID, request URI and refresh token) are saved
+    as index keys pointing to the session ID. All the keys expire natively with
+    the session. The writes of a session and its index keys are sent in a single
+    MULTI transaction, so each operation costs at most two round trips.
+
+    Index keys are not removed when the session is updated or deleted. They
+    expire with the session and the lookups ignore the ones that became stale.
+    Rotated refresh tokens are kept as keys pointing to the session ID, which are
+    created with NX so only one rotation of each refresh token succeeds. They are
+    created along with the session update by a script, which also moves the session
+    to its new ID, so the server must support Lua scripts.
+
+    The client must be created with decode_responses=True.
+    """
+
+    def __init__(self, client: "Redis", key_prefix: str = "pyfederate") -> None:
+        self._client = client
+        self._key_prefix = key_prefix
+        self._rotate_refresh_token_script = client.register_script(
+            _ROTATE_REFRESH_TOKEN_SCRIPT
+        )
+
+    def _get_session_key(self, session_id: str) -> str:
+        return f"{self._key_prefix}:session:{session_id}"
+
+    def _get_session_index_key(self, attribute: str, value: str) -> str:
+        return f"{self._key_prefix}:session:{attribute}:{value}"
+
+    def _get_token_session_key(self, token_id: str) -> str:
+        return f"{self._key_prefix}:token_session:{token_id}"
+
+    def _get_token_session_index_key(self, attribute: str, value: str) -> str:
+        return f"{self._key_prefix}:token_session:{attribute}:{value}"
+
+    def _get_rotated_refresh_tokens_key(self, token_id: str) -> str:
+        return f"{self._key_prefix}:token_session:{token_id}:rotated_refresh_tokens"
+
+    async def _save_session(self, session: schemas.AuthnSession, is_new: bool) -> bool:
+        """Save the session and its index keys. Return False if the condition over the key failed"""
+
+        # Redis rejects expirations in the past
+        expires_at: int = max(session.get_expiration(), tools.get_timestamp_now() + 1)
+        async with self._client.pipeline(transaction=True) as pipeline:
+            pipeline.set(
+                self._get_session_key(session_id=session.id),
+                _session_to_json(session=session),
+                exat=expires_at,
+                nx=is_new,
+                xx=not is_new,
+            )
+            for attribute in ["authz_code", "callback_id", "request_uri"]:
+                value: str | None = getattr(session, attribute)
+                if value is not None:
+                    pipeline.set(
+                        self._get_session_index_key(attribute=attribute, value=value),
+                        session.id,
+                        exat=expires_at,
+                    )
+            results: typing.List[typing.Any] = await pipeline.execute()
+
+        return bool(results[0])
+
+    async def _save_token_session(
+        self, session: schemas.TokenSession, is_new: bool
+    ) -> bool:
+        """Save the token session and its index keys. Return False if the condition over the key failed"""
+
+        # Redis rejects expirations in the past
+        expires_at: int = max(session.expiration, tools.get_timestamp_now() + 1)
+        async with self._client.pipeline(transaction=True) as pipeline:
+            pipeline.set(
+                self._get_token_session_key(token_id=session.token_id),
+                _token_session_to_json(session=session),
+                exat=expires_at,
+                nx=is_new,
+                xx=not is_new,
+            )
+            if session.refresh_token is not None:
+                pipeline.set(
+                    self._get_token_session_index_key(
+                        attribute="refresh_token", value=session.refresh_token
+                    ),
+                    session.token_id,
+                    exat=expires_at,
+                )
+            results: typing.List[typing.Any] = await pipeline.execute()
+
+        return bool(results[0])
+
+    async def _get_indexed_session(
+        self, attribute: str, value: str
+    ) -> schemas.AuthnSession | None:
+        session_id: str | None = await self._client.get(
+            self._get_session_index_key(attribute=attribute, value=value)
+        )
+        if session_id is None:
+            return None
+
+        session_json: str | None = await self._client.get(
+            self._get_session_key(session_id=session_id)
+        )
+        if session_json is None:
+            return None
+
+        session = _session_from_json(session_json=session_json)
+        # The index key may be stale if the session was updated
+        if getattr(session, attribute) != value:
+            return None
+        return session
+
+    async def create_session(self, session: schemas.AuthnSession) -> None:
+
+        if not await self._save_session(session=session, is_new=True):
+            logger.info(f"The session ID: {session.id} already exists")
+            raise exceptions.EntityAlreadyExistsException()
+
+    async def create_token_session(self, session: schemas.TokenSession) -> None:
+
+        if not await self._save_token_session(session=session, is_new=True):
+            logger.info(f"The token session ID: {session.token_id} already exists")
+            raise exceptions.EntityAlreadyExistsException()
+
+    async def update_session(self, session: schemas.AuthnSession) -> None:
+
+        if not await self._save_session(session=session, is_new=False):
+            logger.info(f"The session ID: {session.id} does not exist")
+            raise exceptions.EntityDoesNotExistException()
+
+    async def update_token_session(self, session: schemas.TokenSession) -> None:
+
+        if not await self._save_token_session(session=session, is_new=False):
+            logger.info(f"The token ID: {session.token_id} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
+    async def rotate_refresh_token(
+        self,
+        session: schemas.TokenSession,
+        previous_refresh_token: str,
+        previous_token_id: str,
+    ) -> None:
+
+        keys = [
+            self._get_token_session_index_key(
+                attribute="rotated_refresh_token", value=previous_refresh_token
+            ),
+            self._get_token_session_key(token_id=previous_token_id),
+            self._get_token_session_key(token_id=session.token_id),
+            self._get_rotated_refresh_tokens_key(token_id=previous_token_id),
+            self._get_rotated_refresh_tokens_key(token_id=session.token_id),
+        ]
+        if session.refresh_token is not None:
+            keys.append(
+                self._get_token_session_index_key(
+                    attribute="refresh_token", value=session.refresh_token
+                )
+            )
+        result: int = await self._rotate_refresh_token_script(
+            keys=keys,
+            args=[
+                session.token_id,
+                _token_session_to_json(session=session),
+                # Redis rejects expirations in the past
+                max(session.expiration, tools.get_timestamp_now() + 1),
+                self._get_token_session_index_key(
+                    attribute="rotated_refresh_token", value=""
+                ),
+                previous_refresh_token,
+            ],
+        )
+        if result == 0:
+            logger.info(
+                f"The refresh token: {previous_refresh_token} was already rotated"
+            )
+            raise exceptions.EntityAlreadyExistsException()
+        if result == -1:
+            logger.info(f"The token ID: {previous_token_id} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
+    async def get_session_by_authz_code(self, authz_code: str) -> schemas.AuthnSession:
+
+        session = await self._get_indexed_session(
+            attribute="authz_code", value=authz_code
+        )
+        if session is None:
+            logger.info(
+                f"The authorization code: {authz_code} has no associated session"
+            )
+            raise exceptions.EntityDoesNotExistException()
+
+        return session
+
+    async def get_session_by_callback_id(
+        self, callback_id: str
+    ) -> schemas.AuthnSession:
+
+        session = await self._get_indexed_session(
+            attribute="callback_id", value=callback_id
+        )
+        if session is None:
+            logger.info(f"The callback ID: {callback_id} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
         return session
 
+    async def get_session_by_request_uri(
+        self, request_uri: str
+    ) -> schemas.AuthnSession:
+
+        session = await self._get_indexed_session(
+            attribute="request_uri", value=request_uri
+        )
+        if session is None:
+            logger.info(f"The request URI: {request_uri} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
+        return session
+
+    async def get_token_session_by_id(self, token_id: str) -> schemas.TokenSession:
+
+        session_json: str | None = await self._client.get(
+            self._get_token_session_key(token_id=token_id)
+        )
+        if session_json is None:
+            logger.info(f"The token ID: {token_id} has no associated session")
+            raise exceptions.EntityDoesNotExistException()
+
+        return _token_session_from_json(session_json=session_json)
+
     async def get_token_session_by_refresh_token(
         self, refresh_token: str
     ) -> schemas.TokenSession:
-        filtered_token_sessions: typing.List[schemas.TokenSession] = list(
-            filter(
-                lambda session: session.refresh_token == refresh_token,
-                self._token_sessions.values(),
+
+        token_id: str | None = await self._client.get(
+            self._get_token_session_index_key(
+                attribute="refresh_token", value=refresh_token
             )
         )
-        if len(filtered_token_sessions) != 1:
+        session_json: str | None = (
+            await self._client.get(self._get_token_session_key(token_id=token_id))
+            if token_id
+            else None
+        )
+        session: schemas.TokenSession | None = (
+            _token_session_from_json(session_json=session_json)
+            if session_json
+            else None
+        )
+        # The index key may be stale if the refresh token was rotated
+        if session is None or session.refresh_token != refresh_token:
             logger.info(f"The refresh token: {refresh_token} has no associated session")
             raise exceptions.EntityDoesNotExistException()
 
-        return filtered_token_sessions[0]
+        return session
+
+    async def get_token_session_id_by_rotated_refresh_token(
+        self, refresh_token: str
+    ) -> str:
+
+        token_id: str | None = await self._client.get(
+            self._get_token_session_index_key(
+                attribute="rotated_refresh_token", value=refresh_token
+            )
+        )
+        if token_id is None:
+            logger.info(f"The refresh token: {refresh_token} was not rotated")
+            raise exceptions.EntityDoesNotExistException()
+
+        return token_id
 
     async def delete_session(self, session_id: str) -> None:
-        self._sessions.pop(session_id)
+        # DEL is atomic, so only one of the workers deleting the session succeeds,
+        # which makes the authorization codes single use
+        if not await self._client.delete(self._get_session_key(session_id=session_id)):
+            logger.info(f"The session with ID: {session_id} does not exist")
+            raise exceptions.EntityDoesNotExistException()
 
     async def delete_token_session(self, session_id: str) -> None:
-        self._token_sessions.pop(session_id)
+        if not await self._client.delete(
+            self._get_token_session_key(token_id=session_id)
+        ):
+            logger.info(f"The token session with ID: {session_id} does not exist")
+            raise exceptions.EntityDoesNotExistException()
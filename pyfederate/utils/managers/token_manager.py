@@ -1,7 +1,7 @@
 import typing
 from abc import ABC, abstractmethod
-from sqlalchemy import delete, Engine
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 
 from .. import schemas, models, constants, telemetry, exceptions, tools
 
@@ -33,6 +33,13 @@ class TokenModelManager(ABC):
     async def get_token_models(self) -> typing.List[schemas.TokenModel]:
         pass
 
+    @abstractmethod
+    async def get_jwt_token_models(
+        self, issuer: str, key_id: str
+    ) -> typing.List[schemas.JWTTokenModel]:
+        """Get the JWT token models of the issuer that sign with the key"""
+        pass
+
     @abstractmethod
     async def get_model_key_ids(self) -> typing.List[str]:
         """Get the signing keys defined in all the existent token models"""
@@ -66,12 +73,23 @@ class InMemoryTokenModelManager(TokenModelManager):
                 issuer=token_model.issuer,
                 expires_in=token_model.expires_in,
                 is_refreshable=token_model.is_refreshable,
+                is_reusable=token_model.is_reusable,
+                reuse_min_lifetime_ratio=token_model.reuse_min_lifetime_ratio,
                 key_id=token_model.key_id,  # type: ignore
                 key=constants.PRIVATE_JWKS[token_model.key_id].key,  # type: ignore
                 signing_algorithm=constants.PRIVATE_JWKS[
                     token_model.key_id
                 ].signing_algorithm,  # type: ignore
             )
+        elif token_model.token_type == constants.TokenType.OPAQUE:
+            self._token_models[token_model.id] = schemas.OpaqueTokenModel(
+                id=token_model.id,
+                issuer=token_model.issuer,
+                expires_in=token_model.expires_in,
+                is_refreshable=token_model.is_refreshable,
+                is_reusable=token_model.is_reusable,
+                reuse_min_lifetime_ratio=token_model.reuse_min_lifetime_ratio,
+            )
 
         if len(self._token_models) >= self._max_number:
             tools.remove_oldest_item(self._token_models)
@@ -88,6 +106,17 @@ class InMemoryTokenModelManager(TokenModelManager):
     async def get_token_models(self) -> typing.List[schemas.TokenModel]:
         return list(self._token_models.values())
 
+    async def get_jwt_token_models(
+        self, issuer: str, key_id: str
+    ) -> typing.List[schemas.JWTTokenModel]:
+        return [
+            token_model
+            for token_model in self._token_models.values()
+            if isinstance(token_model, schemas.JWTTokenModel)
+            and token_model.issuer == issuer
+            and token_model.key_id == key_id
+        ]
+
     async def get_model_key_ids(self) -> typing.List[str]:
         return [
             token_model.key_id
@@ -103,27 +132,24 @@ class InMemoryTokenModelManager(TokenModelManager):
 
 
 class OLTPTokenModelManager(TokenModelManager):
-    def __init__(self, engine: Engine) -> None:
+    def __init__(self, engine: AsyncEngine) -> None:
         self.engine = engine
+        self._session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
     async def create_token_model(
         self, token_model: schemas.TokenModelUpsert
     ) -> schemas.TokenModel:
 
         token_model_db = models.TokenModel.to_db_model(token_model=token_model)
-        with Session(self.engine) as db:
+        async with self._session_maker() as db:
             db.add(token_model_db)
-            db.commit()
+            await db.commit()
             return token_model_db.to_schema()
 
     async def get_token_model(self, token_model_id: str) -> schemas.TokenModel:
 
-        with Session(self.engine) as db:
-            token_model_db = (
-                db.query(models.TokenModel)
-                .filter(models.TokenModel.id == token_model_id)
-                .first()
-            )
+        async with self._session_maker() as db:
+            token_model_db = await db.get(models.TokenModel, token_model_id)
 
         if token_model_db is None:
             raise exceptions.EntityDoesNotExistException()
@@ -132,25 +158,39 @@ class OLTPTokenModelManager(TokenModelManager):
 
     async def get_token_models(self) -> typing.List[schemas.TokenModel]:
 
-        with Session(self.engine) as db:
-            token_models_db: typing.List[models.TokenModel] = db.query(
-                models.TokenModel
+        async with self._session_maker() as db:
+            token_models_db: typing.Sequence[models.TokenModel] = (
+                await db.scalars(select(models.TokenModel))
             ).all()
         return [token_model.to_schema() for token_model in token_models_db]
 
+    async def get_jwt_token_models(
+        self, issuer: str, key_id: str
+    ) -> typing.List[schemas.JWTTokenModel]:
+
+        async with self._session_maker() as db:
+            token_models_db: typing.Sequence[models.TokenModel] = (
+                await db.scalars(
+                    select(models.TokenModel).where(
+                        models.TokenModel.token_type == constants.TokenType.JWT.value,
+                        models.TokenModel.issuer == issuer,
+                        models.TokenModel.key_id == key_id,
+                    )
+                )
+            ).all()
+        return [token_model.to_schema() for token_model in token_models_db]  # type: ignore
+
     async def get_model_key_ids(self) -> typing.List[str]:
-        with Session(self.engine) as db:
-            token_models_db: typing.List[models.TokenModel] = db.query(
-                models.TokenModel
+        async with self._session_maker() as db:
+            key_ids: typing.Sequence[str | None] = (
+                await db.scalars(select(models.TokenModel.key_id))
             ).all()
 
-        return [
-            token_model_db.key_id
-            for token_model_db in token_models_db
-            if token_model_db.key_id
-        ]
+        return [key_id for key_id in key_ids if key_id]
 
     async def delete_token_model(self, token_model_id: str) -> None:
-        with Session(self.engine) as db:
-            delete(models.TokenModel).where(models.TokenModel.id == token_model_id)
-            db.commit()
+        async with self._session_maker() as db:
+            await db.execute(
+                delete(models.TokenModel).where(models.TokenModel.id == token_model_id)
+            )
+            await db.commit()
@@ -0,0 +1,304 @@
+"""
+Metrics exposed in the Prometheus text format.
+The metrics are only updated from the event loop thread, so they are plain
+numbers updated without locks.
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple, TypeVar
+import bisect
+import inspect
+import time
+
+from . import constants, telemetry, tracing
+from .cache import TTLCache
+
+T = TypeVar("T")
+Labels = Tuple[str, ...]
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str]) -> str:
+    if not label_names:
+        return ""
+    labels = ",".join(
+        f'{name}="{_escape_label_value(value)}"'
+        for name, value in zip(label_names, label_values)
+    )
+    return "{" + labels + "}"
+
+
+class Metric:
+    metric_type: str
+
+    def __init__(
+        self, name: str, description: str, label_names: Sequence[str] = ()
+    ) -> None:
+        self.name = f"{constants.METRICS_PREFIX}_{name}"
+        self.description = description
+        self.label_names = tuple(label_names)
+        registry.append(self)
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.metric_type}"
+        yield from self._collect_samples()
+
+    def _collect_samples(self) -> Iterator[str]:
+        raise NotImplementedError()
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(
+        self, name: str, description: str, label_names: Sequence[str] = ()
+    ) -> None:
+        super().__init__(name=name, description=description, label_names=label_names)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def _collect_samples(self) -> Iterator[str]:
+        for label_values, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.label_names, label_values)} {value}"
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def set(self, value: float, *label_values: str) -> None:
+        self.values[label_values] = value
+
+
+class _HistogramSeries:
+    __slots__ = ("bucket_counts", "sum", "count")
+
+    def __init__(self, number_of_buckets: int) -> None:
+        # The last bucket counts the values above all the upper bounds
+        self.bucket_counts: List[int] = [0] * (number_of_buckets + 1)
+        self.sum: float = 0
+        self.count: int = 0
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name=name, description=description, label_names=label_names)
+        self.buckets = buckets
+        self.series: Dict[Labels, _HistogramSeries] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = _HistogramSeries(
+                number_of_buckets=len(self.buckets)
+            )
+        series.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def _collect_samples(self) -> Iterator[str]:
+        for label_values, series in self.series.items():
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(
+                (*self.buckets, "+Inf"), series.bucket_counts
+            ):
+                cumulative_count += bucket_count
+                labels = _format_labels(
+                    (*self.label_names, "le"), (*label_values, str(upper_bound))
+                )
+                yield f"{self.name}_bucket{labels} {cumulative_count}"
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {series.sum}"
+            yield f"{self.name}_count{labels} {series.count}"
+
+
+class CallbackMetric(Metric):
+    """Metric whose values are read from elsewhere when the metrics are collected"""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str],
+        callback: Callable[[], Dict[Labels, float]],
+        metric_type: str = "gauge",
+    ) -> None:
+        super().__init__(name=name, description=description, label_names=label_names)
+        self.metric_type = metric_type
+        self._callback = callback
+
+    def _collect_samples(self) -> Iterator[str]:
+        for label_values, value in self._callback().items():
+            yield f"{self.name}{_format_labels(self.label_names, label_values)} {value}"
+
+
+registry: List[Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in registry for line in metric.collect()) + "\n"
+
+
+######################################## Metrics ########################################
+
+http_requests = Counter(
+    name="http_requests_total",
+    description="Number of HTTP requests handled",
+    label_names=("route", "method", "status"),
+)
+http_request_duration = Histogram(
+    name="http_request_duration_seconds",
+    description="Latency of the HTTP requests",
+    label_names=("route", "method"),
+)
+grant_requests = Counter(
+    name="grant_requests_total",
+    description="Number of token requests handled by grant type and outcome",
+    label_names=("grant_type", "outcome"),
+)
+grant_duration = Histogram(
+    name="grant_duration_seconds",
+    description="Latency of the grant handlers",
+    label_names=("grant_type",),
+)
+manager_call_duration = Histogram(
+    name="manager_call_duration_seconds",
+    description="Latency of the calls to the storage managers",
+    label_names=("manager", "method"),
+)
+rate_limited_requests = Counter(
+    name="rate_limited_requests_total",
+    description="Number of requests rejected for exceeding a rate limit",
+    label_names=("limit",),
+)
+shed_requests = Counter(
+    name="shed_requests_total",
+    description="Number of requests rejected by the admission control",
+    label_names=(),
+)
+live_sessions = Gauge(
+    name="live_sessions",
+    description="Number of sessions that didn't expire",
+    label_names=("session_type",),
+)
+
+#################### Caches ####################
+
+_caches: Dict[str, TTLCache] = {}
+
+
+def register_cache(name: str, cache: TTLCache) -> None:
+    """Expose the hits, misses and size of the cache"""
+    _caches[name] = cache
+
+
+def _get_cache_values(
+    get_value: Callable[[TTLCache], float]
+) -> Callable[[], Dict[Labels, float]]:
+    return lambda: {(name,): get_value(cache) for name, cache in _caches.items()}
+
+
+CallbackMetric(
+    name="cache_hits_total",
+    description="Number of cache lookups that found a value",
+    label_names=("cache",),
+    callback=_get_cache_values(lambda cache: cache.hits),
+    metric_type="counter",
+)
+CallbackMetric(
+    name="cache_misses_total",
+    description="Number of cache lookups that didn't find a value",
+    label_names=("cache",),
+    callback=_get_cache_values(lambda cache: cache.misses),
+    metric_type="counter",
+)
+CallbackMetric(
+    name="cache_hit_ratio",
+    description="Fraction of the cache lookups that found a value",
+    label_names=("cache",),
+    callback=_get_cache_values(lambda cache: cache.hit_ratio),
+)
+CallbackMetric(
+    name="cache_size",
+    description="Number of entries in the cache",
+    label_names=("cache",),
+    callback=_get_cache_values(len),
+)
+CallbackMetric(
+    name="dropped_log_records_total",
+    description="Number of log records dropped because the log queue was full",
+    label_names=(),
+    callback=lambda: {(): telemetry.get_queue_handler().dropped_records},
+    metric_type="counter",
+)
+
+#################### Managers ####################
+
+
+class InstrumentedManager:
+    """
+    Proxy to a storage manager that measures the latency of its coroutine methods
+    and traces their calls.
+    """
+
+    def __init__(self, manager: Any, name: str) -> None:
+        self._manager = manager
+        self._name = name
+
+    def __getattr__(self, attribute: str) -> Any:
+        value = getattr(self._manager, attribute)
+        if not inspect.iscoroutinefunction(value):
+            return value
+
+        label_values = (self._name, attribute)
+        span_name = f"{self._name}.{attribute}"
+
+        async def instrumented_method(*args: Any, **kwargs: Any) -> Any:
+            with tracing.start_span(name=span_name):
+                start = time.perf_counter()
+                try:
+                    return await value(*args, **kwargs)
+                finally:
+                    if constants.METRICS_ENABLED:
+                        manager_call_duration.observe(
+                            time.perf_counter() - start, *label_values
+                        )
+
+        # Skip __getattr__ for the next calls
+        self.__dict__[attribute] = instrumented_method
+        return instrumented_method
+
+
+def instrument_manager(manager: T, name: str) -> T:
+    if not constants.METRICS_ENABLED and not constants.TRACING_ENABLED:
+        return manager
+    return InstrumentedManager(manager=manager, name=name)  # type: ignore
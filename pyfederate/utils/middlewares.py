@@ -0,0 +1,224 @@
+from typing import Deque, Iterable
+from collections import deque
+import asyncio
+import math
+import time
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import constants, telemetry, tools, metrics, tracing
+
+
+class TelemetryMiddleware:
+    """
+    Set the tracking and correlation IDs for each request and ensure clients
+    don't cache the responses.
+    It is a plain ASGI middleware, so the response is streamed straight through
+    instead of being copied between tasks as with @app.middleware("http").
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Set the default values for the tracking and correlation IDs
+        telemetry.tracking_id.set(tools.generate_uuid())
+        x_correlation_id: str | None = Headers(scope=scope).get(
+            constants.HTTPHeaders.X_CORRELATION_ID.value
+        )
+        if x_correlation_id:
+            telemetry.correlation_id.set(x_correlation_id)
+
+        async def send_with_cache_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers[
+                    constants.HTTPHeaders.CACHE_CONTROL.value
+                ] = "no-cache, no-store"
+                headers[constants.HTTPHeaders.PRAGMA.value] = "no-cache"
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_headers)
+
+
+class MetricsMiddleware:
+    """
+    Count the requests and measure their latency per route.
+    The route is the path template, e.g. /client/{client_id}, so the number of
+    series doesn't grow with the requests.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router sets the route that matched the request
+            route: str = getattr(scope.get("route"), "path", "unmatched")
+            metrics.http_request_duration.observe(
+                time.perf_counter() - start, route, scope["method"]
+            )
+            metrics.http_requests.inc(route, scope["method"], str(status_code))
+
+
+class TracingMiddleware:
+    """Trace each request in a span named after its route, e.g. POST /token"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracing.is_tracing():
+            await self.app(scope, receive, send)
+            return
+
+        with tracing.start_span(
+            name=scope["method"],
+            attributes={
+                "http.request.method": scope["method"],
+                "tracking_id": telemetry.tracking_id.get(),
+            },
+        ) as span:
+
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # The router sets the route that matched the request
+                route: str | None = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.set_attribute("http.route", route)
+                    span.update_name(f"{scope['method']} {route}")
+
+
+class AdmissionControlMiddleware:
+    """
+    Limit the requests to the given paths that are handled at once and shed the
+    ones that can't start within the latency target.
+
+    The requests over the limit wait in a FIFO queue. Once one of them waits
+    longer than the target, the server is considered overloaded and new requests
+    are rejected right away with 503 until the queue drains, instead of queueing
+    up to time out at the client after the work on them was done.
+    The paths can be templates, e.g. /authorize/{callback_id}, and any other
+    path, like /healthcheck, is never shed.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Iterable[str],
+        max_in_flight: int = constants.ADMISSION_MAX_IN_FLIGHT,
+        max_queue_size: int = constants.ADMISSION_MAX_QUEUE_SIZE,
+        latency_target: float = constants.ADMISSION_LATENCY_TARGET_MILLISECS / 1000,
+    ) -> None:
+        self.app = app
+        self._paths = {path for path in paths if "{" not in path}
+        self._path_prefixes = tuple(
+            path[: path.index("{")] for path in paths if "{" in path
+        )
+        self._max_in_flight = max_in_flight
+        self._max_queue_size = max_queue_size
+        self._latency_target = latency_target
+        self._in_flight = 0
+        # The requests waiting for a slot. The ones that gave up are cancelled
+        # and skipped when a slot is released
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._is_overloaded = False
+        # Moving average of the time in seconds to handle a request
+        self._service_time = 0.0
+
+    def _is_admission_controlled(self, path: str) -> bool:
+        return path in self._paths or path.startswith(self._path_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._is_admission_controlled(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        if self._in_flight < self._max_in_flight:
+            self._in_flight += 1
+        elif (
+            self._is_overloaded
+            or len(self._waiters) >= self._max_queue_size
+            or not await self._wait_for_slot()
+        ):
+            await self._shed(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._service_time += 0.1 * (
+                time.perf_counter() - start - self._service_time
+            )
+            self._release_slot()
+
+    async def _wait_for_slot(self) -> bool:
+        """Return False if no slot was released within the latency target"""
+
+        slot: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        has_slot = False
+        try:
+            await asyncio.wait_for(slot, timeout=self._latency_target)
+            has_slot = True
+        except asyncio.TimeoutError:
+            self._is_overloaded = True
+        finally:
+            # The slot may be handed over right as the wait is interrupted
+            if not has_slot and slot.done() and not slot.cancelled():
+                self._release_slot()
+        return has_slot
+
+    def _release_slot(self) -> None:
+        # Hand the slot over to the oldest request still waiting
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+
+        self._in_flight -= 1
+        self._is_overloaded = False
+
+    async def _shed(self, scope: Scope, receive: Receive, send: Send) -> None:
+        metrics.shed_requests.inc()
+        # Time for the requests in the queue to be handled
+        retry_after = math.ceil(
+            (len(self._waiters) + 1) * self._service_time / self._max_in_flight
+        )
+        response = JSONResponse(
+            status_code=constants.ErrorCode.TEMPORARILY_UNAVAILABLE.value,
+            content={
+                "error": constants.ErrorCode.TEMPORARILY_UNAVAILABLE.name.lower(),
+                "error_description": "the server is overloaded",
+            },
+            headers={constants.HTTPHeaders.RETRY_AFTER.value: str(max(retry_after, 1))},
+        )
+        await response(scope, receive, send)
@@ -1,7 +1,18 @@
 from typing import List
+from datetime import datetime
+import dataclasses
 
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import Table, Column, ForeignKey, String, Integer, Boolean
+from sqlalchemy import (
+    Table,
+    Column,
+    ForeignKey,
+    String,
+    Integer,
+    Float,
+    Boolean,
+    DateTime,
+)
 
 from .constants import TokenType, SigningAlgorithm
 from . import schemas, constants, tools
@@ -21,6 +32,8 @@ class TokenModel(Base):
     key_id: Mapped[str | None] = mapped_column(String(50), nullable=True)
     signing_algorithm: Mapped[str | None] = mapped_column(String(10), nullable=True)
     is_refreshable: Mapped[bool] = mapped_column(Boolean())
+    is_reusable: Mapped[bool] = mapped_column(Boolean(), default=False)
+    reuse_min_lifetime_ratio: Mapped[float] = mapped_column(Float(), default=0.5)
 
     def to_schema(self) -> schemas.TokenModel:
         if self.token_type == TokenType.JWT.value:
@@ -36,6 +49,17 @@ class TokenModel(Base):
                 key=jwk.key,
                 signing_algorithm=jwk.signing_algorithm,
                 is_refreshable=self.is_refreshable,
+                is_reusable=self.is_reusable,
+                reuse_min_lifetime_ratio=self.reuse_min_lifetime_ratio,
+            )
+        if self.token_type == TokenType.OPAQUE.value:
+            return schemas.OpaqueTokenModel(
+                id=self.id,
+                issuer=self.issuer,
+                expires_in=self.expires_in,
+                is_refreshable=self.is_refreshable,
+                is_reusable=self.is_reusable,
+                reuse_min_lifetime_ratio=self.reuse_min_lifetime_ratio,
             )
 
         raise NotImplementedError()
@@ -50,9 +74,12 @@ class TokenModel(Base):
             key_id=token_model.key_id,
             signing_algorithm=constants.PRIVATE_JWKS[
                 token_model.key_id
-            ].signing_algorithm
+            ].signing_algorithm.value
             if token_model.key_id
             else None,
+            is_refreshable=token_model.is_refreshable,
+            is_reusable=token_model.is_reusable,
+            reuse_min_lifetime_ratio=token_model.reuse_min_lifetime_ratio,
         )
 
 
@@ -105,6 +132,7 @@ class Client(Base):
             response_types=[
                 constants.ResponseType(response_type)
                 for response_type in self.response_types.split(",")
+                if response_type
             ],
             grant_types=[
                 constants.GrantType(grant_type)
@@ -134,3 +162,135 @@ class Client(Base):
             token_model_id=client.token_model_id,
             extra_params=tools.to_base64_string(extra_params=client.extra_params),
         )
+
+
+class AuthnSession(Base):
+    __tablename__ = "authn_sessions"
+
+    id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    callback_id: Mapped[str | None] = mapped_column(
+        String(50), nullable=True, index=True
+    )
+    tracking_id: Mapped[str] = mapped_column(String(50))
+    correlation_id: Mapped[str] = mapped_column(String(100))
+    client_id: Mapped[str] = mapped_column(String(50))
+    redirect_uri: Mapped[str] = mapped_column(String(1000))
+    response_types: Mapped[str] = mapped_column(String(100))
+    requested_scopes: Mapped[str] = mapped_column(String(1000))
+    state: Mapped[str] = mapped_column(String(200))
+    auth_policy_id: Mapped[str] = mapped_column(String(50))
+    next_authn_step_id: Mapped[str] = mapped_column(String(50))
+    user_id: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    authz_code: Mapped[str | None] = mapped_column(
+        String(50), nullable=True, index=True
+    )
+    authz_code_creation_timestamp: Mapped[int | None] = mapped_column(
+        Integer(), nullable=True
+    )
+    code_challenge: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    request_uri: Mapped[str | None] = mapped_column(
+        String(100), nullable=True, index=True
+    )
+    params: Mapped[str] = mapped_column(String(4000))
+    creation_timestamp: Mapped[int] = mapped_column(Integer())
+    expiration: Mapped[int] = mapped_column(Integer(), index=True)
+
+    def to_schema(self) -> schemas.AuthnSession:
+        return schemas.AuthnSession(
+            id=self.id,
+            callback_id=self.callback_id,
+            tracking_id=self.tracking_id,
+            correlation_id=self.correlation_id,
+            client_id=self.client_id,
+            redirect_uri=self.redirect_uri,
+            response_types=[
+                constants.ResponseType(response_type)
+                for response_type in self.response_types.split(",")
+                if response_type
+            ],
+            requested_scopes=[
+                scope for scope in self.requested_scopes.split(",") if scope
+            ],
+            state=self.state,
+            auth_policy_id=self.auth_policy_id,
+            next_authn_step_id=self.next_authn_step_id,
+            user_id=self.user_id,
+            authz_code=self.authz_code,
+            authz_code_creation_timestamp=self.authz_code_creation_timestamp,
+            code_challenge=self.code_challenge,
+            request_uri=self.request_uri,
+            params=tools.to_json(base64_string=self.params),
+            creation_timestamp=self.creation_timestamp,
+        )
+
+    @classmethod
+    def to_db_model(cls, session: schemas.AuthnSession) -> "AuthnSession":
+        return AuthnSession(
+            id=session.id,
+            callback_id=session.callback_id,
+            tracking_id=session.tracking_id,
+            correlation_id=session.correlation_id,
+            client_id=session.client_id,
+            redirect_uri=session.redirect_uri,
+            response_types=",".join([rt.value for rt in session.response_types]),
+            requested_scopes=",".join(session.requested_scopes),
+            state=session.state,
+            auth_policy_id=session.auth_policy_id,
+            next_authn_step_id=session.next_authn_step_id,
+            user_id=session.user_id,
+            authz_code=session.authz_code,
+            authz_code_creation_timestamp=session.authz_code_creation_timestamp,
+            code_challenge=session.code_challenge,
+            request_uri=session.request_uri,
+            params=tools.to_base64_string(extra_params=session.params),
+            creation_timestamp=session.creation_timestamp,
+            expiration=session.get_expiration(),
+        )
+
+
+class TokenSession(Base):
+    __tablename__ = "token_sessions"
+
+    token_id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    refresh_token: Mapped[str | None] = mapped_column(
+        String(50), nullable=True, index=True
+    )
+    client_id: Mapped[str] = mapped_column(String(50))
+    token_model_id: Mapped[str] = mapped_column(String(50))
+    token_info: Mapped[str] = mapped_column(String(4000))
+    created_at: Mapped[datetime] = mapped_column(DateTime())
+    expiration: Mapped[int] = mapped_column(Integer(), index=True)
+
+    def to_schema(self) -> schemas.TokenSession:
+        return schemas.TokenSession(
+            token_id=self.token_id,
+            refresh_token=self.refresh_token,
+            client_id=self.client_id,
+            token_model_id=self.token_model_id,
+            token_info=schemas.TokenInfo(**tools.to_json(base64_string=self.token_info)),  # type: ignore
+            created_at=self.created_at,
+            expiration=self.expiration,
+        )
+
+    @classmethod
+    def to_db_model(cls, session: schemas.TokenSession) -> "TokenSession":
+        return TokenSession(
+            token_id=session.token_id,
+            refresh_token=session.refresh_token,
+            client_id=session.client_id,
+            token_model_id=session.token_model_id,
+            token_info=tools.to_base64_string(
+                extra_params=dataclasses.asdict(session.token_info)
+            ),
+            created_at=session.created_at,
+            expiration=session.expiration,
+        )
+
+
+class RotatedRefreshToken(Base):
+    __tablename__ = "rotated_refresh_tokens"
+
+    refresh_token: Mapped[str] = mapped_column(String(50), primary_key=True)
+    # Indexed to point the rotated refresh tokens to the new ID of their session
+    token_id: Mapped[str] = mapped_column(String(50), index=True)
+    expiration: Mapped[int] = mapped_column(Integer(), index=True)
@@ -0,0 +1,93 @@
+from typing import Iterator
+import hashlib
+import math
+
+from . import tools
+from .timer_wheel import TimerWheel
+
+
+class BloomFilter:
+    """
+    Set membership in a few bits per item.
+    It may report items that were never added, but never misses the ones that were.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float) -> None:
+        self.capacity = max(capacity, 1)
+        self._size = math.ceil(
+            -self.capacity * math.log(false_positive_rate) / math.log(2) ** 2
+        )
+        self._hash_count = max(1, round(self._size / self.capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def _get_positions(self, item: str) -> Iterator[int]:
+        # Derive all the positions from two hashes as proposed by Kirsch and Mitzenmacher
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first_hash = int.from_bytes(digest[:8], "little")
+        second_hash = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self._hash_count):
+            yield (first_hash + i * second_hash) % self._size
+
+    def add(self, item: str) -> None:
+        for position in self._get_positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._get_positions(item)
+        )
+
+
+class RevokedTokens:
+    """
+    IDs of the revoked tokens, kept until the tokens expire.
+    Most tokens checked were never revoked, so a Bloom filter answers them without
+    touching the exact set, which is only consulted to rule out false positives.
+    Expired IDs can't be removed from the filter, so it is rebuilt from the exact set
+    once they outnumber the live ones.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float) -> None:
+        self._false_positive_rate = false_positive_rate
+        self._expirations: TimerWheel[str] = TimerWheel()
+        self._filter = BloomFilter(
+            capacity=capacity, false_positive_rate=false_positive_rate
+        )
+        # Number of IDs in the filter that are no longer in the exact set
+        self._stale_count = 0
+
+    def __len__(self) -> int:
+        return len(self._expirations)
+
+    def _remove_expired(self) -> None:
+        self._stale_count += len(self._expirations.pop_expired())
+        if self._stale_count > len(self._expirations):
+            self._rebuild_filter(capacity=self._filter.capacity)
+
+    def _rebuild_filter(self, capacity: int) -> None:
+        self._filter = BloomFilter(
+            capacity=capacity, false_positive_rate=self._false_positive_rate
+        )
+        for token_id in self._expirations:
+            self._filter.add(token_id)
+        self._stale_count = 0
+
+    def revoke(self, token_id: str, expiration: int) -> None:
+        """Consider the token revoked until its expiration timestamp"""
+        if expiration <= tools.get_timestamp_now():
+            return
+
+        self._remove_expired()
+        self._expirations.schedule(key=token_id, expires_at=expiration)
+        self._filter.add(token_id)
+        # Keep the false positive rate by growing the filter once it is full
+        if len(self._expirations) + self._stale_count > self._filter.capacity:
+            self._rebuild_filter(capacity=self._filter.capacity * 2)
+
+    def is_revoked(self, token_id: str) -> bool:
+        if token_id not in self._filter:
+            return False
+
+        expiration = self._expirations.get_expiration(token_id)
+        return expiration is not None and expiration > tools.get_timestamp_now()
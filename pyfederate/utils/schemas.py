@@ -2,19 +2,29 @@ from pydantic import BaseModel, model_validator, Field
 from dataclasses import dataclass, field
 from fastapi.exceptions import RequestValidationError
 from typing import Any, List, Dict, Optional, Callable, Awaitable
-import bcrypt
-import jwt
 from datetime import datetime
 from abc import ABC, abstractmethod
+import secrets
+import math
+import jwt
 from fastapi import Request, Response, status
 from fastapi.responses import RedirectResponse
 
 from . import constants, exceptions
 from .constants import TokenClaim, ErrorCode, GrantType, ClientAuthnMethod
-from . import tools
+from . import tools, signing, tracing
 
 ######################################## Token ########################################
 
+# Resolve the claim names once instead of for every token
+_JWT_ID_CLAIM = TokenClaim.JWT_ID.value
+_SUBJECT_CLAIM = TokenClaim.SUBJECT.value
+_ISSUER_CLAIM = TokenClaim.ISSUER.value
+_ISSUED_AT_CLAIM = TokenClaim.ISSUED_AT.value
+_EXPIRATION_CLAIM = TokenClaim.EXPIRATION.value
+_CLIENT_ID_CLAIM = TokenClaim.CLIENT_ID.value
+_SCOPE_CLAIM = TokenClaim.SCOPE.value
+
 
 @dataclass
 class TokenInfo:
@@ -29,14 +39,16 @@ class TokenInfo:
 
     def to_jwt_payload(self) -> Dict[str, Any]:
         payload = {
-            TokenClaim.JWT_ID.value: self.id,
-            TokenClaim.SUBJECT.value: self.subject,
-            TokenClaim.ISSUER.value: self.issuer,
-            TokenClaim.ISSUED_AT.value: self.issued_at,
-            TokenClaim.EXPIRATION.value: self.expiration,
-            TokenClaim.CLIENT_ID.value: self.client_id,
-            TokenClaim.SCOPE.value: " ".join(self.scopes),
+            _JWT_ID_CLAIM: self.id,
+            _SUBJECT_CLAIM: self.subject,
+            _ISSUER_CLAIM: self.issuer,
+            _ISSUED_AT_CLAIM: self.issued_at,
+            _EXPIRATION_CLAIM: self.expiration,
+            _CLIENT_ID_CLAIM: self.client_id,
+            _SCOPE_CLAIM: " ".join(self.scopes),
         }
+        if not self.additional_info:
+            return payload
 
         # Merge the two dicts and do not allow the additional_info to override values in the payload
         return self.additional_info | payload
@@ -48,6 +60,10 @@ class BaseTokenModel(BaseModel):
     expires_in: int
     is_refreshable: bool
     refresh_lifetime_secs: int = Field(default=0)
+    # When enabled, client credentials requests with the same client and scopes get the
+    # token issued previously while it has more than this fraction of its lifetime left
+    is_reusable: bool = Field(default=False)
+    reuse_min_lifetime_ratio: float = Field(default=0.5, ge=0, le=1)
 
 
 class TokenModel(BaseTokenModel, ABC):
@@ -55,6 +71,18 @@ class TokenModel(BaseTokenModel, ABC):
     def generate_token(self, token_info: TokenInfo) -> str:
         pass
 
+    async def generate_token_async(self, token_info: TokenInfo) -> str:
+        """Generate the token without holding the event loop when the model allows it"""
+        return self.generate_token(token_info=token_info)
+
+    def generate_token_id(self) -> str:
+        return tools.generate_uuid()
+
+    @abstractmethod
+    def is_token_valid(self, token: str, token_info: TokenInfo) -> bool:
+        """Check if the token was issued by the model with the information informed"""
+        pass
+
     @abstractmethod
     def to_output(self) -> "TokenModelOut":
         pass
@@ -67,11 +95,41 @@ class JWTTokenModel(TokenModel):
 
     def generate_token(self, token_info: TokenInfo) -> str:
 
-        return jwt.encode(
-            payload=token_info.to_jwt_payload(),
-            key=self.key,
-            algorithm=self.signing_algorithm.value,
-        )
+        return signing.get_signer(
+            key_id=self.key_id, key=self.key, signing_algorithm=self.signing_algorithm
+        ).sign(payload=token_info.to_jwt_payload())
+
+    async def generate_token_async(self, token_info: TokenInfo) -> str:
+
+        signing_engine = signing.get_signing_engine()
+        with tracing.start_span(
+            name="jwt sign",
+            attributes={"signing_algorithm": self.signing_algorithm.value},
+        ):
+            # HMAC signing is cheaper than sending the job to another process
+            if (
+                signing_engine is None
+                or self.signing_algorithm == constants.SigningAlgorithm.HS256
+            ):
+                return self.generate_token(token_info=token_info)
+
+            return await signing_engine.sign(
+                key_id=self.key_id,
+                key=self.key,
+                signing_algorithm=self.signing_algorithm,
+                payload=token_info.to_jwt_payload(),
+            )
+
+    def is_token_valid(self, token: str, token_info: TokenInfo) -> bool:
+        try:
+            payload = signing.get_signer(
+                key_id=self.key_id,
+                key=self.key,
+                signing_algorithm=self.signing_algorithm,
+            ).decode(token=token)
+        except jwt.InvalidTokenError:
+            return False
+        return payload.get(TokenClaim.JWT_ID.value) == token_info.id
 
     def to_output(self) -> "TokenModelOut":
 
@@ -81,11 +139,43 @@ class JWTTokenModel(TokenModel):
             expires_in=self.expires_in,
             token_type=constants.TokenType.JWT,
             is_refreshable=self.is_refreshable,
+            is_reusable=self.is_reusable,
+            reuse_min_lifetime_ratio=self.reuse_min_lifetime_ratio,
             key_id=self.key_id,
             signing_algorithm=self.signing_algorithm,
         )
 
 
+class OpaqueTokenModel(TokenModel):
+    """
+    The tokens are random references to the token sessions that hold their information,
+    so they can be looked up and revoked in the session manager
+    """
+
+    def generate_token(self, token_info: TokenInfo) -> str:
+        return token_info.id
+
+    def generate_token_id(self) -> str:
+        return tools.generate_opaque_token()
+
+    def is_token_valid(self, token: str, token_info: TokenInfo) -> bool:
+        return secrets.compare_digest(token, token_info.id)
+
+    def to_output(self) -> "TokenModelOut":
+
+        return TokenModelOut(
+            id=self.id,
+            issuer=self.issuer,
+            expires_in=self.expires_in,
+            token_type=constants.TokenType.OPAQUE,
+            is_refreshable=self.is_refreshable,
+            is_reusable=self.is_reusable,
+            reuse_min_lifetime_ratio=self.reuse_min_lifetime_ratio,
+            key_id=None,
+            signing_algorithm=None,
+        )
+
+
 class TokenModelUpsert(BaseTokenModel):
     token_type: constants.TokenType
     key_id: str | None
@@ -110,6 +200,8 @@ class TokenModelIn(BaseTokenModel):
             issuer=self.issuer,
             expires_in=self.expires_in,
             is_refreshable=self.is_refreshable,
+            is_reusable=self.is_reusable,
+            reuse_min_lifetime_ratio=self.reuse_min_lifetime_ratio,
             token_type=self.token_type,
             key_id=self.key_id,
         )
@@ -164,6 +256,41 @@ class PrivateKeyJWTAuthnMethod(AuthnMethod):
     signing_alg: str
 
 
+@dataclass(frozen=True)
+class RateLimit:
+    # Tokens added to the bucket per second
+    rate: float
+    # Max tokens in the bucket
+    burst: int
+
+
+client_default_rate_limit: RateLimit | None = (
+    RateLimit(rate=constants.CLIENT_RATE_LIMIT, burst=constants.CLIENT_RATE_LIMIT_BURST)
+    if constants.CLIENT_RATE_LIMIT > 0
+    else None
+)
+
+
+def parse_rate_limit(extra_params: Dict[str, str]) -> RateLimit | None:
+    """
+    Parse the rate limit defined by the client extra params, if any.
+    Throws:
+        ValueError
+    """
+    rate = extra_params.get(constants.ClientParam.RATE_LIMIT.value)
+    burst = extra_params.get(constants.ClientParam.RATE_LIMIT_BURST.value)
+    burst_ = int(burst) if burst is not None else constants.CLIENT_RATE_LIMIT_BURST
+    if burst_ < 1:
+        raise ValueError(f"invalid rate limit burst: {burst}")
+    if rate is None:
+        return None
+
+    rate_ = float(rate)
+    if not math.isfinite(rate_) or rate_ <= 0:
+        raise ValueError(f"invalid rate limit: {rate}")
+    return RateLimit(rate=rate_, burst=burst_)
+
+
 class ClientBase(BaseModel):
     id: str
     authn_method: constants.ClientAuthnMethod
@@ -202,9 +329,17 @@ class Client(ClientBase):
         if self.hashed_secret is None:
             return False
 
-        return bcrypt.checkpw(
-            password=client_secret.encode(constants.SECRET_ENCODING),
-            hashed_password=self.hashed_secret.encode(constants.SECRET_ENCODING),
+        return tools.is_secret_valid(
+            secret=client_secret, hashed_secret=self.hashed_secret
+        )
+
+    async def verify_secret(self, client_secret: str) -> bool:
+        """Same as is_authenticated_by_secret, but bcrypt doesn't run on the event loop"""
+        if self.hashed_secret is None:
+            return False
+
+        return await tools.verify_secret(
+            client_id=self.id, secret=client_secret, hashed_secret=self.hashed_secret
         )
 
     def are_scopes_allowed(self, requested_scopes: List[str]) -> bool:
@@ -221,6 +356,18 @@ class Client(ClientBase):
     def is_grant_type_allowed(self, grant_type: constants.GrantType) -> bool:
         return grant_type in self.grant_types
 
+    def get_rate_limit(self) -> RateLimit | None:
+        """
+        Rate limit of the client, or the default one if it doesn't define a valid one.
+        The params are validated when the client is created, but the clients stored
+        before that are not.
+        """
+        try:
+            rate_limit = parse_rate_limit(extra_params=self.extra_params)
+        except ValueError:
+            return client_default_rate_limit
+        return rate_limit or client_default_rate_limit
+
 
 #################### API Models ####################
 
@@ -278,6 +425,16 @@ class ClientIn(ClientBase):
             )
         return self
 
+    @model_validator(mode="after")  # type: ignore
+    def rate_limit_params_must_be_positive_numbers(self) -> "ClientIn":
+        try:
+            parse_rate_limit(extra_params=self.extra_params)
+        except ValueError:
+            raise RequestValidationError(
+                "The rate limit must be a positive number and its burst a positive integer"
+            )
+        return self
+
 
 class ClientOut(ClientBase):
     token_model_id: str
@@ -331,6 +488,49 @@ class AuthorizeContext:
     code_challenge_method: constants.CodeChallengeMethod
 
 
+#################### Introspection Endpoint ####################
+
+
+class IntrospectionResponse(BaseModel):
+    active: bool
+    scope: str | None = None
+    client_id: str | None = None
+    token_type: str | None = None
+    exp: int | None = None
+    iat: int | None = None
+    sub: str | None = None
+    iss: str | None = None
+    jti: str | None = None
+
+    @classmethod
+    def from_token_info(cls, token_info: TokenInfo) -> "IntrospectionResponse":
+        return IntrospectionResponse(
+            active=True,
+            scope=" ".join(token_info.scopes),
+            client_id=token_info.client_id,
+            token_type=constants.BEARER_TOKEN_TYPE,
+            exp=token_info.expiration,
+            iat=token_info.issued_at,
+            sub=token_info.subject,
+            iss=token_info.issuer,
+            jti=token_info.id,
+        )
+
+    @classmethod
+    def from_jwt_payload(cls, payload: Dict[str, Any]) -> "IntrospectionResponse":
+        return IntrospectionResponse(
+            active=True,
+            scope=payload.get(_SCOPE_CLAIM),
+            client_id=payload.get(_CLIENT_ID_CLAIM),
+            token_type=constants.BEARER_TOKEN_TYPE,
+            exp=payload.get(_EXPIRATION_CLAIM),
+            iat=payload.get(_ISSUED_AT_CLAIM),
+            sub=payload.get(_SUBJECT_CLAIM),
+            iss=payload.get(_ISSUER_CLAIM),
+            jti=payload.get(_JWT_ID_CLAIM),
+        )
+
+
 ######################################## Session ########################################
 
 
@@ -353,6 +553,22 @@ class AuthnSession:
     request_uri: str | None
     params: Dict[str, Any] = field(default_factory=dict)
     id: str = field(default_factory=tools.generate_session_id)
+    creation_timestamp: int = field(default_factory=tools.get_timestamp_now)
+
+    def get_expiration(self) -> int:
+        """Get the timestamp after which the session can no longer be used"""
+
+        if self.authz_code_creation_timestamp is not None:
+            return (
+                self.authz_code_creation_timestamp
+                + constants.AUTHORIZATION_CODE_TIMEOUT
+            )
+
+        if self.request_uri is not None and not self.auth_policy_id:
+            # The session was pushed, but /authorize was not called yet
+            return self.creation_timestamp + constants.REQUEST_URI_TIMEOUT
+
+        return self.creation_timestamp + constants.AUTHN_SESSION_TIMEOUT
 
 
 @dataclass
@@ -363,6 +579,8 @@ class TokenSession:
     token_model_id: str
     token_info: TokenInfo
     created_at: datetime
+    # Timestamp after which neither the access token nor the refresh token are valid
+    expiration: int
 
 
 ######################################## Auth Policy ########################################
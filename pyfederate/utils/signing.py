@@ -0,0 +1,231 @@
+from typing import Any, Dict, List, Tuple
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+import multiprocessing
+import asyncio
+import functools
+import json
+import jwt
+from jwt.algorithms import get_default_algorithms
+from jwt.utils import base64url_encode
+
+from . import constants, telemetry
+
+logger = telemetry.get_logger(__name__)
+
+
+# Same serialization PyJWT uses, but the encoder is built once instead of per call
+_json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+class Signer:
+    """
+    Sign JWTs with a key that is parsed only once.
+    The header segment is also encoded once, so only the claims are serialized per token.
+    The header carries the key ID, so the tokens can be verified without trying every key.
+    The tokens are byte-identical to the ones jwt.encode generates, as long as the claims
+    are JSON types, e.g. timestamps instead of datetime objects.
+    """
+
+    def __init__(
+        self, key_id: str, key: str, signing_algorithm: constants.SigningAlgorithm
+    ) -> None:
+        self.key_id = key_id
+        self.signing_algorithm = signing_algorithm
+        self._algorithm = get_default_algorithms()[signing_algorithm.value]
+        self._key = self._algorithm.prepare_key(key)
+        # Asymmetric signatures are verified with the public key
+        self._verification_key = (
+            self._key.public_key() if hasattr(self._key, "public_key") else self._key
+        )
+        self._header_segment = base64url_encode(
+            json.dumps(
+                {"alg": signing_algorithm.value, "kid": key_id, "typ": "JWT"},
+                separators=(",", ":"),
+                sort_keys=True,
+            ).encode()
+        )
+
+    def sign(self, payload: Dict[str, Any]) -> str:
+        signing_input = (
+            self._header_segment
+            + b"."
+            + base64url_encode(_json_encoder.encode(payload).encode())
+        )
+        signature = self._algorithm.sign(signing_input, self._key)
+        return (signing_input + b"." + base64url_encode(signature)).decode()
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """
+        Verify the signature and the expiration of the token and return its claims.
+        Throws:
+            jwt.InvalidTokenError
+        """
+        return jwt.decode(
+            token,
+            key=self._verification_key,
+            algorithms=[self.signing_algorithm.value],
+            options={"verify_aud": False},
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_signer(
+    key_id: str, key: str, signing_algorithm: constants.SigningAlgorithm
+) -> Signer:
+    """
+    Get the signer of the key.
+    The key is part of the cache key, so a key replaced under the same ID gets a new signer.
+    """
+    return Signer(key_id=key_id, key=key, signing_algorithm=signing_algorithm)
+
+
+#################### Signing Engine ####################
+
+
+def sign_batch(
+    key_id: str,
+    key: str,
+    signing_algorithm: constants.SigningAlgorithm,
+    payloads: List[Dict[str, Any]],
+) -> List[str]:
+    """Sign the payloads inside a worker process, which keeps its own signers cached"""
+    signer = get_signer(key_id=key_id, key=key, signing_algorithm=signing_algorithm)
+    return [signer.sign(payload=payload) for payload in payloads]
+
+
+SignerParams = Tuple[str, str, constants.SigningAlgorithm]
+
+
+class SigningEngine:
+    """
+    Sign tokens in a pool of processes so asymmetric signing doesn't hold the event loop.
+    The jobs for the same key that arrive within batch_window seconds are sent
+    to a process in a single call, which pays the inter process overhead once.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        batch_window: float = constants.SIGNING_BATCH_WINDOW_MICROSECS / 1e6,
+        batch_max_size: int = constants.SIGNING_BATCH_MAX_SIZE,
+    ) -> None:
+        # Forking a process that runs an event loop and threads is not safe
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._batch_window = batch_window
+        self._batch_max_size = batch_max_size
+        self._pending_jobs: Dict[
+            SignerParams, List[Tuple[Dict[str, Any], asyncio.Future[str]]]
+        ] = {}
+
+    async def sign(
+        self,
+        key_id: str,
+        key: str,
+        signing_algorithm: constants.SigningAlgorithm,
+        payload: Dict[str, Any],
+    ) -> str:
+        loop = asyncio.get_running_loop()
+        signer_params: SignerParams = (key_id, key, signing_algorithm)
+        future: asyncio.Future[str] = loop.create_future()
+
+        jobs = self._pending_jobs.setdefault(signer_params, [])
+        jobs.append((payload, future))
+        if len(jobs) == 1:
+            loop.call_later(self._batch_window, self._flush, signer_params)
+        elif len(jobs) >= self._batch_max_size:
+            self._flush(signer_params=signer_params)
+
+        return await future
+
+    def _flush(self, signer_params: SignerParams) -> None:
+        jobs = self._pending_jobs.pop(signer_params, None)
+        # The batch was already sent because it got full
+        if not jobs:
+            return
+
+        try:
+            batch_future = asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                sign_batch,
+                *signer_params,
+                [payload for payload, _ in jobs],
+            )
+        except RuntimeError as e:
+            # The executor was shut down or one of its processes died (BrokenProcessPool),
+            # so the batch is signed in the event loop instead of leaving the callers waiting
+            logger.error(f"The signing processes are unavailable: {e}")
+            self._sign_in_loop(signer_params=signer_params, jobs=jobs)
+            return
+        batch_future.add_done_callback(
+            functools.partial(
+                self._resolve_jobs, signer_params=signer_params, jobs=jobs
+            )
+        )
+
+    def _resolve_jobs(
+        self,
+        batch_future: asyncio.Future[List[str]],
+        signer_params: SignerParams,
+        jobs: List[Tuple[Dict[str, Any], asyncio.Future[str]]],
+    ) -> None:
+        exception: BaseException | None = (
+            asyncio.CancelledError()
+            if batch_future.cancelled()
+            else batch_future.exception()
+        )
+        if isinstance(exception, BrokenExecutor):
+            logger.error(f"The signing processes are unavailable: {exception}")
+            self._sign_in_loop(signer_params=signer_params, jobs=jobs)
+            return
+        if exception is not None:
+            logger.error(f"Error signing a batch of {len(jobs)} tokens: {exception}")
+
+        for i, (_, future) in enumerate(jobs):
+            if future.done():
+                continue
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(batch_future.result()[i])
+
+    @staticmethod
+    def _sign_in_loop(
+        signer_params: SignerParams,
+        jobs: List[Tuple[Dict[str, Any], asyncio.Future[str]]],
+    ) -> None:
+        try:
+            tokens = sign_batch(*signer_params, [payload for payload, _ in jobs])
+        except Exception as e:
+            logger.error(f"Error signing a batch of {len(jobs)} tokens: {e}")
+            for _, future in jobs:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for token, (_, future) in zip(tokens, jobs):
+            if not future.done():
+                future.set_result(token)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+@functools.lru_cache(maxsize=None)
+def get_signing_engine() -> SigningEngine | None:
+    """Get the signing engine, which is only created if SIGNING_PROCESSES is set"""
+    if constants.SIGNING_PROCESSES <= 0:
+        return None
+    return SigningEngine(max_workers=constants.SIGNING_PROCESSES)
+
+
+def shutdown_signing_engine() -> None:
+    """Stop the processes of the signing engine, if it was created"""
+    if get_signing_engine.cache_info().currsize == 0:
+        return
+
+    signing_engine = get_signing_engine()
+    if signing_engine is not None:
+        signing_engine.shutdown()
+    get_signing_engine.cache_clear()
@@ -1,8 +1,15 @@
+from typing import List, TextIO
 import uuid
 import logging
 import json
 import contextvars
+import atexit
+import functools
+import queue
+import sys
+import threading
 from datetime import datetime
+from logging.handlers import QueueHandler
 
 from . import constants
 
@@ -13,6 +20,11 @@ correlation_id: contextvars.ContextVar[str] = contextvars.ContextVar(
     "correlation_id", default=str(uuid.UUID("00000000-0000-0000-0000-000000000000"))
 )
 
+# The handler is installed in this logger, which is the parent of the loggers of the package
+ROOT_LOGGER_NAME = "pyfederate"
+# Built once instead of once per record as json.dumps does
+_json_encoder = json.JSONEncoder()
+
 
 class ContextFilter(logging.Filter):
     def filter(self, record: logging.LogRecord):
@@ -27,23 +39,174 @@ class JsonFormatter(logging.Formatter):
         json_record = {
             "tracking_id": getattr(record, "tracking_id", None),
             "correlation_id": getattr(record, "correlation_id", None),
-            "timestamp": datetime.now().isoformat(),
+            # The record may be formatted a while after it was created
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
             "level": getattr(record, "levelname", None),
             "file": getattr(record, "filename", None),
             "line": getattr(record, "lineno", None),
             "message": getattr(record, "msg", None),
         }
-        return json.dumps(json_record)
+        return _json_encoder.encode(json_record)
 
 
-def get_logger(name: str) -> logging.Logger:
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hand the records over to the log writer thread without formatting them.
+    When the queue is full the records are dropped and counted, so logging never
+    blocks the caller.
+    """
+
+    def __init__(
+        self,
+        queue: "queue.SimpleQueue[logging.LogRecord | None]",
+        max_size: int = constants.LOG_QUEUE_MAX_SIZE,
+    ) -> None:
+        super().__init__(queue)  # type: ignore
+        self.max_size = max_size
+        self.dropped_records = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The message and its arguments may change before the record is written,
+        # so render the message now. The message may be any object, not only a string
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # A simple queue is much cheaper to put into than a bounded queue.Queue,
+        # so the bound is checked here
+        if self.queue.qsize() >= self.max_size:
+            self.dropped_records += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class BatchingQueueListener:
+    """
+    Format and write the queued records in a background thread.
+    All the records waiting in the queue, up to batch_max_size, are written and
+    flushed at once.
+    """
+
+    def __init__(
+        self,
+        handler: DroppingQueueHandler,
+        formatter: logging.Formatter,
+        stream: TextIO | None = None,
+        batch_max_size: int = constants.LOG_BATCH_MAX_SIZE,
+    ) -> None:
+        self._handler = handler
+        self._queue: "queue.SimpleQueue[logging.LogRecord | None]" = handler.queue  # type: ignore
+        self._formatter = formatter
+        # Resolve sys.stderr on each write, since it may be replaced after the setup
+        self._stream = stream
+        self._batch_max_size = batch_max_size
+        self._reported_dropped_records = 0
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._monitor, name="log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write the records left in the queue and stop the thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _get_dropped_records_record(self) -> logging.LogRecord | None:
+        dropped_records = self._handler.dropped_records - self._reported_dropped_records
+        if dropped_records == 0:
+            return None
+
+        self._reported_dropped_records += dropped_records
+        return logging.makeLogRecord(
+            {
+                "levelno": logging.WARNING,
+                "levelname": logging.getLevelName(logging.WARNING),
+                "filename": "telemetry.py",
+                "msg": f"{dropped_records} log records were dropped because the queue was full",
+            }
+        )
 
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(JsonFormatter())
-    stream_handler.addFilter(ContextFilter())
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        stream = self._stream or sys.stderr
+        lines: List[str] = []
+        for record in records:
+            try:
+                lines.append(self._formatter.format(record) + "\n")
+            except Exception:
+                # A record that can't be formatted must not drop the rest of the batch
+                self._handler.handleError(record)
+        try:
+            stream.write("".join(lines))
+            stream.flush()
+        except Exception:
+            # A failed write must not stop the thread
+            pass
+
+    def _monitor(self) -> None:
+        while True:
+            records: List[logging.LogRecord] = []
+            record = self._queue.get()
+            while record is not None:
+                records.append(record)
+                if len(records) >= self._batch_max_size:
+                    break
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            dropped_records_record = self._get_dropped_records_record()
+            if dropped_records_record is not None:
+                records.append(dropped_records_record)
+            if records:
+                self._write(records=records)
+            # The listener was stopped
+            if record is None:
+                return
+
+
+@functools.lru_cache(maxsize=None)
+def get_queue_handler() -> DroppingQueueHandler:
+    """Get the handler shared by all the loggers, starting the log writer thread on the first call"""
+
+    handler = DroppingQueueHandler(queue.SimpleQueue())
+    handler.addFilter(ContextFilter())
+    listener = BatchingQueueListener(handler=handler, formatter=JsonFormatter())
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
+
+
+@functools.lru_cache(maxsize=None)
+def setup_logging() -> logging.Logger:
+    """
+    Configure the loggers once: the handler is installed only in the root logger
+    of the package, whose children propagate their records to it.
+    """
+
+    root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    root_logger.setLevel(constants.LOG_LEVEL)
+    root_logger.addHandler(get_queue_handler())
+    for logger_name, level in constants.LOG_LEVELS.items():
+        logging.getLogger(logger_name).setLevel(level)
+
+    return root_logger
+
+
+def get_logger(name: str) -> logging.Logger:
 
+    root_logger = setup_logging()
     logger = logging.getLogger(name)
-    logger.setLevel(constants.LOG_LEVEL)
-    logger.addHandler(stream_handler)
+    # Loggers outside the package don't propagate to its root logger
+    if not name.startswith(f"{ROOT_LOGGER_NAME}.") and logger is not root_logger:
+        logger.setLevel(constants.LOG_LEVELS.get(name, constants.LOG_LEVEL))
+        logger.addHandler(get_queue_handler())
 
     return logger
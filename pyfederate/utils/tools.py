@@ -1,5 +1,6 @@
-from typing import Dict
+from typing import Any, Dict
 from fastapi import Request
+from concurrent.futures import ThreadPoolExecutor
 from requests.models import PreparedRequest
 import secrets
 import string
@@ -8,14 +9,28 @@ import uuid
 from random import randint
 from urllib.parse import quote
 from hashlib import sha256
+import hmac
+import asyncio
 import base64
 import json
 import time
 import functools
 
-from . import constants
+from . import constants, metrics, tracing
+from .cache import TTLCache
 
 alphabet = string.ascii_letters + string.digits
+secret_verification_executor = ThreadPoolExecutor(
+    max_workers=constants.SECRET_VERIFICATION_WORKERS,
+    thread_name_prefix="secret-verification",
+)
+# The keys are keyed hashes, so the secrets are never kept in memory
+verified_secrets: TTLCache[bytes, bool] = TTLCache(
+    max_size=constants.VERIFIED_SECRET_CACHE_MAX_SIZE,
+    ttl=constants.VERIFIED_SECRET_CACHE_TTL,
+)
+metrics.register_cache(name="verified_secrets", cache=verified_secrets)
+_verified_secrets_key = secrets.token_bytes(32)
 
 
 def singleton(cls):
@@ -73,12 +88,47 @@ def generate_refresh_token() -> str:
     return generate_fixed_size_random_string(constants.REFRESH_TOKEN_LENGTH)
 
 
+def generate_opaque_token() -> str:
+    return generate_fixed_size_random_string(constants.OPAQUE_TOKEN_LENGTH)
+
+
 def hash_secret(secret: str) -> str:
     return bcrypt.hashpw(
         secret.encode(constants.SECRET_ENCODING), bcrypt.gensalt()
     ).decode(constants.SECRET_ENCODING)
 
 
+def is_secret_valid(secret: str, hashed_secret: str) -> bool:
+    return bcrypt.checkpw(
+        password=secret.encode(constants.SECRET_ENCODING),
+        hashed_password=hashed_secret.encode(constants.SECRET_ENCODING),
+    )
+
+
+async def verify_secret(client_id: str, secret: str, hashed_secret: str) -> bool:
+    """
+    Check the secret against its bcrypt hash without blocking the event loop.
+    Secrets verified recently are accepted without running bcrypt again.
+    The hashed secret is part of the cache key, so rotating it invalidates the entry.
+    """
+
+    cache_key = hmac.digest(
+        _verified_secrets_key,
+        "\0".join([client_id, hashed_secret, secret]).encode(constants.SECRET_ENCODING),
+        "sha256",
+    )
+    if verified_secrets.get(cache_key):
+        return True
+
+    with tracing.start_span(name="bcrypt verify_secret"):
+        is_valid = await asyncio.get_running_loop().run_in_executor(
+            secret_verification_executor, is_secret_valid, secret, hashed_secret
+        )
+    if is_valid:
+        verified_secrets.set(cache_key, True)
+    return is_valid
+
+
 def prepare_redirect_url(url: str, params: Dict[str, str]) -> str:
     """Add path params to the redirect url"""
 
@@ -112,9 +162,11 @@ def get_timestamp_now() -> int:
     return int(time.time())
 
 
-def remove_oldest_item(d: Dict) -> None:
+def remove_oldest_item(d: Dict) -> Any:
+    """Remove the first inserted item of the dict and return its key"""
     first_key = next(iter(d))
     d.pop(first_key)
+    return first_key
 
 
 def generate_request_uri() -> str:
@@ -0,0 +1,98 @@
+"""
+Optional OpenTelemetry tracing, which requires the tracing extra.
+Until setup_tracing is called, start_span returns a context manager that does nothing.
+"""
+
+from typing import Any, ContextManager, Dict
+import contextlib
+import typing
+
+from . import constants, telemetry
+
+if typing.TYPE_CHECKING:
+    from opentelemetry.trace import Tracer
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SpanExporter
+
+logger = telemetry.get_logger(__name__)
+
+_null_span: ContextManager[None] = contextlib.nullcontext()
+# Only set once the tracing is set up, so the spans cost nothing until then
+_tracer: "Tracer | None" = None
+
+
+def get_exporter() -> "SpanExporter":
+    """Create the exporter configured by TRACING_EXPORTER"""
+
+    if constants.TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if constants.TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    # Write one span per line to the local file
+    return ConsoleSpanExporter(
+        out=open(constants.TRACING_FILE_PATH, "a"),
+        formatter=lambda span: span.to_json(indent=None) + "\n",
+    )
+
+
+def setup_tracing(exporter: "SpanExporter | None" = None) -> "TracerProvider":
+    """
+    Start recording the spans and sending them in batches to the exporter,
+    or to the one configured by TRACING_EXPORTER if not informed.
+    """
+    global _tracer
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        exporter = exporter or get_exporter()
+    except ImportError as exception:
+        raise RuntimeError(
+            "Tracing requires the tracing extra, install it with "
+            f"pip install 'pyfederate[tracing]' or disable TRACING_ENABLED: {exception}"
+        ) from exception
+
+    tracer_provider = TracerProvider(
+        resource=Resource.create(
+            {
+                "service.name": constants.TRACING_SERVICE_NAME,
+                "service.version": constants.VERSION,
+            }
+        )
+    )
+    tracer_provider.add_span_processor(
+        BatchSpanProcessor(
+            exporter,
+            max_queue_size=constants.TRACING_QUEUE_MAX_SIZE,
+            max_export_batch_size=constants.TRACING_BATCH_MAX_SIZE,
+        )
+    )
+    _tracer = tracer_provider.get_tracer(__name__, constants.VERSION)
+    logger.info(f"Tracing set up with the exporter {constants.TRACING_EXPORTER}")
+    return tracer_provider
+
+
+def stop_tracing() -> None:
+    global _tracer
+    _tracer = None
+
+
+def is_tracing() -> bool:
+    return _tracer is not None
+
+
+def start_span(
+    name: str, attributes: Dict[str, Any] | None = None
+) -> ContextManager[Any]:
+    """Start a span as the child of the current one, if tracing is set up"""
+    if _tracer is None:
+        return _null_span
+    return _tracer.start_as_current_span(name, attributes=attributes)
@@ -4,7 +4,13 @@ from abc import ABC, abstractmethod
 from ..utils.telemetry import get_logger
 from ..schemas.auth import AuthnSession
 from ..schemas.token import TokenInfo
-from ..utils.tools import remove_oldest_item
+from ..utils.tools import get_timestamp_now
+from ..utils.timer_wheel import TimerWheel
+from ..utils.config import (
+    AUTHORIZATION_CODE_TIMEOUT,
+    AUTHN_SESSION_TIMEOUT,
+    REQUEST_URI_TIMEOUT,
+)
 from .exceptions import EntityAlreadyExistsException, EntityDoesNotExistException
 
 logger = get_logger(__name__)
@@ -61,30 +67,53 @@ class AuthnSessionCRUDManager(ABC):
 
 
 class InMemorySessionCRUDManager(AuthnSessionCRUDManager):
-    def __init__(self, max_number: int = 100) -> None:
-        self._max_number = max_number
+    """Keep the sessions in memory until they expire"""
+
+    def __init__(self) -> None:
         self._sessions: Dict[str, AuthnSession] = {}
+        self._session_expirations: TimerWheel[str] = TimerWheel()
+
+    def _remove_expired_sessions(self) -> None:
+        for session_id in self._session_expirations.pop_expired():
+            self._sessions.pop(session_id)
+
+    def _schedule_expiration(self, session: AuthnSession) -> None:
+        timeout: int
+        if session.authorization_code:
+            # Once the authorization code is issued, the session lives only until the code expires
+            timeout = AUTHORIZATION_CODE_TIMEOUT
+        elif session.id in self._session_expirations:
+            # The updates during the authentication don't extend the session
+            return
+        elif session.request_uri:
+            # The pushed session must be used before the request URI expires
+            timeout = REQUEST_URI_TIMEOUT
+        else:
+            timeout = AUTHN_SESSION_TIMEOUT
+        self._session_expirations.schedule(
+            key=session.id, expires_at=get_timestamp_now() + timeout
+        )
 
     async def create_session(self, session: AuthnSession) -> None:
-
+        self._remove_expired_sessions()
         if session.id in self._sessions:
             logger.info(f"The session ID: {session.id} already exists")
             raise EntityAlreadyExistsException()
 
-        if len(self._sessions) >= self._max_number:
-            remove_oldest_item(self._sessions)
         self._sessions[session.id] = session
+        self._schedule_expiration(session=session)
 
     async def update_session(self, session: AuthnSession) -> None:
-
+        self._remove_expired_sessions()
         if session.id not in self._sessions:
             logger.info(f"The session ID: {session.id} does not exist")
             raise EntityDoesNotExistException()
 
         self._sessions[session.id] = session
+        self._schedule_expiration(session=session)
 
     async def get_session_by_authz_code(self, authz_code: str) -> AuthnSession:
-
+        self._remove_expired_sessions()
         # raise NotImplementedError()
         filtered_sessions: List[AuthnSession] = list(
             filter(
@@ -101,7 +130,7 @@ class InMemorySessionCRUDManager(AuthnSessionCRUDManager):
         return filtered_sessions[0]
 
     async def get_session_by_callback_id(self, callback_id: str) -> AuthnSession:
-
+        self._remove_expired_sessions()
         filtered_sessions: List[AuthnSession] = list(
             filter(
                 lambda session: session.callback_id == callback_id,
@@ -129,4 +158,5 @@ class InMemorySessionCRUDManager(AuthnSessionCRUDManager):
         return filtered_sessions[0]
 
     async def delete_session(self, session_id: str) -> None:
-        self._sessions.pop(session_id)
\ No newline at end of file
+        self._sessions.pop(session_id)
+        self._session_expirations.cancel(key=session_id)
@@ -35,3 +35,5 @@ class AuthnSession:
     callback_id: str = field(default_factory=generate_callback_id)
     correlation_id: str = field(default_factory=correlation_id.get)
     tracking_id: str = field(default_factory=tracking_id.get)
+    # Set when the session was created by a pushed authorization request
+    request_uri: str | None = None
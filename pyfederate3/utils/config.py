@@ -30,6 +30,8 @@ SECRET_ENCODING = os.getenv("SECRET_ENCODING", "utf-8")
 AUTHORIZATION_CODE_TIMEOUT = int(os.getenv("AUTHORIZATION_SESSION_TIMEOUT", 300))
 REQUEST_URI_LENGTH = int(os.getenv("REQUEST_URI_LENGTH", 20))
 REQUEST_URI_TIMEOUT = int(os.getenv("REQUEST_URI_TIMEOUT", 60))
+# Time the user has to go through the authentication policy
+AUTHN_SESSION_TIMEOUT = int(os.getenv("AUTHN_SESSION_TIMEOUT", 600))
 SERVER_PORT = int(os.getenv("SERVER_PORT", 80))
 VERSION = os.getenv("VERSION", "0.1.0")
 PRIVATE_JWKS_JSON = json.loads(
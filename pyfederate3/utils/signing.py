@@ -0,0 +1,53 @@
+from typing import Any, Dict
+import functools
+import json
+from jwt.algorithms import get_default_algorithms
+from jwt.utils import base64url_encode
+
+from .constants import SigningAlgorithm
+
+
+# Same serialization PyJWT uses, but the encoder is built once instead of per call
+_json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+class Signer:
+    """
+    Sign JWTs with a key that is parsed only once.
+    The header segment is also encoded once, so only the claims are serialized per token.
+    The tokens are byte-identical to the ones jwt.encode generates, as long as the claims
+    are JSON types, e.g. timestamps instead of datetime objects.
+    """
+
+    def __init__(
+        self, key_id: str, key: str, signing_algorithm: SigningAlgorithm
+    ) -> None:
+        self.key_id = key_id
+        self.signing_algorithm = signing_algorithm
+        self._algorithm = get_default_algorithms()[signing_algorithm.value]
+        self._key = self._algorithm.prepare_key(key)
+        self._header_segment = base64url_encode(
+            json.dumps(
+                {"alg": signing_algorithm.value, "typ": "JWT"},
+                separators=(",", ":"),
+                sort_keys=True,
+            ).encode()
+        )
+
+    def sign(self, payload: Dict[str, Any]) -> str:
+        signing_input = (
+            self._header_segment
+            + b"."
+            + base64url_encode(_json_encoder.encode(payload).encode())
+        )
+        signature = self._algorithm.sign(signing_input, self._key)
+        return (signing_input + b"." + base64url_encode(signature)).decode()
+
+
+@functools.lru_cache(maxsize=None)
+def get_signer(key_id: str, key: str, signing_algorithm: SigningAlgorithm) -> Signer:
+    """
+    Get the signer of the key.
+    The key is part of the cache key, so a key replaced under the same ID gets a new signer.
+    """
+    return Signer(key_id=key_id, key=key, signing_algorithm=signing_algorithm)
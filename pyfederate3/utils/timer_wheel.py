@@ -0,0 +1,70 @@
+from typing import Dict, Generic, Hashable, Iterable, List, Set, TypeVar
+
+from .tools import get_timestamp_now
+
+
+K = TypeVar("K", bound=Hashable)
+
+
+class TimerWheel(Generic[K]):
+    """
+    Hashed timer wheel with one slot per second.
+    Scheduling, cancelling and expiring a key cost amortized O(1), since every
+    slot is visited at most once when the expired keys are collected.
+    """
+
+    def __init__(self) -> None:
+        # Map an expiration timestamp to the keys expiring at that second
+        self._slots: Dict[int, Set[K]] = {}
+        self._expirations: Dict[K, int] = {}
+        # First second that was not collected yet
+        self._current_tick: int = get_timestamp_now()
+
+    def __len__(self) -> int:
+        return len(self._expirations)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._expirations
+
+    def schedule(self, key: K, expires_at: int) -> None:
+        """Schedule the key to expire at the timestamp, replacing any previous schedule"""
+
+        self.cancel(key)
+        # Keys scheduled in the past are collected in the next call to pop_expired
+        expires_at = max(expires_at, self._current_tick)
+        self._slots.setdefault(expires_at, set()).add(key)
+        self._expirations[key] = expires_at
+
+    def cancel(self, key: K) -> None:
+        expires_at: int | None = self._expirations.pop(key, None)
+        if expires_at is None:
+            return
+
+        slot = self._slots[expires_at]
+        slot.discard(key)
+        if not slot:
+            self._slots.pop(expires_at)
+
+    def get_expiration(self, key: K) -> int | None:
+        return self._expirations.get(key, None)
+
+    def pop_expired(self, now: int | None = None) -> List[K]:
+        """Remove and return the keys whose expiration is less than or equal to now"""
+
+        now = get_timestamp_now() if now is None else now
+        if now < self._current_tick:
+            return []
+
+        ticks: Iterable[int] = range(self._current_tick, now + 1)
+        if now - self._current_tick > len(self._slots):
+            # After a long idle period, visiting only the non empty slots is cheaper
+            ticks = sorted(tick for tick in self._slots if tick <= now)
+
+        expired_keys: List[K] = []
+        for tick in ticks:
+            for key in self._slots.pop(tick, ()):
+                self._expirations.pop(key)
+                expired_keys.append(key)
+        self._current_tick = now + 1
+
+        return expired_keys
@@ -1,10 +1,10 @@
 from abc import ABC, abstractmethod
-import jwt
 
 from ..schemas.token import JWTTokenModelInfo, TokenInfo, Token
 from ..schemas.token import TokenContextInfo
 from ..utils.constants import TokenClaim
 from ..utils.tools import generate_uuid, get_timestamp_now
+from ..utils.signing import get_signer
 
 
 class TokenModel(ABC):
@@ -46,8 +46,8 @@ class JWTTokenModel(TokenModel):
         # Merge the two dicts and allow the additional_info to override values in the payload
         payload = payload | token_info.additional_info
 
-        return jwt.encode(
-            payload=payload,
+        return get_signer(
+            key_id=self._model_info.key_id,
             key=self._model_info.key,
-            algorithm=self._model_info.signing_algorithm.value,
-        )
+            signing_algorithm=self._model_info.signing_algorithm,
+        ).sign(payload=payload)
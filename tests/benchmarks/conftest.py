@@ -0,0 +1,99 @@
+"""
+A benchmark fixture in the style of pytest-benchmark.
+The timings depend on the machine, so each one is recorded relative to the time of
+a fixed calibration workload measured in the same run. That lets the baselines
+checked into the repository be compared with runs on other machines.
+
+Run the benchmarks with:
+    pytest tests/benchmarks --benchmarks
+Record new baselines after an intended change with:
+    pytest tests/benchmarks --save-baselines
+The benchmarks whose ratio to the calibration workload varies more between machines,
+e.g. the ones bound by native code, get their own threshold with:
+    @pytest.mark.regression_threshold(1.0)
+"""
+
+from typing import Any, Callable, Dict, Iterator
+import json
+import os
+import timeit
+import pytest
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+# The fastest of the rounds is kept, since the noise only makes the calls slower
+ROUNDS = 7
+
+
+def measure(func: Callable[[], Any]) -> float:
+    """Return the time in seconds of a call"""
+    timer = timeit.Timer(func)
+    # Calls per round, so each round takes at least 0.2 seconds
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=ROUNDS, number=number)) / number
+
+
+def calibration_workload() -> None:
+    numbers = {str(i): i for i in range(1000)}
+    "".join(sorted(numbers))
+    sum(numbers.values())
+
+
+@pytest.fixture(scope="session")
+def calibration_secs() -> float:
+    return measure(calibration_workload)
+
+
+@pytest.fixture(scope="session")
+def baselines(
+    request: pytest.FixtureRequest, calibration_secs: float
+) -> Iterator[Dict[str, Dict[str, float]]]:
+    with open(BASELINES_PATH) as baselines_file:
+        baselines: Dict[str, Dict[str, float]] = json.load(baselines_file)
+    yield baselines
+
+    if request.config.getoption("--save-baselines"):
+        with open(BASELINES_PATH, "w") as baselines_file:
+            json.dump(dict(sorted(baselines.items())), baselines_file, indent=2)
+            baselines_file.write("\n")
+
+
+@pytest.fixture
+def benchmark(
+    request: pytest.FixtureRequest,
+    calibration_secs: float,
+    baselines: Dict[str, Dict[str, float]],
+) -> Callable[..., Any]:
+    """
+    Time the function called with the arguments and fail if it got slower than its
+    baseline by more than the regression threshold. Return the result of the function.
+    """
+
+    def run_benchmark(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        result = func(*args, **kwargs)
+        secs = measure(lambda: func(*args, **kwargs))
+        relative_time = secs / calibration_secs
+        name: str = request.node.name
+
+        if request.config.getoption("--save-baselines"):
+            baselines[name] = {
+                "relative_time": round(relative_time, 4),
+                "microsecs": round(secs * 1e6, 3),
+            }
+            return result
+
+        if name not in baselines:
+            pytest.fail(f"{name} has no baseline, record it with --save-baselines")
+        baseline = baselines[name]["relative_time"]
+        threshold_marker = request.node.get_closest_marker("regression_threshold")
+        threshold: float = (
+            threshold_marker.args[0]
+            if threshold_marker is not None
+            else request.config.getoption("--regression-threshold")
+        )
+        assert relative_time <= baseline * (1 + threshold), (
+            f"{name} took {secs * 1e6:.3f}us, "
+            f"{relative_time / baseline - 1:.0%} slower than its baseline"
+        )
+        return result
+
+    return run_benchmark
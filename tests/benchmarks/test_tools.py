@@ -0,0 +1,71 @@
+from typing import Any, Callable, Dict
+import pytest
+
+from tests import conftest
+from pyfederate.utils import constants, tools
+
+pytestmark = pytest.mark.benchmark
+
+CODE_VERIFIER = "dBjftJeZ4CVP-mJ92K27uhbUJU1p1r_wW1gFWFOEjXk"
+CODE_CHALLENGE = "ngF5GsXcbwljx6u133FFr3Xht9xooA_DuaX_3QwODtc"
+EXTRA_PARAMS: Dict[str, str] = {
+    "rate_limit": "10",
+    "rate_limit_burst": "20",
+    "tenant": "tenant_id",
+    "contact": "admin@client.com",
+}
+
+
+def test_generate_fixed_size_random_string(benchmark: Callable[..., Any]) -> None:
+    random_string: str = benchmark(
+        tools.generate_fixed_size_random_string, length=constants.OPAQUE_TOKEN_LENGTH
+    )
+    assert len(random_string) == constants.OPAQUE_TOKEN_LENGTH
+
+
+def test_generate_random_string(benchmark: Callable[..., Any]) -> None:
+    random_string: str = benchmark(
+        tools.generate_random_string,
+        min_length=constants.CLIENT_SECRET_MIN_LENGH,
+        max_length=constants.CLIENT_SECRET_MAX_LENGH,
+    )
+    assert (
+        constants.CLIENT_SECRET_MIN_LENGH
+        <= len(random_string)
+        <= constants.CLIENT_SECRET_MAX_LENGH
+    )
+
+
+# bcrypt runs in native code, so its time relative to the pure Python calibration
+# workload varies more between machines
+@pytest.mark.regression_threshold(1.0)
+def test_hash_secret(benchmark: Callable[..., Any]) -> None:
+    hashed_secret: str = benchmark(tools.hash_secret, secret=conftest.CLIENT_SECRET)
+    assert tools.is_secret_valid(
+        secret=conftest.CLIENT_SECRET, hashed_secret=hashed_secret
+    )
+
+
+def test_is_pkce_valid(benchmark: Callable[..., Any]) -> None:
+    assert benchmark(
+        tools.is_pkce_valid, code_verifier=CODE_VERIFIER, code_challenge=CODE_CHALLENGE
+    )
+
+
+def test_prepare_redirect_url(benchmark: Callable[..., Any]) -> None:
+    redirect_url: str = benchmark(
+        tools.prepare_redirect_url,
+        url=conftest.REDIRECT_URI,
+        params={"code": conftest.AUTHORIZATION_CODE, "state": conftest.STATE},
+    )
+    assert redirect_url.startswith(conftest.REDIRECT_URI)
+
+
+def test_to_base64_string(benchmark: Callable[..., Any]) -> None:
+    base64_string: str = benchmark(tools.to_base64_string, extra_params=EXTRA_PARAMS)
+    assert tools.to_json(base64_string=base64_string) == EXTRA_PARAMS
+
+
+def test_to_json(benchmark: Callable[..., Any]) -> None:
+    base64_string = tools.to_base64_string(extra_params=EXTRA_PARAMS)
+    assert benchmark(tools.to_json, base64_string=base64_string) == EXTRA_PARAMS
@@ -1,4 +1,4 @@
-from typing import TypeVar
+from typing import List, TypeVar
 import pytest
 
 from pyfederate.utils import schemas, tools, constants
@@ -180,3 +180,47 @@ T = TypeVar("T")
 
 async def async_return(o: T) -> T:
     return o
+
+
+######################################## Benchmarks ########################################
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--benchmarks",
+        action="store_true",
+        help="Run the benchmarks and fail the ones slower than their baselines",
+    )
+    parser.addoption(
+        "--save-baselines",
+        action="store_true",
+        help="Run the benchmarks and record their results as the new baselines",
+    )
+    parser.addoption(
+        "--regression-threshold",
+        type=float,
+        default=0.3,
+        help="Fraction a benchmark can be slower than its baseline",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line(
+        "markers", "benchmark: only runs with --benchmarks or --save-baselines"
+    )
+    config.addinivalue_line(
+        "markers",
+        "regression_threshold(threshold): overrides --regression-threshold for a benchmark",
+    )
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: List[pytest.Item]
+) -> None:
+    # The benchmarks are slow and sensitive to the machine load
+    if config.getoption("--benchmarks") or config.getoption("--save-baselines"):
+        return
+    skip_benchmark = pytest.mark.skip(reason="run with --benchmarks")
+    for item in items:
+        if item.get_closest_marker("benchmark"):
+            item.add_marker(skip_benchmark)
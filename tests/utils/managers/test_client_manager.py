@@ -0,0 +1,43 @@
+from unittest.mock import MagicMock
+import pytest
+
+from tests import conftest
+from pyfederate.utils import schemas, exceptions
+from pyfederate.utils.managers.client_manager import CachedClientManager
+
+
+@pytest.mark.asyncio
+async def test_cached_client_manager(client: schemas.Client) -> None:
+    """Test if the clients are read once from the wrapped manager until invalidated"""
+    client_manager_mock = MagicMock()
+    client_manager_mock.get_client = MagicMock(
+        side_effect=lambda client_id: conftest.async_return(client)
+    )
+    cached_client_manager = CachedClientManager(
+        client_manager=client_manager_mock, max_size=10, ttl=60
+    )
+
+    assert await cached_client_manager.get_client(client_id=client.id) == client
+    assert await cached_client_manager.get_client(client_id=client.id) == client
+    assert client_manager_mock.get_client.call_count == 1
+
+    cached_client_manager.invalidate_cache(client_id=client.id)
+    await cached_client_manager.get_client(client_id=client.id)
+    assert client_manager_mock.get_client.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_client_manager_does_not_cache_missing_clients() -> None:
+    """Test if clients that don't exist are looked up again"""
+    client_manager_mock = MagicMock()
+    client_manager_mock.get_client = MagicMock(
+        side_effect=exceptions.EntityDoesNotExistException()
+    )
+    cached_client_manager = CachedClientManager(
+        client_manager=client_manager_mock, max_size=10, ttl=60
+    )
+
+    for _ in range(2):
+        with pytest.raises(exceptions.EntityDoesNotExistException):
+            await cached_client_manager.get_client(client_id="invalid_client_id")
+    assert client_manager_mock.get_client.call_count == 2
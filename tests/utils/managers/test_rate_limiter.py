@@ -0,0 +1,72 @@
+from unittest.mock import patch
+import fakeredis
+import pytest
+
+from pyfederate.utils import schemas
+from pyfederate.utils.managers.rate_limiter import (
+    RateLimiter,
+    InMemoryRateLimiter,
+    RedisRateLimiter,
+)
+
+rate_limit = schemas.RateLimit(rate=1, burst=2)
+
+#################### InMemoryRateLimiter ####################
+
+
+@pytest.mark.asyncio
+async def test_in_memory_rate_limiter_allows_the_burst() -> None:
+    rate_limiter = InMemoryRateLimiter()
+
+    assert await rate_limiter.acquire(key="key", rate_limit=rate_limit) == 0
+    assert await rate_limiter.acquire(key="key", rate_limit=rate_limit) == 0
+    assert await rate_limiter.acquire(key="key", rate_limit=rate_limit) > 0
+    # The buckets are independent
+    assert await rate_limiter.acquire(key="other_key", rate_limit=rate_limit) == 0
+
+
+@pytest.mark.asyncio
+async def test_in_memory_rate_limiter_refills_the_bucket() -> None:
+    rate_limiter = InMemoryRateLimiter()
+
+    with patch("time.monotonic", return_value=100):
+        await rate_limiter.acquire(key="key", rate_limit=rate_limit)
+        await rate_limiter.acquire(key="key", rate_limit=rate_limit)
+        assert await rate_limiter.acquire(key="key", rate_limit=rate_limit) == 1
+
+    with patch("time.monotonic", return_value=100.5):
+        assert await rate_limiter.acquire(key="key", rate_limit=rate_limit) == 0.5
+
+    with patch("time.monotonic", return_value=101):
+        assert await rate_limiter.acquire(key="key", rate_limit=rate_limit) == 0
+        assert await rate_limiter.acquire(key="key", rate_limit=rate_limit) > 0
+
+
+@pytest.mark.asyncio
+async def test_in_memory_rate_limiter_keeps_only_the_active_keys() -> None:
+    rate_limiter = InMemoryRateLimiter(max_size=2)
+
+    for key in ["key1", "key2", "key3"]:
+        await rate_limiter.acquire(key=key, rate_limit=rate_limit)
+
+    assert len(rate_limiter._buckets) == 2
+
+
+#################### RedisRateLimiter ####################
+
+
+@pytest.fixture
+def redis_rate_limiter() -> RateLimiter:
+    return RedisRateLimiter(client=fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+@pytest.mark.asyncio
+async def test_redis_rate_limiter_allows_the_burst(
+    redis_rate_limiter: RateLimiter,
+) -> None:
+
+    assert await redis_rate_limiter.acquire(key="key", rate_limit=rate_limit) == 0
+    assert await redis_rate_limiter.acquire(key="key", rate_limit=rate_limit) == 0
+    retry_after = await redis_rate_limiter.acquire(key="key", rate_limit=rate_limit)
+    assert 0 < retry_after <= 1
+    assert await redis_rate_limiter.acquire(key="other_key", rate_limit=rate_limit) == 0
@@ -0,0 +1,225 @@
+from datetime import datetime
+import fakeredis
+import pytest
+
+from tests import conftest
+from pyfederate.utils import schemas, tools, exceptions
+from pyfederate.utils.managers.session_manager import RedisSessionManager
+
+
+@pytest.fixture
+def session_manager() -> RedisSessionManager:
+    return RedisSessionManager(
+        client=fakeredis.FakeAsyncRedis(decode_responses=True),
+        # Isolate the keys of each test
+        key_prefix=tools.generate_uuid(),
+    )
+
+
+@pytest.fixture
+def token_session(token_info: schemas.TokenInfo) -> schemas.TokenSession:
+    return schemas.TokenSession(
+        token_id=token_info.id,
+        refresh_token="refresh_token",
+        client_id=conftest.CLIENT_ID,
+        token_model_id=conftest.TOKEN_MODEL_ID,
+        token_info=token_info,
+        created_at=datetime.now(),
+        expiration=token_info.expiration,
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_and_get_session(
+    session_manager: RedisSessionManager,
+    authentication_session: schemas.AuthnSession,
+) -> None:
+    await session_manager.create_session(session=authentication_session)
+
+    assert (
+        await session_manager.get_session_by_authz_code(
+            authz_code=conftest.AUTHORIZATION_CODE
+        )
+        == authentication_session
+    )
+    assert (
+        await session_manager.get_session_by_callback_id(
+            callback_id=conftest.CALLBACK_ID
+        )
+        == authentication_session
+    )
+    with pytest.raises(exceptions.EntityAlreadyExistsException):
+        await session_manager.create_session(session=authentication_session)
+
+
+@pytest.mark.asyncio
+async def test_delete_session_only_once(
+    session_manager: RedisSessionManager,
+    authentication_session: schemas.AuthnSession,
+) -> None:
+    """The authorization code is single use across the workers"""
+    await session_manager.create_session(session=authentication_session)
+
+    await session_manager.delete_session(session_id=authentication_session.id)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.delete_session(session_id=authentication_session.id)
+
+
+@pytest.mark.asyncio
+async def test_session_keys_expire_with_the_session(
+    session_manager: RedisSessionManager,
+    authentication_session: schemas.AuthnSession,
+) -> None:
+    await session_manager.create_session(session=authentication_session)
+
+    for key in [
+        session_manager._get_session_key(session_id=authentication_session.id),
+        session_manager._get_session_index_key(
+            attribute="authz_code", value=conftest.AUTHORIZATION_CODE
+        ),
+    ]:
+        assert (
+            await session_manager._client.expiretime(key)
+            == authentication_session.get_expiration()
+        )
+
+
+@pytest.mark.asyncio
+async def test_update_session_ignores_stale_index_keys(
+    session_manager: RedisSessionManager,
+    authentication_session: schemas.AuthnSession,
+) -> None:
+    await session_manager.create_session(session=authentication_session)
+
+    authentication_session.callback_id = None
+    authentication_session.authz_code = "new_authz_code"
+    await session_manager.update_session(session=authentication_session)
+
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_session_by_callback_id(
+            callback_id=conftest.CALLBACK_ID
+        )
+    assert (
+        await session_manager.get_session_by_authz_code(authz_code="new_authz_code")
+    ).id == authentication_session.id
+
+    await session_manager.delete_session(session_id=authentication_session.id)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_session_by_authz_code(authz_code="new_authz_code")
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.update_session(session=authentication_session)
+
+
+@pytest.mark.asyncio
+async def test_token_session(
+    session_manager: RedisSessionManager,
+    token_session: schemas.TokenSession,
+) -> None:
+    await session_manager.create_token_session(session=token_session)
+    assert (
+        await session_manager.get_token_session_by_id(token_id=token_session.token_id)
+        == token_session
+    )
+
+    token_session.refresh_token = "new_refresh_token"
+    await session_manager.update_token_session(session=token_session)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token="refresh_token"
+        )
+    assert (
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token="new_refresh_token"
+        )
+        == token_session
+    )
+
+    await session_manager.delete_token_session(session_id=token_session.token_id)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_id(token_id=token_session.token_id)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.delete_token_session(session_id=token_session.token_id)
+
+
+@pytest.mark.asyncio
+async def test_rotate_refresh_token(
+    session_manager: RedisSessionManager,
+    token_session: schemas.TokenSession,
+) -> None:
+    await session_manager.create_token_session(session=token_session)
+
+    previous_token_id = token_session.token_id
+    token_session.token_id = "new_token_id"
+    token_session.refresh_token = "new_refresh_token"
+    await session_manager.rotate_refresh_token(
+        session=token_session,
+        previous_refresh_token="refresh_token",
+        previous_token_id=previous_token_id,
+    )
+    # The session moved to its new ID
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_id(token_id=previous_token_id)
+    assert (
+        await session_manager.get_token_session_by_id(token_id="new_token_id")
+        == token_session
+    )
+    assert (
+        await session_manager.get_token_session_id_by_rotated_refresh_token(
+            refresh_token="refresh_token"
+        )
+        == token_session.token_id
+    )
+    with pytest.raises(exceptions.EntityAlreadyExistsException):
+        await session_manager.rotate_refresh_token(
+            session=token_session,
+            previous_refresh_token="refresh_token",
+            previous_token_id="new_token_id",
+        )
+    assert (
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token="new_refresh_token"
+        )
+        == token_session
+    )
+
+    # The refresh tokens rotated before follow the session to its new ID
+    token_session.token_id = "newer_token_id"
+    token_session.refresh_token = "newer_refresh_token"
+    await session_manager.rotate_refresh_token(
+        session=token_session,
+        previous_refresh_token="new_refresh_token",
+        previous_token_id="new_token_id",
+    )
+    for refresh_token in ["refresh_token", "new_refresh_token"]:
+        assert (
+            await session_manager.get_token_session_id_by_rotated_refresh_token(
+                refresh_token=refresh_token
+            )
+            == "newer_token_id"
+        )
+
+
+@pytest.mark.asyncio
+async def test_rotate_refresh_token_of_deleted_session(
+    session_manager: RedisSessionManager,
+    token_session: schemas.TokenSession,
+) -> None:
+    await session_manager.create_token_session(session=token_session)
+    await session_manager.delete_token_session(session_id=token_session.token_id)
+
+    previous_token_id = token_session.token_id
+    token_session.token_id = "new_token_id"
+    token_session.refresh_token = "new_refresh_token"
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.rotate_refresh_token(
+            session=token_session,
+            previous_refresh_token="refresh_token",
+            previous_token_id=previous_token_id,
+        )
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_id(token_id="new_token_id")
+    # The refresh token wasn't marked as rotated
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_id_by_rotated_refresh_token(
+            refresh_token="refresh_token"
+        )
@@ -0,0 +1,438 @@
+from typing import AsyncIterator
+import asyncio
+from datetime import datetime
+import dataclasses
+import pathlib
+from unittest.mock import MagicMock, patch
+import pytest
+import pytest_asyncio
+
+from tests import conftest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from pyfederate.utils import schemas, models, exceptions
+from pyfederate.utils.managers.session_manager import (
+    InMemorySessionManager,
+    OLTPSessionManager,
+)
+
+
+@pytest.fixture
+def token_session(token_info: schemas.TokenInfo) -> schemas.TokenSession:
+    return schemas.TokenSession(
+        token_id=token_info.id,
+        refresh_token="refresh_token",
+        client_id=conftest.CLIENT_ID,
+        token_model_id=conftest.TOKEN_MODEL_ID,
+        token_info=token_info,
+        created_at=datetime.now(),
+        expiration=token_info.expiration,
+    )
+
+
+@pytest_asyncio.fixture
+async def engine() -> AsyncIterator[AsyncEngine]:
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+#################### Test InMemorySessionManager ####################
+
+
+@pytest.mark.asyncio
+async def test_get_session_by_indexed_values(
+    authentication_session: schemas.AuthnSession,
+) -> None:
+    session_manager = InMemorySessionManager()
+    authentication_session.request_uri = "request_uri"
+    await session_manager.create_session(session=authentication_session)
+
+    assert (
+        await session_manager.get_session_by_authz_code(
+            authz_code=conftest.AUTHORIZATION_CODE
+        )
+        == authentication_session
+    )
+    assert (
+        await session_manager.get_session_by_callback_id(
+            callback_id=conftest.CALLBACK_ID
+        )
+        == authentication_session
+    )
+    assert (
+        await session_manager.get_session_by_request_uri(request_uri="request_uri")
+        == authentication_session
+    )
+
+
+@pytest.mark.asyncio
+async def test_update_session_reindexes_the_session(
+    authentication_session: schemas.AuthnSession,
+) -> None:
+    """The old values must no longer resolve to the session once it is updated"""
+    session_manager = InMemorySessionManager()
+    await session_manager.create_session(session=authentication_session)
+
+    # The sessions are changed in place by the authentication flow
+    authentication_session.callback_id = None
+    authentication_session.authz_code = "new_authz_code"
+    await session_manager.update_session(session=authentication_session)
+
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_session_by_callback_id(
+            callback_id=conftest.CALLBACK_ID
+        )
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_session_by_authz_code(
+            authz_code=conftest.AUTHORIZATION_CODE
+        )
+    assert (
+        await session_manager.get_session_by_authz_code(authz_code="new_authz_code")
+        == authentication_session
+    )
+
+
+@pytest.mark.asyncio
+async def test_delete_session_removes_the_indexes(
+    authentication_session: schemas.AuthnSession,
+) -> None:
+    session_manager = InMemorySessionManager()
+    await session_manager.create_session(session=authentication_session)
+    await session_manager.delete_session(session_id=authentication_session.id)
+
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_session_by_authz_code(
+            authz_code=conftest.AUTHORIZATION_CODE
+        )
+    # The session can be deleted only once
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.delete_session(session_id=authentication_session.id)
+
+
+@pytest.mark.asyncio
+async def test_get_token_session_by_refresh_token(
+    token_session: schemas.TokenSession,
+) -> None:
+    session_manager = InMemorySessionManager()
+    await session_manager.create_token_session(session=token_session)
+    assert (
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token="refresh_token"
+        )
+        == token_session
+    )
+
+    token_session.refresh_token = "new_refresh_token"
+    await session_manager.update_token_session(session=token_session)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token="refresh_token"
+        )
+    assert (
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token="new_refresh_token"
+        )
+        == token_session
+    )
+
+    await session_manager.delete_token_session(session_id=token_session.token_id)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token="new_refresh_token"
+        )
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.tools.get_timestamp_now")
+async def test_expired_sessions_are_removed(
+    mocked_get_timestamp_now: MagicMock,
+    authentication_session: schemas.AuthnSession,
+    token_session: schemas.TokenSession,
+) -> None:
+    mocked_get_timestamp_now.return_value = conftest.timestamp_now
+    session_manager = InMemorySessionManager()
+    await session_manager.create_session(session=authentication_session)
+    await session_manager.create_token_session(session=token_session)
+
+    mocked_get_timestamp_now.return_value = max(
+        authentication_session.get_expiration(), token_session.expiration
+    )
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_session_by_authz_code(
+            authz_code=conftest.AUTHORIZATION_CODE
+        )
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_id(token_id=token_session.token_id)
+    assert len(session_manager._sessions) == 0
+    assert len(session_manager._token_sessions) == 0
+
+
+@pytest.mark.asyncio
+async def test_rotate_refresh_token(token_session: schemas.TokenSession) -> None:
+    session_manager = InMemorySessionManager()
+    await session_manager.create_token_session(session=token_session)
+
+    previous_token_id = token_session.token_id
+    token_session.token_id = "new_token_id"
+    token_session.refresh_token = "new_refresh_token"
+    await session_manager.rotate_refresh_token(
+        session=token_session,
+        previous_refresh_token="refresh_token",
+        previous_token_id=previous_token_id,
+    )
+    # The session moved to its new ID
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_id(token_id=previous_token_id)
+    assert (
+        await session_manager.get_token_session_by_id(token_id="new_token_id")
+        == token_session
+    )
+    assert (
+        await session_manager.get_token_session_id_by_rotated_refresh_token(
+            refresh_token="refresh_token"
+        )
+        == token_session.token_id
+    )
+    # The same refresh token can't be rotated twice
+    with pytest.raises(exceptions.EntityAlreadyExistsException):
+        await session_manager.rotate_refresh_token(
+            session=token_session,
+            previous_refresh_token="refresh_token",
+            previous_token_id="new_token_id",
+        )
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_id_by_rotated_refresh_token(
+            refresh_token="new_refresh_token"
+        )
+
+    # The refresh tokens rotated before follow the session to its new ID
+    token_session.token_id = "newer_token_id"
+    token_session.refresh_token = "newer_refresh_token"
+    await session_manager.rotate_refresh_token(
+        session=token_session,
+        previous_refresh_token="new_refresh_token",
+        previous_token_id="new_token_id",
+    )
+    for refresh_token in ["refresh_token", "new_refresh_token"]:
+        assert (
+            await session_manager.get_token_session_id_by_rotated_refresh_token(
+                refresh_token=refresh_token
+            )
+            == "newer_token_id"
+        )
+
+    # The rotated refresh tokens expire with the session
+    with patch(
+        "pyfederate.utils.tools.get_timestamp_now",
+        return_value=token_session.expiration,
+    ):
+        with pytest.raises(exceptions.EntityDoesNotExistException):
+            await session_manager.get_token_session_id_by_rotated_refresh_token(
+                refresh_token="refresh_token"
+            )
+    assert len(session_manager._rotated_refresh_tokens) == 0
+    assert len(session_manager._rotated_refresh_tokens_by_token_id) == 0
+
+
+#################### Test OLTPSessionManager ####################
+
+
+@pytest.mark.asyncio
+async def test_oltp_get_session_by_indexed_columns(
+    engine: AsyncEngine, authentication_session: schemas.AuthnSession
+) -> None:
+    session_manager = OLTPSessionManager(engine=engine)
+    authentication_session.request_uri = "request_uri"
+    await session_manager.create_session(session=authentication_session)
+
+    with pytest.raises(exceptions.EntityAlreadyExistsException):
+        await session_manager.create_session(session=authentication_session)
+    assert (
+        await session_manager.get_session_by_authz_code(
+            authz_code=conftest.AUTHORIZATION_CODE
+        )
+        == authentication_session
+    )
+    assert (
+        await session_manager.get_session_by_callback_id(
+            callback_id=conftest.CALLBACK_ID
+        )
+        == authentication_session
+    )
+    assert (
+        await session_manager.get_session_by_request_uri(request_uri="request_uri")
+        == authentication_session
+    )
+
+    authentication_session.callback_id = None
+    await session_manager.update_session(session=authentication_session)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_session_by_callback_id(
+            callback_id=conftest.CALLBACK_ID
+        )
+
+    await session_manager.delete_session(session_id=authentication_session.id)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_session_by_authz_code(
+            authz_code=conftest.AUTHORIZATION_CODE
+        )
+
+
+@pytest.mark.asyncio
+async def test_oltp_concurrent_deletes_of_the_same_session(
+    tmp_path: pathlib.Path, authentication_session: schemas.AuthnSession
+) -> None:
+    """Only one of the concurrent deletes succeeds, so the authz code is single use"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sessions.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+    session_manager = OLTPSessionManager(engine=engine)
+    await session_manager.create_session(session=authentication_session)
+
+    results = await asyncio.gather(
+        session_manager.delete_session(session_id=authentication_session.id),
+        session_manager.delete_session(session_id=authentication_session.id),
+        return_exceptions=True,
+    )
+    await engine.dispose()
+
+    assert results.count(None) == 1
+    assert any(
+        isinstance(result, exceptions.EntityDoesNotExistException) for result in results
+    )
+
+
+@pytest.mark.asyncio
+async def test_oltp_token_session(
+    engine: AsyncEngine, token_session: schemas.TokenSession
+) -> None:
+    session_manager = OLTPSessionManager(engine=engine)
+    await session_manager.create_token_session(session=token_session)
+
+    assert (
+        await session_manager.get_token_session_by_id(token_id=token_session.token_id)
+        == token_session
+    )
+    assert (
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token="refresh_token"
+        )
+        == token_session
+    )
+
+    await session_manager.delete_token_session(session_id=token_session.token_id)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_id(token_id=token_session.token_id)
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.delete_token_session(session_id=token_session.token_id)
+
+
+@pytest.mark.asyncio
+async def test_oltp_rotate_refresh_token(
+    engine: AsyncEngine, token_session: schemas.TokenSession
+) -> None:
+    session_manager = OLTPSessionManager(engine=engine)
+    await session_manager.create_token_session(session=token_session)
+    # The in memory database has a single connection, so let the purge finish first
+    await session_manager._purge_task  # type: ignore
+
+    previous_token_id = token_session.token_id
+    token_session.token_id = "new_token_id"
+    token_session.refresh_token = "new_refresh_token"
+    await session_manager.rotate_refresh_token(
+        session=token_session,
+        previous_refresh_token="refresh_token",
+        previous_token_id=previous_token_id,
+    )
+    # The session moved to its new ID
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await session_manager.get_token_session_by_id(token_id=previous_token_id)
+    assert (
+        await session_manager.get_token_session_by_id(token_id="new_token_id")
+        == token_session
+    )
+    assert (
+        await session_manager.get_token_session_by_refresh_token(
+            refresh_token="new_refresh_token"
+        )
+        == token_session
+    )
+    assert (
+        await session_manager.get_token_session_id_by_rotated_refresh_token(
+            refresh_token="refresh_token"
+        )
+        == token_session.token_id
+    )
+    with pytest.raises(exceptions.EntityAlreadyExistsException):
+        await session_manager.rotate_refresh_token(
+            session=token_session,
+            previous_refresh_token="refresh_token",
+            previous_token_id="new_token_id",
+        )
+
+    # The refresh tokens rotated before follow the session to its new ID
+    token_session.token_id = "newer_token_id"
+    token_session.refresh_token = "newer_refresh_token"
+    await session_manager.rotate_refresh_token(
+        session=token_session,
+        previous_refresh_token="new_refresh_token",
+        previous_token_id="new_token_id",
+    )
+    for refresh_token in ["refresh_token", "new_refresh_token"]:
+        assert (
+            await session_manager.get_token_session_id_by_rotated_refresh_token(
+                refresh_token=refresh_token
+            )
+            == "newer_token_id"
+        )
+
+
+@pytest.mark.asyncio
+async def test_oltp_purge_expired_sessions(
+    engine: AsyncEngine,
+    authentication_session: schemas.AuthnSession,
+    token_session: schemas.TokenSession,
+) -> None:
+    session_manager = OLTPSessionManager(engine=engine)
+    for i in range(5):
+        await session_manager.create_session(
+            session=dataclasses.replace(
+                authentication_session,
+                id=f"session_{i}",
+                authz_code_creation_timestamp=0,
+            )
+        )
+    token_session.expiration = 0
+    await session_manager.create_token_session(session=token_session)
+    await session_manager.create_session(session=authentication_session)
+
+    await session_manager.purge_expired_sessions(batch_size=2)
+
+    async with AsyncSession(engine) as db:
+        assert (await db.scalars(select(models.AuthnSession.id))).all() == [
+            authentication_session.id
+        ]
+        assert (await db.scalars(select(models.TokenSession.token_id))).all() == []
+
+
+@pytest.mark.asyncio
+async def test_oltp_purge_errors_are_logged(engine: AsyncEngine) -> None:
+    session_manager = OLTPSessionManager(engine=engine)
+
+    async def failing_purge() -> None:
+        raise RuntimeError("the database is unavailable")
+
+    with patch.object(session_manager, "purge_expired_sessions", failing_purge), patch(
+        "pyfederate.utils.managers.session_manager.logger"
+    ) as logger_mock:
+        session_manager._schedule_purge()
+        with pytest.raises(RuntimeError):
+            await session_manager._purge_task  # type: ignore
+        # Let the done callback run
+        await asyncio.sleep(0)
+
+    logger_mock.error.assert_called_once()
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+from pyfederate.utils.cache import TTLCache
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    """Test if the entry used the longest time ago is evicted when the cache is full"""
+    cache: TTLCache[str, int] = TTLCache(max_size=2, ttl=60)
+    cache.set("first", 1)
+    cache.set("second", 2)
+    assert cache.get("first") == 1
+
+    cache.set("third", 3)
+
+    assert len(cache) == 2
+    assert cache.get("second") is None
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
+
+
+def test_entries_expire() -> None:
+    """Test if the entries are no longer returned after their ttl"""
+    cache: TTLCache[str, int] = TTLCache(max_size=2, ttl=60)
+    with patch("time.monotonic", return_value=0):
+        cache.set("key", 1)
+    with patch("time.monotonic", return_value=59):
+        assert cache.get("key") == 1
+    with patch("time.monotonic", return_value=60):
+        assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_hit_ratio() -> None:
+    """Test if the hits and misses are counted"""
+    cache: TTLCache[str, int] = TTLCache(max_size=2, ttl=60)
+    assert cache.hit_ratio == 0
+    cache.set("key", 1)
+    cache.get("key")
+    cache.get("key")
+    cache.get("another_key")
+    assert cache.hits == 2 and cache.misses == 1
+    assert cache.hit_ratio == 2 / 3
@@ -0,0 +1,57 @@
+from pathlib import Path
+from unittest.mock import patch
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from pyfederate.utils import database
+
+
+def test_get_session_statements() -> None:
+    """Test if each backend gets the statements it supports"""
+
+    with patch("pyfederate.utils.constants.DB_STATEMENT_TIMEOUT", 1000):
+        assert database.get_session_statements(
+            url=make_url("postgresql+asyncpg://user@localhost/db")
+        ) == ["SET statement_timeout = 1000"]
+        assert "PRAGMA busy_timeout=1000" in database.get_session_statements(
+            url=make_url("sqlite+aiosqlite:///./sql_app.db")
+        )
+
+    with patch("pyfederate.utils.constants.DB_STATEMENT_TIMEOUT", 0):
+        assert (
+            database.get_session_statements(
+                url=make_url("postgresql+asyncpg://user@localhost/db")
+            )
+            == []
+        )
+
+    # The journal mode of in memory databases cannot be WAL
+    assert not any(
+        statement.startswith("PRAGMA journal_mode")
+        for statement in database.get_session_statements(
+            url=make_url("sqlite+aiosqlite://")
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_engine(tmp_path: Path) -> None:
+    """Test if the pool is sized as requested and the pragmas are applied to new connections"""
+
+    engine = database.create_engine(
+        db_string=f"sqlite+aiosqlite:///{tmp_path / 'test.db'}",
+        pool_size=3,
+        max_overflow=2,
+    )
+    assert isinstance(engine.pool, AsyncAdaptedQueuePool)
+    assert engine.pool.size() == 3  # type: ignore
+    async with engine.connect() as connection:
+        journal_mode = (await connection.execute(text("PRAGMA journal_mode"))).scalar()
+        synchronous = (await connection.execute(text("PRAGMA synchronous"))).scalar()
+    await engine.dispose()
+
+    assert journal_mode == "wal"
+    # NORMAL
+    assert synchronous == 1
@@ -1,10 +1,13 @@
 from typing import Dict, Any
+from datetime import datetime
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import jwt
 
 from tests import conftest
 from pyfederate.utils import constants, schemas, helpers, exceptions
+from pyfederate.utils.managers.session_manager import InMemorySessionManager
+from pyfederate.utils.managers.rate_limiter import InMemoryRateLimiter
 
 #################### Test helpers.get_authenticated_client ####################
 
@@ -90,6 +93,83 @@ async def test_get_authenticated_client_valid_secret(
     assert authenticated_client.id == conftest.CLIENT_ID
 
 
+#################### Test helpers.get_confidential_client ####################
+
+
+@pytest.mark.asyncio
+async def test_get_confidential_client(
+    secret_authenticated_client: schemas.Client,
+) -> None:
+
+    assert (
+        await helpers.get_confidential_client(client=secret_authenticated_client)
+        == secret_authenticated_client
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_confidential_client_rejects_public_clients(
+    no_authentication_client: schemas.Client,
+) -> None:
+
+    with pytest.raises(exceptions.JsonResponseException):
+        await helpers.get_confidential_client(client=no_authentication_client)
+
+
+#################### Test helpers.get_rate_limited_client ####################
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_get_rate_limited_client_rejects_before_verifying_the_secret(
+    mocked_manager: MagicMock, secret_authenticated_client: schemas.Client
+) -> None:
+
+    secret_authenticated_client.extra_params = {
+        constants.ClientParam.RATE_LIMIT.value: "0.1",
+        constants.ClientParam.RATE_LIMIT_BURST.value: "1",
+    }
+    mocked_manager.client_manager.get_client = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(
+            o=secret_authenticated_client
+        )
+    )
+    mocked_manager.rate_limiter = InMemoryRateLimiter()
+    request = MagicMock()
+
+    with pytest.raises(exceptions.JsonResponseException) as exc_info:
+        await helpers.get_rate_limited_client(
+            request=request, client_id=conftest.CLIENT_ID, client_secret="invalid"
+        )
+    assert exc_info.value.error == constants.ErrorCode.INVALID_CLIENT
+
+    with pytest.raises(exceptions.TooManyRequestsException) as exc_info:
+        await helpers.get_rate_limited_client(
+            request=request, client_id=conftest.CLIENT_ID, client_secret="invalid"
+        )
+    assert exc_info.value.retry_after == 10
+
+
+def test_client_rate_limit(client: schemas.Client) -> None:
+
+    client.extra_params = {constants.ClientParam.RATE_LIMIT.value: "5"}
+    assert client.get_rate_limit() == schemas.RateLimit(
+        rate=5, burst=constants.CLIENT_RATE_LIMIT_BURST
+    )
+
+    # Invalid params fall back to the default rate limit
+    for extra_params in [
+        {constants.ClientParam.RATE_LIMIT.value: "abc"},
+        {constants.ClientParam.RATE_LIMIT.value: "0"},
+        {
+            constants.ClientParam.RATE_LIMIT.value: "5",
+            constants.ClientParam.RATE_LIMIT_BURST.value: "0",
+        },
+    ]:
+        client.extra_params = extra_params
+        assert client.get_rate_limit() == schemas.client_default_rate_limit
+
+
 #################### Test helpers.get_response_types ####################
 
 
@@ -167,6 +247,77 @@ async def test_client_credentials_token_handler_generate_jwt_token(
     assert payload["scope"] == " ".join(client_credentials_grant_context.client.scopes)
 
 
+@pytest.mark.asyncio
+async def test_client_credentials_token_handler_reuses_token(
+    client_credentials_grant_context: schemas.GrantContext,
+) -> None:
+
+    helpers.reusable_tokens.clear()
+    client_credentials_grant_context.token_model.is_reusable = True
+    client_credentials_grant_context.token_model.reuse_min_lifetime_ratio = 0.5
+
+    with patch("pyfederate.utils.tools.get_timestamp_now", return_value=1000):
+        first_token_response = await helpers.client_credentials_token_handler(
+            grant_context=client_credentials_grant_context
+        )
+    with patch(
+        "pyfederate.utils.tools.get_timestamp_now",
+        return_value=1000 + conftest.TOKEN_EXPIRATION // 4,
+    ):
+        second_token_response = await helpers.client_credentials_token_handler(
+            grant_context=client_credentials_grant_context
+        )
+
+    assert second_token_response.access_token == first_token_response.access_token
+    assert (
+        second_token_response.expires_in
+        == conftest.TOKEN_EXPIRATION - conftest.TOKEN_EXPIRATION // 4
+    )
+
+    # Other scopes get a new token
+    client_credentials_grant_context.requested_scopes = []
+    third_token_response = await helpers.client_credentials_token_handler(
+        grant_context=client_credentials_grant_context
+    )
+    assert third_token_response.access_token != first_token_response.access_token
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_client_credentials_token_handler_generate_opaque_token(
+    mocked_manager: MagicMock,
+    client_credentials_grant_context: schemas.GrantContext,
+) -> None:
+
+    mocked_manager.session_manager.create_token_session = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(o=None)
+    )
+    client_credentials_grant_context.client.grant_types.append(
+        constants.GrantType.REFRESH_TOKEN
+    )
+    client_credentials_grant_context.token_model = schemas.OpaqueTokenModel(
+        id=conftest.TOKEN_MODEL_ID,
+        issuer=conftest.ISSUER,
+        expires_in=conftest.TOKEN_EXPIRATION,
+        is_refreshable=True,
+    )
+
+    token_response: schemas.TokenResponse = (
+        await helpers.client_credentials_token_handler(
+            grant_context=client_credentials_grant_context
+        )
+    )
+
+    assert len(token_response.access_token) == constants.OPAQUE_TOKEN_LENGTH
+    token_session: schemas.TokenSession = (
+        mocked_manager.session_manager.create_token_session.call_args.kwargs["session"]
+    )
+    assert token_session.token_id == token_response.access_token
+    # Client credentials never issue refresh tokens
+    assert token_session.refresh_token is None
+    assert token_session.expiration == token_session.token_info.expiration
+
+
 #################### Test helpers.create_token_session ####################
 
 
@@ -246,3 +397,416 @@ async def test_authorization_code_token_handler_jwt_response(
     )
     assert payload["sub"] == authentication_session.user_id
     assert payload["scope"] == " ".join(authentication_session.requested_scopes)
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_authorization_code_token_handler_code_already_used(
+    mocked_manager: MagicMock,
+    authorization_code_grant_context: schemas.GrantContext,
+    authentication_session: schemas.AuthnSession,
+) -> None:
+    """A concurrent request that already redeemed the code deleted its session"""
+
+    # Arrange
+    mocked_manager.session_manager.get_session_by_authz_code = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(
+            o=authentication_session
+        )
+    )
+    mocked_manager.session_manager.delete_session = Mock(
+        side_effect=exceptions.EntityDoesNotExistException()
+    )
+    mocked_manager.session_manager.create_token_session = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(o=None)
+    )
+
+    # Act
+    with pytest.raises(exceptions.JsonResponseException) as exc_info:
+        await helpers.authorization_code_token_handler(
+            grant_context=authorization_code_grant_context
+        )
+
+    # Assert
+    assert exc_info.value.error == constants.ErrorCode.INVALID_GRANT
+    mocked_manager.session_manager.create_token_session.assert_not_called()
+
+
+#################### Test helpers.introspect_token ####################
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_introspect_opaque_token(
+    mocked_manager: MagicMock, token_info: schemas.TokenInfo
+) -> None:
+
+    helpers.introspection_results.clear()
+    opaque_token_model = schemas.OpaqueTokenModel(
+        id=conftest.TOKEN_MODEL_ID,
+        issuer=conftest.ISSUER,
+        expires_in=conftest.TOKEN_EXPIRATION,
+        is_refreshable=False,
+    )
+    token_session = schemas.TokenSession(
+        token_id=token_info.id,
+        refresh_token=None,
+        client_id=conftest.CLIENT_ID,
+        token_model_id=conftest.TOKEN_MODEL_ID,
+        token_info=token_info,
+        created_at=datetime.now(),
+        expiration=token_info.expiration,
+    )
+
+    async def get_token_session_by_id(token_id: str) -> schemas.TokenSession:
+        if token_id != token_info.id:
+            raise exceptions.EntityDoesNotExistException()
+        return token_session
+
+    mocked_manager.session_manager.get_token_session_by_id = Mock(
+        side_effect=get_token_session_by_id
+    )
+    mocked_manager.token_model_manager.get_token_model = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(o=opaque_token_model)
+    )
+
+    introspection_results = await helpers.introspect_tokens(
+        tokens=[token_info.id, "invalid_token", token_info.id]
+    )
+
+    assert [result.active for result in introspection_results] == [True, False, True]
+    assert introspection_results[0].client_id == conftest.CLIENT_ID
+    assert introspection_results[0].exp == token_info.expiration
+    # The repeated token is looked up once
+    assert mocked_manager.session_manager.get_token_session_by_id.call_count == 2
+
+    # The results are cached
+    await helpers.introspect_token(token=token_info.id)
+    assert mocked_manager.session_manager.get_token_session_by_id.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_introspect_stateless_jwt(
+    mocked_manager: MagicMock,
+    jwt_token_model: schemas.JWTTokenModel,
+    token_info: schemas.TokenInfo,
+) -> None:
+
+    helpers.introspection_results.clear()
+    mocked_manager.session_manager.get_token_session_by_id = Mock(
+        side_effect=exceptions.EntityDoesNotExistException()
+    )
+    mocked_manager.token_model_manager.get_jwt_token_models = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(o=[jwt_token_model])
+    )
+    token = jwt_token_model.generate_token(token_info=token_info)
+
+    introspection_result = await helpers.introspect_token(token=token)
+    assert introspection_result.active
+    assert introspection_result.jti == token_info.id
+    mocked_manager.token_model_manager.get_jwt_token_models.assert_called_once_with(
+        issuer=conftest.ISSUER, key_id=conftest.KEY_ID
+    )
+
+    # Tampered tokens are inactive
+    assert not (
+        await helpers.introspect_token(
+            token=token.rsplit(".", 1)[0] + ".invalid_signature"
+        )
+    ).active
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_introspect_client_credentials_jwt(
+    mocked_manager: MagicMock,
+    client_credentials_grant_context: schemas.GrantContext,
+) -> None:
+    """The tokens issued by the handler point to their token model"""
+
+    helpers.introspection_results.clear()
+    token_model = client_credentials_grant_context.token_model
+    assert token_model.id != token_model.issuer
+    mocked_manager.session_manager.get_token_session_by_id = Mock(
+        side_effect=exceptions.EntityDoesNotExistException()
+    )
+    mocked_manager.token_model_manager.get_jwt_token_models = Mock(
+        side_effect=lambda issuer, key_id: conftest.async_return(
+            o=[token_model]
+            if (issuer, key_id) == (token_model.issuer, token_model.key_id)
+            else []
+        )
+    )
+    token_response = await helpers.client_credentials_token_handler(
+        grant_context=client_credentials_grant_context
+    )
+
+    introspection_result = await helpers.introspect_token(
+        token=token_response.access_token
+    )
+    assert introspection_result.active
+    assert introspection_result.client_id == client_credentials_grant_context.client.id
+
+
+#################### Test helpers.revoke_token ####################
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_revoke_stateless_jwt(
+    mocked_manager: MagicMock,
+    client: schemas.Client,
+    jwt_token_model: schemas.JWTTokenModel,
+    token_info: schemas.TokenInfo,
+) -> None:
+
+    helpers.introspection_results.clear()
+    mocked_manager.session_manager.get_token_session_by_id = Mock(
+        side_effect=exceptions.EntityDoesNotExistException()
+    )
+    mocked_manager.session_manager.get_token_session_by_refresh_token = Mock(
+        side_effect=exceptions.EntityDoesNotExistException()
+    )
+    mocked_manager.token_model_manager.get_jwt_token_models = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(o=[jwt_token_model])
+    )
+    token = jwt_token_model.generate_token(token_info=token_info)
+    assert (await helpers.introspect_token(token=token)).active
+    reuse_key = (client.id, jwt_token_model.id, frozenset(token_info.scopes))
+    helpers.reusable_tokens.set(reuse_key, (token, token_info.expiration))
+    # The client switched to another token model after the token was issued
+    client.token_model = jwt_token_model.model_copy(update={"id": "new_token_model"})
+
+    await helpers.revoke_token(client=client, token=token, token_type_hint=None)
+
+    assert helpers.revoked_tokens.is_revoked(token_id=token_info.id)
+    assert helpers.reusable_tokens.get(reuse_key) is None
+    assert not (await helpers.introspect_token(token=token)).active
+    # Unknown tokens are ignored
+    await helpers.revoke_token(
+        client=client,
+        token="invalid_token",
+        token_type_hint=constants.TokenTypeHint.REFRESH_TOKEN,
+    )
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_revoke_client_credentials_jwt(
+    mocked_manager: MagicMock,
+    client_credentials_grant_context: schemas.GrantContext,
+) -> None:
+
+    helpers.introspection_results.clear()
+    helpers.reusable_tokens.clear()
+    client = client_credentials_grant_context.client
+    token_model = client_credentials_grant_context.token_model
+    token_model.is_reusable = True
+    mocked_manager.session_manager.get_token_session_by_id = Mock(
+        side_effect=exceptions.EntityDoesNotExistException()
+    )
+    mocked_manager.session_manager.get_token_session_by_refresh_token = Mock(
+        side_effect=exceptions.EntityDoesNotExistException()
+    )
+    mocked_manager.token_model_manager.get_jwt_token_models = Mock(
+        side_effect=lambda issuer, key_id: conftest.async_return(
+            o=[token_model]
+            if (issuer, key_id) == (token_model.issuer, token_model.key_id)
+            else []
+        )
+    )
+    token_response = await helpers.client_credentials_token_handler(
+        grant_context=client_credentials_grant_context
+    )
+    token_id = jwt.decode(
+        token_response.access_token, options={"verify_signature": False}
+    )["jti"]
+    reuse_key = (
+        client.id,
+        token_model.id,
+        frozenset(client_credentials_grant_context.requested_scopes),
+    )
+    assert helpers.reusable_tokens.get(reuse_key) is not None
+
+    await helpers.revoke_token(
+        client=client, token=token_response.access_token, token_type_hint=None
+    )
+
+    assert helpers.revoked_tokens.is_revoked(token_id=token_id)
+    assert helpers.reusable_tokens.get(reuse_key) is None
+    assert not (
+        await helpers.introspect_token(token=token_response.access_token)
+    ).active
+    # The next request gets a new token
+    assert (
+        await helpers.client_credentials_token_handler(
+            grant_context=client_credentials_grant_context
+        )
+    ).access_token != token_response.access_token
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_revoke_token_of_another_client(
+    mocked_manager: MagicMock,
+    client: schemas.Client,
+    token_info: schemas.TokenInfo,
+) -> None:
+
+    token_session = schemas.TokenSession(
+        token_id=token_info.id,
+        refresh_token="refresh_token",
+        client_id="another_client_id",
+        token_model_id=conftest.TOKEN_MODEL_ID,
+        token_info=token_info,
+        created_at=datetime.now(),
+        expiration=token_info.expiration,
+    )
+    mocked_manager.session_manager.get_token_session_by_refresh_token = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(o=token_session)
+    )
+
+    with pytest.raises(exceptions.JsonResponseException):
+        await helpers.revoke_token(
+            client=client,
+            token="refresh_token",
+            token_type_hint=constants.TokenTypeHint.REFRESH_TOKEN,
+        )
+    mocked_manager.session_manager.delete_token_session.assert_not_called()
+
+
+#################### Test helpers.refresh_token_handler ####################
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_refresh_token_reuse_revokes_the_token_family(
+    mocked_manager: MagicMock,
+    client: schemas.Client,
+    jwt_token_model: schemas.JWTTokenModel,
+    token_info: schemas.TokenInfo,
+) -> None:
+
+    mocked_manager.session_manager = InMemorySessionManager()
+    mocked_manager.token_model_manager.get_token_model = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(o=jwt_token_model)
+    )
+    await mocked_manager.session_manager.create_token_session(
+        session=schemas.TokenSession(
+            token_id=token_info.id,
+            refresh_token="refresh_token",
+            client_id=conftest.CLIENT_ID,
+            token_model_id=conftest.TOKEN_MODEL_ID,
+            token_info=token_info,
+            created_at=datetime.now(),
+            expiration=token_info.expiration,
+        )
+    )
+
+    def get_grant_context(refresh_token: str) -> schemas.GrantContext:
+        return schemas.GrantContext(
+            client=client,
+            token_model=jwt_token_model,
+            grant_type=constants.GrantType.REFRESH_TOKEN,
+            redirect_uri=None,
+            refresh_token=refresh_token,
+            authz_code=None,
+            requested_scopes=[],
+            code_verifier=None,
+            correlation_id=None,
+        )
+
+    token_response = await helpers.refresh_token_handler(
+        grant_context=get_grant_context(refresh_token="refresh_token")
+    )
+    assert token_response.refresh_token
+
+    # Reusing the rotated refresh token revokes the new one as well
+    with pytest.raises(exceptions.JsonResponseException):
+        await helpers.refresh_token_handler(
+            grant_context=get_grant_context(refresh_token="refresh_token")
+        )
+    with pytest.raises(exceptions.EntityDoesNotExistException):
+        await mocked_manager.session_manager.get_token_session_by_id(
+            token_id=token_info.id
+        )
+    with pytest.raises(exceptions.JsonResponseException):
+        await helpers.refresh_token_handler(
+            grant_context=get_grant_context(refresh_token=token_response.refresh_token)
+        )
+
+
+@pytest.mark.asyncio
+@patch("pyfederate.utils.helpers.manager")
+async def test_refresh_token_issues_a_new_opaque_token(
+    mocked_manager: MagicMock,
+    client: schemas.Client,
+    token_info: schemas.TokenInfo,
+) -> None:
+
+    helpers.introspection_results.clear()
+    opaque_token_model = schemas.OpaqueTokenModel(
+        id=conftest.TOKEN_MODEL_ID,
+        issuer=conftest.ISSUER,
+        expires_in=conftest.TOKEN_EXPIRATION,
+        is_refreshable=True,
+    )
+    mocked_manager.session_manager = InMemorySessionManager()
+    mocked_manager.token_model_manager.get_token_model = Mock(
+        side_effect=lambda *args, **kwargs: conftest.async_return(o=opaque_token_model)
+    )
+    token_info.id = opaque_token_model.generate_token_id()
+    await mocked_manager.session_manager.create_token_session(
+        session=schemas.TokenSession(
+            token_id=token_info.id,
+            refresh_token="refresh_token",
+            client_id=conftest.CLIENT_ID,
+            token_model_id=conftest.TOKEN_MODEL_ID,
+            token_info=token_info,
+            created_at=datetime.now(),
+            expiration=token_info.expiration,
+        )
+    )
+    first_token = token_info.id
+    assert (await helpers.introspect_token(token=first_token)).active
+
+    def get_grant_context(refresh_token: str) -> schemas.GrantContext:
+        return schemas.GrantContext(
+            client=client,
+            token_model=opaque_token_model,
+            grant_type=constants.GrantType.REFRESH_TOKEN,
+            redirect_uri=None,
+            refresh_token=refresh_token,
+            authz_code=None,
+            requested_scopes=[],
+            code_verifier=None,
+            correlation_id=None,
+        )
+
+    first_response = await helpers.refresh_token_handler(
+        grant_context=get_grant_context(refresh_token="refresh_token")
+    )
+    second_response = await helpers.refresh_token_handler(
+        grant_context=get_grant_context(refresh_token=first_response.refresh_token)  # type: ignore
+    )
+
+    # Only the last opaque token is active
+    assert (
+        len({first_token, first_response.access_token, second_response.access_token})
+        == 3
+    )
+    assert not (await helpers.introspect_token(token=first_token)).active
+    assert not (
+        await helpers.introspect_token(token=first_response.access_token)
+    ).active
+    assert (await helpers.introspect_token(token=second_response.access_token)).active
+
+    # Reusing the first refresh token still revokes the session
+    with pytest.raises(exceptions.JsonResponseException):
+        await helpers.refresh_token_handler(
+            grant_context=get_grant_context(refresh_token="refresh_token")
+        )
+    assert not (
+        await helpers.introspect_token(token=second_response.access_token)
+    ).active
@@ -0,0 +1,82 @@
+from unittest.mock import patch
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from pyfederate.utils import metrics
+from pyfederate.utils.cache import TTLCache
+from pyfederate.utils.middlewares import MetricsMiddleware
+
+
+def test_histogram() -> None:
+    histogram = metrics.Histogram(
+        name="test_duration_seconds",
+        description="Test histogram",
+        label_names=("label",),
+        buckets=(0.1, 1),
+    )
+    histogram.observe(0.05, "value")
+    histogram.observe(0.5, "value")
+    histogram.observe(5, "value")
+
+    assert list(histogram.collect())[2:] == [
+        'pyfederate_test_duration_seconds_bucket{label="value",le="0.1"} 1',
+        'pyfederate_test_duration_seconds_bucket{label="value",le="1"} 2',
+        'pyfederate_test_duration_seconds_bucket{label="value",le="+Inf"} 3',
+        'pyfederate_test_duration_seconds_sum{label="value"} 5.55',
+        'pyfederate_test_duration_seconds_count{label="value"} 3',
+    ]
+
+
+def test_register_cache() -> None:
+    cache: TTLCache[str, str] = TTLCache(max_size=10, ttl=10)
+    metrics.register_cache(name="test_cache", cache=cache)
+    cache.set("key", "value")
+    cache.get("key")
+    cache.get("other_key")
+
+    rendered_metrics = metrics.render()
+    assert 'pyfederate_cache_hits_total{cache="test_cache"} 1' in rendered_metrics
+    assert 'pyfederate_cache_hit_ratio{cache="test_cache"} 0.5' in rendered_metrics
+    assert 'pyfederate_cache_size{cache="test_cache"} 1' in rendered_metrics
+
+
+@pytest.mark.asyncio
+async def test_instrumented_manager() -> None:
+    class Manager:
+        def get_name(self) -> str:
+            return "name"
+
+        async def get_value(self, key: str) -> str:
+            return key
+
+    instrumented_manager = metrics.instrument_manager(
+        manager=Manager(), name="test_manager"
+    )
+
+    assert await instrumented_manager.get_value(key="key") == "key"
+    assert instrumented_manager.get_name() == "name"
+    assert (
+        metrics.manager_call_duration.series[("test_manager", "get_value")].count == 1
+    )
+    with patch("pyfederate.utils.constants.METRICS_ENABLED", False):
+        manager = Manager()
+        assert metrics.instrument_manager(manager=manager, name="test") is manager
+
+
+def test_metrics_middleware() -> None:
+    """Test if the requests are labeled by the path template of their routes"""
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/test_metrics/{item_id}")
+    def get_item(item_id: str) -> str:
+        return item_id
+
+    client = TestClient(app)
+    client.get("/test_metrics/1")
+    client.get("/test_metrics/2")
+    client.get("/test_unknown_route")
+
+    assert metrics.http_requests.values[("/test_metrics/{item_id}", "GET", "200")] == 2
+    assert metrics.http_requests.values[("unmatched", "GET", "404")] == 1
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from pyfederate.utils import constants, telemetry
+from pyfederate.utils.middlewares import TelemetryMiddleware, AdmissionControlMiddleware
+
+app = FastAPI()
+app.add_middleware(TelemetryMiddleware)
+
+
+@app.get("/telemetry_ids")
+def get_telemetry_ids() -> dict:
+    return {
+        "tracking_id": telemetry.tracking_id.get(),
+        "correlation_id": telemetry.correlation_id.get(),
+    }
+
+
+@app.get("/stream")
+def stream() -> StreamingResponse:
+    return StreamingResponse(iter([b"first", b"second"]))
+
+
+def test_telemetry_middleware() -> None:
+    """Test if the telemetry IDs are visible to the route and the cache headers are set"""
+    client = TestClient(app)
+
+    response = client.get(
+        "/telemetry_ids",
+        headers={constants.HTTPHeaders.X_CORRELATION_ID.value: "correlation_id"},
+    )
+    other_response = client.get("/telemetry_ids")
+
+    assert response.json()["correlation_id"] == "correlation_id"
+    assert response.json()["tracking_id"] != other_response.json()["tracking_id"]
+    assert (
+        response.headers[constants.HTTPHeaders.CACHE_CONTROL.value]
+        == "no-cache, no-store"
+    )
+    assert response.headers[constants.HTTPHeaders.PRAGMA.value] == "no-cache"
+
+
+def test_telemetry_middleware_streams_responses() -> None:
+    response = TestClient(app).get("/stream")
+
+    assert response.content == b"firstsecond"
+    assert response.headers[constants.HTTPHeaders.PRAGMA.value] == "no-cache"
+
+
+#################### AdmissionControlMiddleware ####################
+
+
+def create_admission_controlled_client(release: asyncio.Event) -> httpx.AsyncClient:
+    """Client of an app that handles one /token request at a time until release is set"""
+
+    admission_controlled_app = FastAPI()
+    admission_controlled_app.add_middleware(
+        AdmissionControlMiddleware,
+        paths=["/token", "/authorize/{callback_id}"],
+        max_in_flight=1,
+        max_queue_size=10,
+        latency_target=0.05,
+    )
+
+    @admission_controlled_app.post("/token")
+    async def get_token() -> None:
+        await release.wait()
+
+    @admission_controlled_app.get("/healthcheck")
+    def check_health() -> None:
+        return
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=admission_controlled_app),
+        base_url="http://localhost",
+    )
+
+
+@pytest.mark.asyncio
+async def test_admission_control_serves_the_queued_requests() -> None:
+    release = asyncio.Event()
+
+    async def release_soon() -> None:
+        await asyncio.sleep(0.01)
+        release.set()
+
+    async with create_admission_controlled_client(release=release) as client:
+        responses = await asyncio.gather(
+            client.post("/token"), client.post("/token"), release_soon()
+        )
+
+    assert [r.status_code for r in responses[:2]] == [200, 200]
+
+
+@pytest.mark.asyncio
+async def test_admission_control_sheds_requests_over_the_latency_target() -> None:
+    release = asyncio.Event()
+
+    async with create_admission_controlled_client(release=release) as client:
+        in_flight_request = asyncio.create_task(client.post("/token"))
+        await asyncio.sleep(0)
+
+        # The request waits longer than the target, so the server is overloaded
+        timed_out_response = await client.post("/token")
+        shed_response = await client.post("/token")
+        healthcheck_response = await client.get("/healthcheck")
+
+        release.set()
+        assert (await in_flight_request).status_code == 200
+        # The queue drained, so the requests are admitted again
+        assert (await client.post("/token")).status_code == 200
+
+    for response in [timed_out_response, shed_response]:
+        assert response.status_code == 503
+        assert response.json()["error"] == "temporarily_unavailable"
+        assert int(response.headers[constants.HTTPHeaders.RETRY_AFTER.value]) >= 1
+    assert healthcheck_response.status_code == 200
@@ -0,0 +1,47 @@
+from unittest.mock import patch
+
+from pyfederate.utils import tools
+from pyfederate.utils.revocation import BloomFilter, RevokedTokens
+
+
+def test_bloom_filter() -> None:
+    """Test if the added items are always found and few others are"""
+    bloom_filter = BloomFilter(capacity=1000, false_positive_rate=0.01)
+    for i in range(1000):
+        bloom_filter.add(f"token{i}")
+
+    assert all(f"token{i}" in bloom_filter for i in range(1000))
+    false_positives = sum(f"other{i}" in bloom_filter for i in range(10000))
+    assert false_positives < 300
+
+
+def test_revoked_tokens_expire() -> None:
+    revoked_tokens = RevokedTokens(capacity=10, false_positive_rate=0.01)
+    now = tools.get_timestamp_now()
+    revoked_tokens.revoke(token_id="token", expiration=now + 10)
+    # Tokens already expired don't need to be remembered
+    revoked_tokens.revoke(token_id="expired_token", expiration=now)
+
+    assert revoked_tokens.is_revoked(token_id="token")
+    assert not revoked_tokens.is_revoked(token_id="expired_token")
+    assert not revoked_tokens.is_revoked(token_id="other_token")
+
+    with patch("pyfederate.utils.tools.get_timestamp_now", return_value=now + 10):
+        assert not revoked_tokens.is_revoked(token_id="token")
+
+
+def test_revoked_tokens_filter_grows_and_forgets_expired_tokens() -> None:
+    revoked_tokens = RevokedTokens(capacity=2, false_positive_rate=0.01)
+    now = tools.get_timestamp_now()
+    for i in range(5):
+        revoked_tokens.revoke(token_id=f"token{i}", expiration=now + 10)
+
+    assert revoked_tokens._filter.capacity >= 5
+    assert all(revoked_tokens.is_revoked(token_id=f"token{i}") for i in range(5))
+
+    with patch("pyfederate.utils.tools.get_timestamp_now", return_value=now + 10):
+        revoked_tokens.revoke(token_id="new_token", expiration=now + 20)
+        assert len(revoked_tokens) == 1
+        # The filter was rebuilt without the expired tokens
+        assert revoked_tokens._stale_count == 0
+        assert revoked_tokens.is_revoked(token_id="new_token")
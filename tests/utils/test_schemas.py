@@ -1,10 +1,11 @@
 from typing import Dict, Any
+from unittest.mock import patch
 import jwt
 import pytest
 from fastapi.exceptions import RequestValidationError
 
 from tests import conftest
-from pyfederate.utils import schemas, constants, exceptions
+from pyfederate.utils import schemas, constants, exceptions, tools
 
 
 @pytest.fixture
@@ -105,6 +106,29 @@ class TestClient:
             client_secret="invalid_secret"
         ), "The client secret should not be valid"
 
+    @pytest.mark.asyncio
+    async def test_verify_secret(
+        self, secret_authenticated_client: schemas.Client
+    ) -> None:
+
+        tools.verified_secrets.clear()
+        with patch(
+            "pyfederate.utils.tools.is_secret_valid", wraps=tools.is_secret_valid
+        ) as is_secret_valid_mock:
+            for _ in range(2):
+                assert await secret_authenticated_client.verify_secret(
+                    client_secret=conftest.CLIENT_SECRET
+                ), "The client secret should be valid"
+            # The second verification is served by the cache
+            assert is_secret_valid_mock.call_count == 1
+
+            for _ in range(2):
+                assert not await secret_authenticated_client.verify_secret(
+                    client_secret="invalid_secret"
+                ), "The client secret should not be valid"
+            # Failed verifications are not cached
+            assert is_secret_valid_mock.call_count == 3
+
     def test_are_scopes_allowed(
         self, secret_authenticated_client: schemas.Client
     ) -> None:
@@ -203,3 +227,33 @@ class TestClientIn:
                     "is_pkce_required": False,
                 }
             )
+
+    @pytest.mark.parametrize(
+        "extra_params",
+        [
+            {constants.ClientParam.RATE_LIMIT.value: "abc"},
+            {constants.ClientParam.RATE_LIMIT.value: "0"},
+            {constants.ClientParam.RATE_LIMIT.value: "-1"},
+            {constants.ClientParam.RATE_LIMIT.value: "inf"},
+            {
+                constants.ClientParam.RATE_LIMIT.value: "5",
+                constants.ClientParam.RATE_LIMIT_BURST.value: "0",
+            },
+            {constants.ClientParam.RATE_LIMIT_BURST.value: "1.5"},
+        ],
+    )
+    def test_rate_limit_params_must_be_positive_numbers(
+        self, client_in: schemas.ClientIn, extra_params: Dict[str, str]
+    ) -> None:
+        with pytest.raises(RequestValidationError):
+            schemas.ClientIn(**{**dict(client_in), "extra_params": extra_params})
+
+        schemas.ClientIn(
+            **{
+                **dict(client_in),
+                "extra_params": {
+                    constants.ClientParam.RATE_LIMIT.value: "0.5",
+                    constants.ClientParam.RATE_LIMIT_BURST.value: "1",
+                },
+            }
+        )
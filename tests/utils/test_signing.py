@@ -0,0 +1,167 @@
+from typing import Any, Dict
+import asyncio
+from unittest.mock import patch
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from tests import conftest
+from pyfederate.utils import constants, schemas, signing
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"sub": "subject", "iat": 1},
+        {},
+        {"scope": "", "nested": {"list": [1, 2.5, None, True]}},
+        {"name": "Jos\u00e9 \U0001F600", "quote": '"\\/'},
+    ],
+)
+def test_signer_matches_pyjwt(
+    payload: Dict[str, Any], token_info: schemas.TokenInfo
+) -> None:
+    """Test if the signer produces byte-identical tokens to jwt.encode"""
+
+    signer = signing.get_signer(
+        key_id=conftest.KEY_ID,
+        key=conftest.HMAC_SIGNING_KEY,
+        signing_algorithm=constants.SigningAlgorithm.HS256,
+    )
+
+    for payload_ in [payload, token_info.to_jwt_payload()]:
+        assert signer.sign(payload=payload_) == jwt.encode(
+            payload=payload_,
+            key=conftest.HMAC_SIGNING_KEY,
+            algorithm="HS256",
+            headers={"kid": conftest.KEY_ID},
+        )
+
+
+def test_rsa_signer() -> None:
+    """Test if the tokens signed with a parsed RSA key are verified by its public key"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+    signer = signing.get_signer(
+        key_id="rsa_key",
+        key=pem,
+        signing_algorithm=constants.SigningAlgorithm.RS256,
+    )
+
+    token = signer.sign(payload={"sub": "subject"})
+    assert jwt.decode(token, key=private_key.public_key(), algorithms=["RS256"]) == {
+        "sub": "subject"
+    }
+    # PKCS#1 v1.5 signatures are deterministic
+    assert token == jwt.encode(
+        payload={"sub": "subject"},
+        key=pem,
+        algorithm="RS256",
+        headers={"kid": "rsa_key"},
+    )
+
+
+def test_signers_are_cached_by_key() -> None:
+    """Test if the key is parsed once per key id and key"""
+    first_signer = signing.get_signer(
+        key_id=conftest.KEY_ID,
+        key=conftest.HMAC_SIGNING_KEY,
+        signing_algorithm=constants.SigningAlgorithm.HS256,
+    )
+
+    assert first_signer is signing.get_signer(
+        key_id=conftest.KEY_ID,
+        key=conftest.HMAC_SIGNING_KEY,
+        signing_algorithm=constants.SigningAlgorithm.HS256,
+    )
+    assert first_signer is not signing.get_signer(
+        key_id=conftest.KEY_ID,
+        key="another_key",
+        signing_algorithm=constants.SigningAlgorithm.HS256,
+    )
+
+
+@pytest.mark.asyncio
+async def test_signing_engine() -> None:
+    """Test if the tokens signed concurrently in batches are returned to the right callers"""
+    signing_engine = signing.SigningEngine(max_workers=1, batch_max_size=2)
+    try:
+        tokens = await asyncio.gather(
+            *[
+                signing_engine.sign(
+                    key_id=conftest.KEY_ID,
+                    key=conftest.HMAC_SIGNING_KEY,
+                    signing_algorithm=constants.SigningAlgorithm.HS256,
+                    payload={"sub": str(i)},
+                )
+                for i in range(5)
+            ]
+        )
+    finally:
+        signing_engine.shutdown()
+
+    assert [
+        jwt.decode(token, key=conftest.HMAC_SIGNING_KEY, algorithms=["HS256"])["sub"]
+        for token in tokens
+    ] == [str(i) for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_signing_engine_after_shutdown() -> None:
+    """Test if the tokens are signed in the event loop once the processes are gone"""
+    signing_engine = signing.SigningEngine(max_workers=1)
+    signing_engine.shutdown()
+
+    token = await asyncio.wait_for(
+        signing_engine.sign(
+            key_id=conftest.KEY_ID,
+            key=conftest.HMAC_SIGNING_KEY,
+            signing_algorithm=constants.SigningAlgorithm.HS256,
+            payload={"sub": "subject"},
+        ),
+        timeout=5,
+    )
+
+    assert jwt.decode(token, key=conftest.HMAC_SIGNING_KEY, algorithms=["HS256"]) == {
+        "sub": "subject"
+    }
+
+
+@pytest.mark.asyncio
+async def test_signing_engine_signing_errors() -> None:
+    """Test if the callers get the error when the batch cannot be signed"""
+    signing_engine = signing.SigningEngine(max_workers=1)
+    signing_engine.shutdown()
+
+    with pytest.raises(TypeError):
+        await asyncio.wait_for(
+            signing_engine.sign(
+                key_id=conftest.KEY_ID,
+                key=conftest.HMAC_SIGNING_KEY,
+                signing_algorithm=constants.SigningAlgorithm.HS256,
+                # Not JSON serializable
+                payload={"exp": object()},
+            ),
+            timeout=5,
+        )
+
+
+def test_shutdown_signing_engine() -> None:
+    """Test if the signing engine is shut down and created again when needed"""
+    signing.get_signing_engine.cache_clear()
+    with patch.object(constants, "SIGNING_PROCESSES", 1):
+        signing_engine = signing.get_signing_engine()
+        assert signing_engine is not None
+        with patch.object(signing_engine, "shutdown") as shutdown_mock:
+            signing.shutdown_signing_engine()
+        shutdown_mock.assert_called_once()
+        assert signing.get_signing_engine() is not signing_engine
+
+    signing.shutdown_signing_engine()
+    assert signing.get_signing_engine() is None
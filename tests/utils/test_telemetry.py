@@ -0,0 +1,111 @@
+import io
+import json
+import logging
+import queue
+from unittest.mock import patch
+
+from pyfederate.utils import telemetry
+
+
+def get_record(message: str) -> logging.LogRecord:
+    return logging.makeLogRecord({"msg": message, "levelname": "INFO"})
+
+
+def test_queue_handler_drops_records_when_full() -> None:
+    handler = telemetry.DroppingQueueHandler(queue.SimpleQueue(), max_size=1)
+
+    handler.handle(get_record(message="first"))
+    handler.handle(get_record(message="second"))
+
+    assert handler.queue.qsize() == 1  # type: ignore
+    assert handler.dropped_records == 1
+
+
+def test_queue_listener_writes_the_queued_records() -> None:
+    """Test if all the queued records are written before stopping"""
+    stream = io.StringIO()
+    handler = telemetry.DroppingQueueHandler(queue.SimpleQueue(), max_size=10)
+    handler.addFilter(telemetry.ContextFilter())
+    listener = telemetry.BatchingQueueListener(
+        handler=handler,
+        formatter=telemetry.JsonFormatter(),
+        stream=stream,
+        batch_max_size=2,
+    )
+
+    for i in range(11):
+        handler.handle(get_record(message=f"message {i}"))
+    listener.start()
+    listener.stop()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["message"] for line in lines if line["level"] == "INFO"] == [
+        f"message {i}" for i in range(10)
+    ]
+    assert lines[0]["correlation_id"] == telemetry.correlation_id.get()
+    # The dropped record is reported once
+    assert [line["level"] for line in lines].count("WARNING") == 1
+
+
+def test_queue_handler_renders_the_message() -> None:
+    """Test if the message is rendered when queued, even without arguments"""
+    handler = telemetry.DroppingQueueHandler(queue.SimpleQueue(), max_size=10)
+    message = {"state": "queued"}
+
+    handler.handle(logging.makeLogRecord({"msg": message, "levelname": "INFO"}))
+    message["state"] = "changed"
+
+    record: logging.LogRecord = handler.queue.get_nowait()  # type: ignore
+    assert record.msg == "{'state': 'queued'}"
+    assert record.args is None
+
+
+def test_queue_listener_skips_the_records_it_cannot_format() -> None:
+    stream = io.StringIO()
+    handler = telemetry.DroppingQueueHandler(queue.SimpleQueue(), max_size=10)
+    listener = telemetry.BatchingQueueListener(
+        handler=handler,
+        formatter=telemetry.JsonFormatter(),
+        stream=stream,
+    )
+    invalid_record = get_record(message="invalid")
+    invalid_record.created = "not a timestamp"  # type: ignore
+
+    handler.handle(get_record(message="first"))
+    handler.handle(invalid_record)
+    handler.handle(get_record(message="second"))
+    with patch.object(handler, "handleError") as handle_error_mock:
+        listener.start()
+        listener.stop()
+
+    handle_error_mock.assert_called_once_with(invalid_record)
+    assert [json.loads(line)["message"] for line in stream.getvalue().splitlines()] == [
+        "first",
+        "second",
+    ]
+
+
+def test_get_logger_is_idempotent() -> None:
+    """Test if the handler is installed once, no matter how many times get_logger is called"""
+    for _ in range(3):
+        logger = telemetry.get_logger("pyfederate.utils.test_module")
+        other_logger = telemetry.get_logger("other_package.module")
+
+    assert logger.handlers == []
+    assert logging.getLogger(telemetry.ROOT_LOGGER_NAME).handlers == [
+        telemetry.get_queue_handler()
+    ]
+    assert other_logger.handlers == [telemetry.get_queue_handler()]
+
+
+def test_setup_logging_sets_the_levels_per_logger() -> None:
+    telemetry.setup_logging.cache_clear()
+    with patch(
+        "pyfederate.utils.constants.LOG_LEVELS",
+        {"pyfederate.utils.test_level_module": "WARNING"},
+    ):
+        telemetry.setup_logging()
+
+    logger = telemetry.get_logger("pyfederate.utils.test_level_module")
+    assert not logger.isEnabledFor(logging.INFO)
+    assert logger.isEnabledFor(logging.WARNING)
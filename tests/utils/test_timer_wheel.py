@@ -0,0 +1,50 @@
+from pyfederate.utils.timer_wheel import TimerWheel
+
+
+def test_pop_expired() -> None:
+    """Test if only the keys whose expiration was reached are returned"""
+    timer_wheel: TimerWheel[str] = TimerWheel()
+    timer_wheel.schedule(key="key1", expires_at=timer_wheel._current_tick + 1)
+    timer_wheel.schedule(key="key2", expires_at=timer_wheel._current_tick + 10)
+
+    assert timer_wheel.pop_expired(now=timer_wheel._current_tick) == []
+    assert timer_wheel.pop_expired(now=timer_wheel._current_tick + 1) == ["key1"]
+    assert "key1" not in timer_wheel
+    assert "key2" in timer_wheel
+
+
+def test_pop_expired_after_long_idle_period() -> None:
+    timer_wheel: TimerWheel[str] = TimerWheel()
+    now = timer_wheel._current_tick
+    timer_wheel.schedule(key="key1", expires_at=now + 5)
+    timer_wheel.schedule(key="key2", expires_at=now + 1_000_000)
+
+    assert timer_wheel.pop_expired(now=now + 100_000) == ["key1"]
+    assert len(timer_wheel) == 1
+
+
+def test_schedule_replaces_previous_expiration() -> None:
+    timer_wheel: TimerWheel[str] = TimerWheel()
+    now = timer_wheel._current_tick
+    timer_wheel.schedule(key="key", expires_at=now + 1)
+    timer_wheel.schedule(key="key", expires_at=now + 10)
+
+    assert timer_wheel.pop_expired(now=now + 5) == []
+    assert timer_wheel.get_expiration(key="key") == now + 10
+
+
+def test_cancel() -> None:
+    timer_wheel: TimerWheel[str] = TimerWheel()
+    timer_wheel.schedule(key="key", expires_at=timer_wheel._current_tick)
+    timer_wheel.cancel(key="key")
+
+    assert timer_wheel.pop_expired(now=timer_wheel._current_tick) == []
+
+
+def test_keys_scheduled_in_the_past_expire_immediately() -> None:
+    timer_wheel: TimerWheel[str] = TimerWheel()
+    now = timer_wheel._current_tick
+    timer_wheel.pop_expired(now=now + 10)
+    timer_wheel.schedule(key="key", expires_at=now)
+
+    assert timer_wheel.pop_expired(now=now + 11) == ["key"]
@@ -0,0 +1,66 @@
+from typing import Iterator, Tuple
+from unittest.mock import patch
+import sys
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from pyfederate.utils import constants, tracing
+from pyfederate.utils.metrics import InstrumentedManager
+from pyfederate.utils.middlewares import TracingMiddleware
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+
+@pytest.fixture
+def tracer() -> Iterator[Tuple[TracerProvider, InMemorySpanExporter]]:
+    span_exporter = InMemorySpanExporter()
+    tracer_provider = tracing.setup_tracing(exporter=span_exporter)
+    yield tracer_provider, span_exporter
+    tracing.stop_tracing()
+    tracer_provider.shutdown()
+
+
+def test_start_span_without_tracing() -> None:
+    with tracing.start_span(name="span") as span:
+        assert span is None
+
+
+def test_request_spans(tracer: Tuple[TracerProvider, InMemorySpanExporter]) -> None:
+    """Test if the manager calls are traced as children of the request span"""
+
+    class Manager:
+        async def get_item(self, item_id: str) -> str:
+            return item_id
+
+    manager = InstrumentedManager(manager=Manager(), name="item_manager")
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str) -> str:
+        return await manager.get_item(item_id=item_id)
+
+    TestClient(app).get("/items/1")
+    tracer_provider, span_exporter = tracer
+    # The spans are exported in batches
+    tracer_provider.force_flush()
+
+    spans = {span.name: span for span in span_exporter.get_finished_spans()}
+    request_span = spans["GET /items/{item_id}"]
+    assert request_span.attributes["http.response.status_code"] == 200
+    assert spans["item_manager.get_item"].parent.span_id == (
+        request_span.context.span_id
+    )
+
+
+def test_setup_tracing_without_the_exporter_installed() -> None:
+    """Test if a missing dependency is reported as a configuration error"""
+    with patch.object(constants, "TRACING_EXPORTER", "otlp"), patch.dict(
+        sys.modules, {"opentelemetry.exporter.otlp.proto.http.trace_exporter": None}
+    ):
+        with pytest.raises(RuntimeError, match="tracing extra"):
+            tracing.setup_tracing()
+    assert not tracing.is_tracing()